@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+SecureShield AI - Startup Benchmark
+Measures module import time and first/warm invoke latency for each Lambda function.
+
+Every run starts a fresh interpreter, which is what a cold container sees.
+Invocations call real AWS APIs with whatever credentials are configured; a
+handler that raises (e.g. no credentials) is still timed and the error is
+reported next to the numbers.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, Any, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_CLOUDTRAIL_EVENT = {
+    "version": "0",
+    "id": "benchmark-event-id",
+    "detail-type": "AWS API Call via CloudTrail",
+    "source": "aws.ec2",
+    "time": "2024-01-15T10:30:00Z",
+    "detail": {
+        "eventName": "DescribeInstances",
+        "eventTime": "2024-01-15T10:30:00Z",
+        "sourceIPAddress": "203.0.113.25",
+        "userAgent": "aws-cli/2.0.0",
+        "eventID": "benchmark-event-id"
+    }
+}
+
+SAMPLE_THREAT_ASSESSMENT = {
+    "threat_level": "LOW",
+    "risk_score": 2,
+    "categories": ["reconnaissance"],
+    "patterns_found": {},
+    "ai_reasoning": "benchmark",
+    "timestamp": "2024-01-15T10:30:00Z"
+}
+
+FUNCTIONS = {
+    'threat_detector': SAMPLE_CLOUDTRAIL_EVENT,
+    'incident_response': {
+        'detail': {'threat_assessment': SAMPLE_THREAT_ASSESSMENT, 'original_event': SAMPLE_CLOUDTRAIL_EVENT}
+    },
+    'intel_collector': {
+        'detail': {'threat_assessment': SAMPLE_THREAT_ASSESSMENT, 'original_event': SAMPLE_CLOUDTRAIL_EVENT}
+    },
+    'honeypot_manager': {
+        'detail': {'attack_patterns': {}, 'threat_assessment': SAMPLE_THREAT_ASSESSMENT}
+    }
+}
+
+# Runs in the child interpreter: import the module, then invoke the handler twice
+_CHILD = r'''
+import importlib, json, sys, time
+function, event = sys.argv[1], json.loads(sys.stdin.read())
+result = {}
+start = time.perf_counter()
+module = importlib.import_module(f'src.{function}.lambda_function')
+result['import_ms'] = (time.perf_counter() - start) * 1000
+for label in ('first_invoke_ms', 'warm_invoke_ms'):
+    start = time.perf_counter()
+    try:
+        module.lambda_handler(event, None)
+    except Exception as e:
+        result.setdefault('error', f'{type(e).__name__}: {e}')
+    result[label] = (time.perf_counter() - start) * 1000
+print('BENCHMARK_RESULT ' + json.dumps(result))
+'''
+
+def run_once(function: str) -> Dict[str, Any]:
+    """Measure one cold start of a function in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, '-c', _CHILD, function],
+        input=json.dumps(FUNCTIONS[function]),
+        capture_output=True,
+        text=True,
+        cwd=REPO_ROOT
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith('BENCHMARK_RESULT '):
+            return json.loads(line[len('BENCHMARK_RESULT '):])
+    return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'no result'}
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median of each timing over the runs that produced one."""
+    summary: Dict[str, Any] = {}
+    for metric in ('import_ms', 'first_invoke_ms', 'warm_invoke_ms'):
+        values = [sample[metric] for sample in samples if metric in sample]
+        summary[metric] = round(statistics.median(values), 1) if values else None
+    errors = {sample['error'] for sample in samples if 'error' in sample}
+    if errors:
+        summary['errors'] = sorted(errors)
+    return summary
+
+def main():
+    """Run the benchmark and print a table (or JSON)."""
+    parser = argparse.ArgumentParser(description="SecureShield AI startup benchmark")
+    parser.add_argument("--function", action="append", choices=sorted(FUNCTIONS), help="Function to benchmark (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per function")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    
+    results = {}
+    for function in args.function or sorted(FUNCTIONS):
+        results[function] = summarize([run_once(function) for _ in range(args.runs)])
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    
+    print(f"{'function':<20}{'import ms':>12}{'first invoke ms':>18}{'warm invoke ms':>17}")
+    for function, summary in results.items():
+        print(f"{function:<20}{summary['import_ms'] or '-':>12}{summary['first_invoke_ms'] or '-':>18}{summary['warm_invoke_ms'] or '-':>17}")
+        for error in summary.get('errors', []):
+            print(f"  ! {error}")
+
+if __name__ == "__main__":
+    main()
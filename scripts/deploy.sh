@@ -136,6 +136,24 @@ deploy_infrastructure() {
     log_success "Infrastructure deployed successfully"
 }
 
+# Build the deployment package for one Lambda function
+package_lambda_function() {
+    local function="$1"
+    local build_dir="build/lambda/$function"
+    
+    rm -rf "$build_dir" "build/lambda/$function.zip"
+    mkdir -p "$build_dir/src"
+    
+    # Function modules import shared code as a sibling package (from ..common import ...),
+    # so every artifact carries src/common next to src/$function. Handlers are addressed
+    # from the package root, e.g. src.threat_detector.lambda_handler
+    cp -R "src/$function" "$build_dir/src/"
+    cp -R "src/common" "$build_dir/src/"
+    find "$build_dir" -type d -name "__pycache__" -prune -exec rm -rf {} +
+    
+    (cd "$build_dir" && python3 -m zipfile -c "../$function.zip" src)
+}
+
 # Deploy Lambda functions
 deploy_lambda_functions() {
     log_info "Deploying Lambda functions..."
@@ -150,8 +168,11 @@ deploy_lambda_functions() {
     
     # Deploy each Lambda function
     for function in threat_detector incident_response intel_collector alert_dispatcher honeypot_manager; do
+        log_info "Packaging $function Lambda function..."
+        package_lambda_function "$function"
+        
         log_info "Deploying $function Lambda function..."
-        ./scripts/deploy_lambda.sh "$function" "$ENVIRONMENT"
+        ./scripts/deploy_lambda.sh "$function" "$ENVIRONMENT" "build/lambda/$function.zip"
     done
     
     log_success "Lambda functions deployed"
@@ -0,0 +1,10 @@
+"""
+SecureShield AI - Shared Components
+Building blocks shared by the SecureShield Lambda functions.
+"""
+
+from .events import EventPublisher
+from .metrics import MetricsSink
+
+__all__ = ['EventPublisher', 'MetricsSink']
+__version__ = '1.0.0'
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+SecureShield AI - AWS Client Registry
+Lazily created, container-wide boto3 clients, resources and DynamoDB tables with tuned connection settings.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '50'))
+AWS_MAX_ATTEMPTS = int(os.getenv('AWS_MAX_ATTEMPTS', '5'))
+AWS_CONNECT_TIMEOUT = float(os.getenv('AWS_CONNECT_TIMEOUT', '2'))
+AWS_READ_TIMEOUT = float(os.getenv('AWS_READ_TIMEOUT', '60'))
+
+# Sized for the thread pools the handlers fan out on, with keep-alive so warm
+# invocations reuse connections and adaptive retries that rate-limit on throttling
+DEFAULT_CONFIG = Config(
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=AWS_CONNECT_TIMEOUT,
+    read_timeout=AWS_READ_TIMEOUT,
+    retries={'max_attempts': AWS_MAX_ATTEMPTS, 'mode': 'adaptive'}
+)
+
+class _LazyProxy:
+    """Stands in for a client or resource and creates it on first attribute access."""
+    
+    def __init__(self, factory: Callable[[], Any], description: str):
+        self._factory = factory
+        self._description = description
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._factory(), name)
+    
+    def __repr__(self) -> str:
+        return f'<lazy {self._description}>'
+
+class ClientRegistry:
+    """
+    Creates each boto3 client, resource and Table once per container.
+    
+    Nothing is created until first use, so a cold start only pays for the
+    services the invocation actually calls. Objects come from one private
+    session because boto3's default session is not safe to create clients
+    from concurrently.
+    """
+    
+    def __init__(self, config: Config = DEFAULT_CONFIG, session: Optional[boto3.session.Session] = None):
+        self.config = config
+        self._session = session
+        self._clients: Dict[Tuple[str, Optional[str]], Any] = {}
+        self._resources: Dict[Tuple[str, Optional[str]], Any] = {}
+        self._tables: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+    
+    @property
+    def session(self) -> boto3.session.Session:
+        with self._lock:
+            if self._session is None:
+                self._session = boto3.session.Session()
+            return self._session
+    
+    def client(self, service_name: str, region_name: Optional[str] = None) -> Any:
+        """Return the shared client for a service."""
+        key = (service_name, region_name)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = self.session.client(
+                        service_name, region_name=region_name, config=self.config
+                    )
+        return client
+    
+    def resource(self, service_name: str, region_name: Optional[str] = None) -> Any:
+        """Return the shared resource for a service."""
+        key = (service_name, region_name)
+        resource = self._resources.get(key)
+        if resource is None:
+            with self._lock:
+                resource = self._resources.get(key)
+                if resource is None:
+                    resource = self._resources[key] = self.session.resource(
+                        service_name, region_name=region_name, config=self.config
+                    )
+        return resource
+    
+    def table(self, table_name: str) -> Any:
+        """Return the shared DynamoDB Table object for a table name."""
+        table = self._tables.get(table_name)
+        if table is None:
+            with self._lock:
+                table = self._tables.get(table_name)
+                if table is None:
+                    table = self._tables[table_name] = self.resource('dynamodb').Table(table_name)
+        return table
+    
+    def lazy_client(self, service_name: str, region_name: Optional[str] = None) -> Any:
+        """Return a module-level stand-in that resolves to client() when first used."""
+        return _LazyProxy(lambda: self.client(service_name, region_name), f'{service_name} client')
+    
+    def lazy_resource(self, service_name: str, region_name: Optional[str] = None) -> Any:
+        """Return a module-level stand-in that resolves to resource() when first used."""
+        return _LazyProxy(lambda: self.resource(service_name, region_name), f'{service_name} resource')
+    
+    def lazy_table(self, table_name: str) -> Any:
+        """Return a module-level stand-in that resolves to table() when first used."""
+        return _LazyProxy(lambda: self.table(table_name), f'{table_name} table')
+    
+    def clear(self) -> None:
+        """Drop every cached object, e.g. after credentials change."""
+        with self._lock:
+            self._clients.clear()
+            self._resources.clear()
+            self._tables.clear()
+            self._session = None
+
+registry = ClientRegistry()
+
+client = registry.client
+resource = registry.resource
+table = registry.table
+lazy_client = registry.lazy_client
+lazy_resource = registry.lazy_resource
+lazy_table = registry.lazy_table
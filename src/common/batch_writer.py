@@ -0,0 +1,223 @@
+"""
+SecureShield AI - Buffered Table Writer
+Buffers DynamoDB puts and writes them with BatchWriteItem, retrying unprocessed items and flushing before the Lambda deadline.
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+import structlog
+
+logger = structlog.get_logger()
+
+BATCH_WRITE_MAX_ITEMS = 25
+
+RETRYABLE_ERROR_CODES = frozenset({
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError'
+})
+
+_serializer = TypeSerializer()
+
+class BatchWriteError(Exception):
+    """Raised by flush() with the primary keys of the items that could not be written."""
+    
+    def __init__(self, table_name: str, failed_keys: Iterable[Tuple]):
+        self.table_name = table_name
+        self.failed_keys = list(failed_keys)
+        super().__init__(f'{len(self.failed_keys)} item(s) could not be written to {table_name}')
+
+class BufferedTableWriter:
+    """
+    Write-behind buffer in front of one DynamoDB table.
+    
+    Items are keyed on the table's primary key, so a later put of the same key
+    replaces the buffered one instead of producing a duplicate request (which
+    BatchWriteItem rejects). The buffer is written in chunks of 25 when it
+    reaches max_buffered_items, when flush() is called, or when the invocation
+    registered with watch_deadline() is about to run out of time.
+    
+    Items are serialized one by one in put(), so an item DynamoDB cannot
+    represent is rejected there instead of failing the chunk it would have
+    been sent in, and a chunk rejected as a whole is retried item by item.
+    Items that still cannot be written, including those from automatic
+    flushes, are reported by the next flush() as a BatchWriteError.
+    """
+    
+    def __init__(self, table: Any, key_attributes: Sequence[str], max_buffered_items: int = 100,
+                 max_attempts: int = 8, base_delay: float = 0.05, max_delay: float = 2.0, deadline_margin_ms: int = 1000):
+        if not key_attributes:
+            raise ValueError('key_attributes must name the table primary key')
+        self.table = table
+        self.key_attributes = tuple(key_attributes)
+        self.max_buffered_items = max_buffered_items
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline_margin_ms = deadline_margin_ms
+        self._buffer: 'OrderedDict[Tuple, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._context: Any = None
+        self._timer: Optional[threading.Timer] = None
+        # Keys of items that failed since the last flush() call
+        self._failed: List[Tuple] = []
+        self.stats = {'buffered': 0, 'deduplicated': 0, 'written': 0, 'retries': 0, 'dropped': 0}
+    
+    def key(self, item: Dict[str, Any]) -> Tuple:
+        """The primary key values of an item, as reported in BatchWriteError.failed_keys."""
+        return tuple(item.get(name) for name in self.key_attributes)
+    
+    def put(self, item: Dict[str, Any]) -> None:
+        """
+        Buffer an item, replacing any buffered item with the same primary key.
+        
+        Raises TypeError if the item holds a value DynamoDB cannot store, such as a float.
+        """
+        _serializer.serialize(item)
+        key = self.key(item)
+        with self._lock:
+            if key in self._buffer:
+                self.stats['deduplicated'] += 1
+                del self._buffer[key]
+            self._buffer[key] = item
+            self.stats['buffered'] += 1
+            should_flush = len(self._buffer) >= self.max_buffered_items
+        
+        remaining = self._remaining_ms()
+        if should_flush or (remaining is not None and remaining <= self.deadline_margin_ms):
+            self._flush()
+    
+    def pending(self) -> int:
+        """Number of buffered items."""
+        with self._lock:
+            return len(self._buffer)
+    
+    def watch_deadline(self, context: Any) -> None:
+        """Flush automatically shortly before the invocation described by context times out."""
+        self._cancel_timer()
+        self._context = context
+        remaining = self._remaining_ms()
+        if remaining is None:
+            return
+        delay = (remaining - self.deadline_margin_ms) / 1000
+        if delay <= 0:
+            self._flush()
+            return
+        self._timer = threading.Timer(delay, self._flush_on_deadline)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _flush_on_deadline(self) -> None:
+        logger.warning("batch_writer_deadline_flush", pending=self.pending())
+        self._flush()
+    
+    def _remaining_ms(self) -> Optional[float]:
+        """Milliseconds left in the watched invocation, if known."""
+        get_remaining = getattr(self._context, 'get_remaining_time_in_millis', None)
+        if get_remaining is None:
+            return None
+        remaining = get_remaining()
+        return remaining if isinstance(remaining, (int, float)) else None
+    
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+    
+    def flush(self) -> int:
+        """
+        Write everything buffered so far and return the number of items written.
+        
+        Stops the deadline watch. Raises BatchWriteError if any item could not
+        be written since the previous flush() call.
+        """
+        self._cancel_timer()
+        written = self._flush()
+        with self._lock:
+            failed, self._failed = self._failed, []
+        if failed:
+            raise BatchWriteError(self.table.name, failed)
+        return written
+    
+    def discard(self) -> int:
+        """
+        Stop the deadline watch and drop anything buffered, returning the number of items dropped.
+        
+        Called when an invocation ends without flushing, so that neither the
+        buffer nor a timer armed for its context carries into the next one.
+        """
+        self._cancel_timer()
+        with self._lock:
+            dropped = len(self._buffer)
+            self._buffer.clear()
+            self._failed = []
+            self._context = None
+        if dropped:
+            logger.warning("batch_writer_discarded", table=self.table.name, items=dropped)
+        return dropped
+    
+    def close(self) -> None:
+        """Stop the deadline watch and write anything still buffered."""
+        self.flush()
+    
+    def _flush(self) -> int:
+        """Write the buffer, remembering the keys of items that failed."""
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._buffer.values())
+                self._buffer.clear()
+            
+            failed: List[Dict[str, Any]] = []
+            for start in range(0, len(items), BATCH_WRITE_MAX_ITEMS):
+                failed.extend(self._write_chunk(items[start:start + BATCH_WRITE_MAX_ITEMS]))
+            
+            written = len(items) - len(failed)
+            with self._lock:
+                self.stats['written'] += written
+                self.stats['dropped'] += len(failed)
+                self._failed.extend(self.key(item) for item in failed)
+            return written
+    
+    def _write_chunk(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Write up to 25 items, resending unprocessed ones with full-jitter backoff.
+        
+        A chunk rejected outright is retried one item at a time so a single
+        bad item only fails itself. Returns the items that were not written.
+        """
+        table_name = self.table.name
+        requests = [{'PutRequest': {'Item': item}} for item in items]
+        attempt = 0
+        while requests:
+            try:
+                response = self.table.meta.client.batch_write_item(RequestItems={table_name: requests})
+                unprocessed = response.get('UnprocessedItems', {}).get(table_name, [])
+            except Exception as e:
+                retryable = isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') in RETRYABLE_ERROR_CODES
+                if not retryable:
+                    pending = [request['PutRequest']['Item'] for request in requests]
+                    if len(pending) > 1:
+                        logger.warning("batch_write_rejected_retrying_items", table=table_name, items=len(pending), error=str(e))
+                        return [item for single in pending for item in self._write_chunk([single])]
+                    logger.error("batch_write_failed", table=table_name, key=self.key(pending[0]), error=str(e))
+                    return pending
+                unprocessed = requests
+            
+            if not unprocessed:
+                return []
+            attempt += 1
+            if attempt >= self.max_attempts:
+                logger.error("batch_write_unprocessed_items_dropped", table=table_name, items=len(unprocessed))
+                return [request['PutRequest']['Item'] for request in unprocessed]
+            self.stats['retries'] += 1
+            requests = unprocessed
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))))
+        return []
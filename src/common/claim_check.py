@@ -0,0 +1,188 @@
+"""
+SecureShield AI - Claim Check
+Offloads large event payloads to a content-addressed blob store so events carry only a reference and digest.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+from urllib.parse import urlparse
+
+import structlog
+
+from . import aws
+from .codec import decode_value, encode_value, json_default
+
+logger = structlog.get_logger()
+
+# Configuration
+CLAIM_CHECK_BUCKET = os.getenv('CLAIM_CHECK_BUCKET')
+CLAIM_CHECK_PREFIX = os.getenv('CLAIM_CHECK_PREFIX', 'claim-check/')
+CLAIM_CHECK_PATH = os.getenv('CLAIM_CHECK_PATH')
+CLAIM_CHECK_THRESHOLD_BYTES = int(os.getenv('CLAIM_CHECK_THRESHOLD_BYTES', '4096'))
+CLAIM_CHECK_CACHE_ENTRIES = int(os.getenv('CLAIM_CHECK_CACHE_ENTRIES', '256'))
+
+REFERENCE_KEY = 'claim_check'
+
+class ClaimCheckError(Exception):
+    """A referenced payload could not be fetched, lies outside the configured store, or failed its digest check."""
+
+def canonical_json(payload: Any) -> bytes:
+    """Serialization the digest is computed over; key order does not change it."""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), default=json_default).encode('utf-8')
+
+def is_reference(value: Any) -> bool:
+    """True if value is a claim-check reference rather than an inline payload."""
+    return isinstance(value, dict) and len(value) == 1 and isinstance(value.get(REFERENCE_KEY), dict)
+
+class S3BlobStore:
+    """Blobs as S3 objects under a key prefix."""
+    
+    def __init__(self, bucket: str, prefix: str = CLAIM_CHECK_PREFIX, client: Any = None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client if client is not None else aws.lazy_client('s3')
+    
+    def put(self, name: str, data: bytes) -> str:
+        key = f'{self.prefix}{name}'
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType='application/octet-stream')
+        return f's3://{self.bucket}/{key}'
+    
+    def contains(self, uri: str) -> bool:
+        """True if uri names an object in this store's bucket under its prefix."""
+        parsed = urlparse(uri)
+        return parsed.scheme == 's3' and parsed.netloc == self.bucket and parsed.path.lstrip('/').startswith(self.prefix)
+    
+    def get(self, uri: str) -> bytes:
+        parsed = urlparse(uri)
+        response = self.client.get_object(Bucket=parsed.netloc, Key=parsed.path.lstrip('/'))
+        return response['Body'].read()
+
+class LocalBlobStore:
+    """Blobs as files under a directory, for tests and local replays."""
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def put(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so a concurrent reader never sees a partial blob
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(data)
+        os.replace(temporary, path)
+        return f'file://{os.path.abspath(path)}'
+    
+    def contains(self, uri: str) -> bool:
+        """True if uri names a file beneath this store's root directory."""
+        parsed = urlparse(uri)
+        if parsed.scheme != 'file':
+            return False
+        root = os.path.realpath(self.root)
+        return os.path.realpath(parsed.path).startswith(root + os.sep)
+    
+    def get(self, uri: str) -> bytes:
+        with open(urlparse(uri).path, 'rb') as handle:
+            return handle.read()
+
+class ClaimCheck:
+    """
+    Replaces payloads above threshold_bytes with a reference to a stored copy.
+    
+    Blobs are named by the SHA-256 of the payload's canonical JSON, so the
+    same CloudTrail record forwarded by several functions is stored once, and
+    the reference carries the digest so consumers can verify what they fetch.
+    Resolved payloads are kept in a per-container LRU, which also remembers
+    what this container uploaded so repeats skip the store entirely; callers
+    always get their own copy. Only references into the configured store are
+    resolved, so an event cannot make the function read arbitrary objects or files.
+    """
+    
+    def __init__(self, store: Any = None, threshold_bytes: int = CLAIM_CHECK_THRESHOLD_BYTES,
+                 cache_entries: int = CLAIM_CHECK_CACHE_ENTRIES):
+        self.store = store
+        self.threshold_bytes = threshold_bytes
+        self.cache_entries = cache_entries
+        self._cache: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'offloaded': 0, 'uploads': 0, 'inline': 0, 'hits': 0, 'fetches': 0}
+    
+    def offload(self, payload: Any) -> Any:
+        """Return payload unchanged if small (or no store is configured), otherwise a reference to it."""
+        if self.store is None or payload is None or is_reference(payload):
+            return payload
+        data = canonical_json(payload)
+        if len(data) < self.threshold_bytes:
+            self.stats['inline'] += 1
+            return payload
+        
+        digest = hashlib.sha256(data).hexdigest()
+        name = f'{digest[:2]}/{digest}'
+        with self._lock:
+            cached = self._cache.get(digest)
+        if cached is None:
+            uri = self.store.put(name, encode_value(payload))
+            self.stats['uploads'] += 1
+            self._remember(digest, (uri, copy.deepcopy(payload)))
+        else:
+            uri = cached[0]
+        self.stats['offloaded'] += 1
+        return {REFERENCE_KEY: {'uri': uri, 'sha256': digest, 'bytes': len(data)}}
+    
+    def resolve(self, value: Any) -> Any:
+        """Return the payload behind a reference (fetching it at most once per container), or value itself."""
+        if not is_reference(value):
+            return value
+        reference = value[REFERENCE_KEY]
+        digest = reference.get('sha256')
+        uri = reference.get('uri', '')
+        if self.store is None or not self.store.contains(uri):
+            raise ClaimCheckError(f'Claim-checked payload {uri!r} is outside the configured store')
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                self.stats['hits'] += 1
+                return copy.deepcopy(cached[1])
+        
+        try:
+            payload = decode_value(self.store.get(uri))
+        except Exception as e:
+            raise ClaimCheckError(f'Failed to fetch claim-checked payload {uri}: {e}') from e
+        if hashlib.sha256(canonical_json(payload)).hexdigest() != digest:
+            raise ClaimCheckError(f'Digest mismatch for claim-checked payload {uri}')
+        self.stats['fetches'] += 1
+        self._remember(digest, (uri, copy.deepcopy(payload)))
+        return payload
+    
+    def _remember(self, digest: str, entry: Any) -> None:
+        with self._lock:
+            self._cache[digest] = entry
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+@lru_cache(maxsize=1)
+def get_claim_check() -> ClaimCheck:
+    """The container-wide claim check; offloading is enabled by CLAIM_CHECK_BUCKET or CLAIM_CHECK_PATH."""
+    if CLAIM_CHECK_BUCKET:
+        store: Any = S3BlobStore(CLAIM_CHECK_BUCKET)
+    elif CLAIM_CHECK_PATH:
+        store = LocalBlobStore(CLAIM_CHECK_PATH)
+    else:
+        store = None
+    return ClaimCheck(store)
+
+def offload(payload: Any) -> Any:
+    """Offload a payload with the container-wide claim check."""
+    return get_claim_check().offload(payload)
+
+def resolve(value: Any) -> Any:
+    """Resolve a possibly claim-checked payload with the container-wide claim check."""
+    return get_claim_check().resolve(value)
@@ -0,0 +1,93 @@
+"""
+SecureShield AI - Attribute Codec
+Compact binary encoding for bulky DynamoDB attributes: compressed JSON behind a version and codec header.
+"""
+
+import json
+import zlib
+from decimal import Decimal
+from typing import Dict, Any, Iterable, Optional
+
+from boto3.dynamodb.types import Binary
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+FORMAT_VERSION = 1
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# Values smaller than this are stored uncompressed; compression only adds overhead
+MIN_COMPRESS_BYTES = 128
+
+# Bulky threat-intel attributes that are never used in key conditions or filters
+THREAT_INTEL_ENCODED_ATTRIBUTES = ('patterns_found', 'ai_reasoning', 'event_details', 'attack_patterns')
+
+def json_default(value: Any) -> Any:
+    """Serialize the non-JSON types boto3 hands back (Decimal, sets)."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def encode_value(value: Any, level: int = 6) -> bytes:
+    """Encode a JSON-compatible value as header + (possibly compressed) compact JSON."""
+    payload = json.dumps(value, separators=(',', ':'), default=json_default).encode('utf-8')
+    codec = CODEC_RAW
+    if len(payload) >= MIN_COMPRESS_BYTES:
+        if zstandard is not None:
+            compressed = zstandard.ZstdCompressor(level=level).compress(payload)
+            candidate = CODEC_ZSTD
+        else:
+            compressed = zlib.compress(payload, level)
+            candidate = CODEC_ZLIB
+        if len(compressed) < len(payload):
+            payload, codec = compressed, candidate
+    return bytes((FORMAT_VERSION, codec)) + payload
+
+def decode_value(blob: Any) -> Any:
+    """Decode bytes produced by encode_value (accepts boto3 Binary wrappers)."""
+    data = bytes(blob.value if isinstance(blob, Binary) else blob)
+    if len(data) < 2 or data[0] != FORMAT_VERSION:
+        raise ValueError('Unsupported encoded attribute version')
+    codec, payload = data[1], data[2:]
+    if codec == CODEC_ZLIB:
+        payload = zlib.decompress(payload)
+    elif codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError('Attribute is zstd-compressed but the zstandard package is not installed')
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec != CODEC_RAW:
+        raise ValueError(f'Unknown attribute codec: {codec}')
+    return json.loads(payload)
+
+def encode_item(item: Dict[str, Any], attributes: Iterable[str]) -> Dict[str, Any]:
+    """Return a copy of item with the named attributes encoded; key and index attributes should not be listed."""
+    encoded = dict(item)
+    for name in attributes:
+        if encoded.get(name) is not None:
+            encoded[name] = encode_value(encoded[name])
+    return encoded
+
+def decode_item(item: Optional[Dict[str, Any]], attributes: Iterable[str]) -> Optional[Dict[str, Any]]:
+    """
+    Return a copy of item with the named attributes decoded.
+    
+    Attributes that are not binary are returned unchanged, so items written
+    before encoding was introduced read the same way as new ones.
+    """
+    if item is None:
+        return None
+    decoded = dict(item)
+    for name in attributes:
+        value = decoded.get(name)
+        if isinstance(value, (bytes, bytearray, Binary)):
+            decoded[name] = decode_value(value)
+    return decoded
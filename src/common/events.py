@@ -0,0 +1,173 @@
+"""
+SecureShield AI - Event Publisher
+Buffers EventBridge entries and sends them with batched, size-checked PutEvents calls, resending only failed entries.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence
+
+from botocore.exceptions import ClientError
+import structlog
+
+from .codec import json_default
+
+logger = structlog.get_logger()
+
+EVENT_SLIM_PAYLOADS = os.getenv('EVENT_SLIM_PAYLOADS', 'true').lower() == 'true'
+
+PUT_EVENTS_MAX_ENTRIES = 10
+# The 256 KB limit applies to the whole request, so it is also the largest possible entry
+PUT_EVENTS_MAX_REQUEST_BYTES = 256 * 1024
+# Size EventBridge charges for the Time field of an entry
+_TIME_FIELD_BYTES = 14
+
+# CloudTrail fields the downstream functions read from original_event
+CLOUDTRAIL_DETAIL_FIELDS = (
+    'eventID', 'eventName', 'eventTime', 'eventSource', 'eventType', 'awsRegion', 'sourceIPAddress',
+    'userAgent', 'userIdentity', 'requestParameters', 'responseElements', 'errorCode', 'errorMessage', 'resources'
+)
+EVENT_ENVELOPE_FIELDS = ('id', 'source', 'detail-type', 'time', 'account', 'region')
+
+def slim_event(event: Dict[str, Any], detail_fields: Sequence[str] = CLOUDTRAIL_DETAIL_FIELDS) -> Dict[str, Any]:
+    """Copy of an EventBridge/CloudTrail event keeping only the envelope and the detail fields consumers read."""
+    slim = {name: event[name] for name in EVENT_ENVELOPE_FIELDS if name in event}
+    detail = event.get('detail') or {}
+    slim['detail'] = {name: detail[name] for name in detail_fields if name in detail}
+    return slim
+
+def entry_size(entry: Dict[str, Any]) -> int:
+    """Size of a PutEvents entry as EventBridge calculates it against the request limit."""
+    size = _TIME_FIELD_BYTES if entry.get('Time') else 0
+    for name in ('Source', 'DetailType', 'Detail'):
+        if entry.get(name):
+            size += len(entry[name].encode('utf-8'))
+    for resource in entry.get('Resources', ()):
+        size += len(resource.encode('utf-8'))
+    return size
+
+class EventPublisher:
+    """
+    Batched PutEvents for one event source.
+    
+    publish() only buffers the entry; flush() packs buffered entries into
+    requests of at most 10 entries and 256 KB, and a full buffer flushes
+    itself. When PutEvents reports FailedEntryCount, only the entries with an
+    ErrorCode are resent, with jittered backoff. Entries that can never fit a
+    request are dropped and logged rather than failing the whole batch.
+    """
+    
+    def __init__(self, client: Any, source: str, event_bus_name: Optional[str] = None, max_attempts: int = 3,
+                 base_delay: float = 0.05, max_delay: float = 1.0, max_buffered_entries: int = PUT_EVENTS_MAX_ENTRIES):
+        self.client = client
+        self.source = source
+        self.event_bus_name = event_bus_name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_buffered_entries = max_buffered_entries
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {'published': 0, 'failed': 0, 'oversized': 0, 'requests': 0, 'retries': 0}
+    
+    def publish(self, detail_type: str, detail: Dict[str, Any], resources: Optional[Sequence[str]] = None) -> bool:
+        """Buffer one event; returns False if it is too large to ever be sent."""
+        entry = {
+            'Source': self.source,
+            'DetailType': detail_type,
+            'Detail': json.dumps(detail, separators=(',', ':'), default=json_default)
+        }
+        if resources:
+            entry['Resources'] = list(resources)
+        if self.event_bus_name:
+            entry['EventBusName'] = self.event_bus_name
+        
+        size = entry_size(entry)
+        if size > PUT_EVENTS_MAX_REQUEST_BYTES:
+            logger.error("event_too_large", source=self.source, detail_type=detail_type, size=size)
+            with self._lock:
+                self.stats['oversized'] += 1
+            return False
+        
+        with self._lock:
+            self._buffer.append(entry)
+            should_flush = len(self._buffer) >= self.max_buffered_entries
+        if should_flush:
+            self.flush()
+        return True
+    
+    def pending(self) -> int:
+        """Number of buffered entries."""
+        with self._lock:
+            return len(self._buffer)
+    
+    def flush(self) -> int:
+        """Send every buffered entry and return the number EventBridge accepted."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            
+            published = 0
+            for request in self._requests(entries):
+                published += self._send(request)
+            
+            with self._lock:
+                self.stats['published'] += published
+                self.stats['failed'] += len(entries) - published
+            return published
+    
+    @staticmethod
+    def _requests(entries: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Pack entries, in order, into requests within the entry-count and size limits."""
+        requests: List[List[Dict[str, Any]]] = []
+        current: List[Dict[str, Any]] = []
+        current_size = 0
+        for entry in entries:
+            size = entry_size(entry)
+            if current and (len(current) >= PUT_EVENTS_MAX_ENTRIES or current_size + size > PUT_EVENTS_MAX_REQUEST_BYTES):
+                requests.append(current)
+                current, current_size = [], 0
+            current.append(entry)
+            current_size += size
+        if current:
+            requests.append(current)
+        return requests
+    
+    def _send(self, entries: List[Dict[str, Any]]) -> int:
+        """Send one request, resending failed entries; returns the number accepted."""
+        pending = entries
+        attempt = 0
+        while pending:
+            try:
+                self.stats['requests'] += 1
+                response = self.client.put_events(Entries=pending)
+                if response.get('FailedEntryCount', 0):
+                    # Result entries are in request order; failed ones carry an ErrorCode
+                    failed = [
+                        entry for entry, result in zip(pending, response.get('Entries', []))
+                        if result.get('ErrorCode')
+                    ]
+                else:
+                    failed = []
+            except ClientError as e:
+                logger.warning("put_events_failed", source=self.source, entries=len(pending), error=str(e))
+                failed = pending
+            except Exception as e:
+                logger.error("put_events_failed", source=self.source, entries=len(pending), error=str(e))
+                break
+            
+            if not failed:
+                return len(entries)
+            attempt += 1
+            pending = failed
+            if attempt >= self.max_attempts:
+                break
+            self.stats['retries'] += 1
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))))
+        
+        logger.error("events_not_published", source=self.source, entries=len(pending))
+        return len(entries) - len(pending)
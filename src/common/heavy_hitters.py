@@ -0,0 +1,299 @@
+"""
+SecureShield AI - Heavy Hitters
+Space-Saving top-K of the noisiest source IPs and principals over rolling windows, per container and shared.
+"""
+
+import heapq
+import os
+import threading
+import time
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from botocore.exceptions import ClientError
+import structlog
+
+from . import aws
+from .codec import decode_value, encode_value
+
+logger = structlog.get_logger()
+
+# Configuration
+HEAVY_HITTERS_TABLE = os.getenv('HEAVY_HITTERS_TABLE')
+HEAVY_HITTERS_CAPACITY = int(os.getenv('HEAVY_HITTERS_CAPACITY', '200'))
+HEAVY_HITTERS_MERGE_SECONDS = float(os.getenv('HEAVY_HITTERS_MERGE_SECONDS', '60'))
+
+DIMENSIONS = ('source_ip', 'principal')
+WINDOWS = {'5m': 300, '1h': 3600, '24h': 86400}
+BUCKET_WIDTHS = (300, 3600)
+# A window is answered from at most this many whole buckets of one width, plus the current partial one
+MAX_WINDOW_BUCKETS = 24
+SHARED_MERGE_ATTEMPTS = 5
+
+class SpaceSaving:
+    """
+    Space-Saving top-K summary over at most capacity keys.
+    
+    Each count overestimates the true count by at most its error, and every
+    key seen more than total/capacity times is guaranteed to be tracked. The
+    minimum is found through a heap whose entries may lag behind the counts
+    and are refreshed when popped, so add() is O(log capacity) amortized.
+    """
+    
+    def __init__(self, capacity: int = HEAVY_HITTERS_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        self._heap: List[Tuple[int, str]] = []
+    
+    def __len__(self) -> int:
+        return len(self.counts)
+    
+    def add(self, key: str, count: int = 1) -> None:
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+            heapq.heappush(self._heap, (count, key))
+            return
+        # Full: the new key takes over the smallest counter and inherits its count as error
+        minimum, evicted = self._pop_minimum()
+        del self.counts[evicted], self.errors[evicted]
+        self.counts[key] = minimum + count
+        self.errors[key] = minimum
+        heapq.heappush(self._heap, (minimum + count, key))
+    
+    def _pop_minimum(self) -> Tuple[int, str]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            current = self.counts[key]
+            if current == count:
+                return count, key
+            heapq.heappush(self._heap, (current, key))
+    
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        """Sum both summaries key by key and keep the capacity largest."""
+        counts = dict(self.counts)
+        errors = dict(self.errors)
+        for key, count in other.counts.items():
+            counts[key] = counts.get(key, 0) + count
+            errors[key] = errors.get(key, 0) + other.errors[key]
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = {key: counts[key] for key in kept}
+        self.errors = {key: errors[key] for key in kept}
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+        self.total += other.total
+        return self
+    
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        """The k largest (key, count) pairs, largest first."""
+        return heapq.nlargest(k, self.counts.items(), key=itemgetter(1))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'counts': {key: [count, self.errors[key]] for key, count in self.counts.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SpaceSaving':
+        summary = cls(int(data['capacity']))
+        summary.total = int(data['total'])
+        summary.counts = {key: int(count) for key, (count, _) in data['counts'].items()}
+        summary.errors = {key: int(error) for key, (_, error) in data['counts'].items()}
+        summary._heap = [(count, key) for key, count in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+def window_buckets(window: Union[str, int], now: float) -> Tuple[int, List[int]]:
+    """Bucket width and bucket start times covering the window that ends now."""
+    seconds = WINDOWS[window] if isinstance(window, str) else int(window)
+    width = next((width for width in BUCKET_WIDTHS if seconds <= width * MAX_WINDOW_BUCKETS), None)
+    if width is None:
+        raise ValueError(f'Window of {seconds}s exceeds the {BUCKET_WIDTHS[-1] * MAX_WINDOW_BUCKETS}s retained')
+    last = int(now // width) * width
+    first = int((now - seconds) // width) * width
+    return width, list(range(first, last + width, width))
+
+def bucket_id(dimension: str, width: int, start: int) -> str:
+    return f'{dimension}#{width}#{start}'
+
+def _ranked(summary: SpaceSaving, k: int, dimension: str) -> List[Dict[str, Any]]:
+    return [{dimension: key, 'count': count} for key, count in summary.top(k)]
+
+class SharedHeavyHitters:
+    """
+    Heavy hitters merged across containers into one DynamoDB item per dimension and time bucket.
+    
+    Each item holds an encoded Space-Saving summary, so it stays the same
+    size however many containers contribute. Merges read the item, combine
+    the summaries and write back only if the version is unchanged, retrying
+    on conflicts; queries fetch a window's buckets with one BatchGetItem.
+    """
+    
+    def __init__(self, table: Any, resource: Any = None, ttl_seconds: int = 2 * 86400):
+        self.table = table
+        self.resource = resource if resource is not None else aws.lazy_resource('dynamodb')
+        self.ttl_seconds = ttl_seconds
+    
+    def merge(self, dimension: str, width: int, start: int, summary: SpaceSaving) -> bool:
+        """Fold a container's summary for one bucket into the shared item; False if contention persisted."""
+        key = {'bucket_id': bucket_id(dimension, width, start)}
+        for _ in range(SHARED_MERGE_ATTEMPTS):
+            item = self.table.get_item(Key=key, ConsistentRead=True).get('Item')
+            merged = SpaceSaving.from_dict(decode_value(item['summary'])) if item else SpaceSaving(summary.capacity)
+            merged.merge(summary)
+            version = item.get('version') if item else None
+            if version is None:
+                condition, values = 'attribute_not_exists(bucket_id)', None
+            else:
+                condition, values = 'version = :version', {':version': version}
+            arguments: Dict[str, Any] = {
+                'Item': dict(
+                    key,
+                    dimension=dimension,
+                    bucket_width=width,
+                    bucket_start=start,
+                    summary=encode_value(merged.to_dict()),
+                    version=int(version or 0) + 1,
+                    ttl=start + width + self.ttl_seconds
+                ),
+                'ConditionExpression': condition
+            }
+            if values:
+                arguments['ExpressionAttributeValues'] = values
+            try:
+                self.table.put_item(**arguments)
+                return True
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+        return False
+    
+    def top_talkers(self, window: Union[str, int] = '1h', k: int = 50, dimension: str = 'source_ip',
+                    now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The k noisiest keys over the window, across every container."""
+        width, starts = window_buckets(window, time.time() if now is None else now)
+        merged = SpaceSaving(HEAVY_HITTERS_CAPACITY)
+        for item in self._batch_get([{'bucket_id': bucket_id(dimension, width, start)} for start in starts]):
+            merged.merge(SpaceSaving.from_dict(decode_value(item['summary'])))
+        return _ranked(merged, k, dimension)
+    
+    def _batch_get(self, keys: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        table_name = self.table.name
+        request = {table_name: {'Keys': keys, 'ProjectionExpression': 'summary'}}
+        items: List[Dict[str, Any]] = []
+        for _ in range(SHARED_MERGE_ATTEMPTS):
+            response = self.resource.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+        else:
+            logger.warning("heavy_hitter_buckets_unprocessed", table=table_name)
+        return items
+
+class HeavyHitterTracker:
+    """
+    Per-container heavy hitters in 5-minute and 1-hour buckets, periodically merged into the shared table.
+    
+    Every recorded event updates one Space-Saving summary per dimension and
+    bucket width, so memory is bounded by capacity times the retained
+    buckets. Counts since the last merge are kept in separate summaries and
+    handed to the shared store at most every merge_seconds.
+    """
+    
+    def __init__(self, shared: Optional[SharedHeavyHitters] = None, capacity: int = HEAVY_HITTERS_CAPACITY,
+                 merge_seconds: float = HEAVY_HITTERS_MERGE_SECONDS, clock: Any = time.time):
+        self.shared = shared
+        self.capacity = capacity
+        self.merge_seconds = merge_seconds
+        self.clock = clock
+        self._buckets: Dict[Tuple[str, int, int], SpaceSaving] = {}
+        self._unmerged: Dict[Tuple[str, int, int], SpaceSaving] = {}
+        self._last_merge = clock()
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'merged': 0, 'merge_failures': 0}
+    
+    def record(self, source_ip: Optional[str] = None, principal: Optional[str] = None, count: int = 1,
+               timestamp: Optional[float] = None) -> None:
+        """Count an event against its source IP and principal."""
+        now = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            for dimension, key in zip(DIMENSIONS, (source_ip, principal)):
+                if not key:
+                    continue
+                for width in BUCKET_WIDTHS:
+                    bucket = (dimension, width, int(now // width) * width)
+                    self._summary(self._buckets, bucket, now).add(key, count)
+                    if self.shared is not None:
+                        self._summary(self._unmerged, bucket, None).add(key, count)
+            self.stats['recorded'] += 1
+    
+    def _summary(self, summaries: Dict[Tuple[str, int, int], SpaceSaving], bucket: Tuple[str, int, int],
+                 now: Optional[float]) -> SpaceSaving:
+        summary = summaries.get(bucket)
+        if summary is None:
+            summary = summaries[bucket] = SpaceSaving(self.capacity)
+            if now is not None:
+                self._expire(now)
+        return summary
+    
+    def _expire(self, now: float) -> None:
+        """Drop local buckets too old for any window."""
+        for bucket in [b for b in self._buckets if b[2] < now - b[1] * (MAX_WINDOW_BUCKETS + 1)]:
+            del self._buckets[bucket]
+    
+    def top_talkers(self, window: Union[str, int] = '1h', k: int = 50, dimension: str = 'source_ip',
+                    now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The k noisiest keys this container has seen over the window."""
+        width, starts = window_buckets(window, self.clock() if now is None else now)
+        merged = SpaceSaving(self.capacity)
+        with self._lock:
+            for start in starts:
+                summary = self._buckets.get((dimension, width, start))
+                if summary is not None:
+                    merged.merge(summary)
+        return _ranked(merged, k, dimension)
+    
+    def merge_shared(self, force: bool = False) -> int:
+        """Merge counts recorded since the last merge into the shared table if due; returns buckets merged."""
+        if self.shared is None or (not force and self.clock() - self._last_merge < self.merge_seconds):
+            return 0
+        with self._lock:
+            unmerged, self._unmerged = self._unmerged, {}
+            self._last_merge = self.clock()
+        
+        merged = 0
+        for (dimension, width, start), summary in unmerged.items():
+            try:
+                if not self.shared.merge(dimension, width, start, summary):
+                    raise RuntimeError('version conflicts persisted')
+                merged += 1
+            except Exception as e:
+                logger.warning("heavy_hitter_merge_failed", dimension=dimension, bucket_start=start, error=str(e))
+                self.stats['merge_failures'] += 1
+                # Keep the counts for the next merge
+                with self._lock:
+                    self._summary(self._unmerged, (dimension, width, start), None).merge(summary)
+        self.stats['merged'] += merged
+        return merged
+
+@lru_cache(maxsize=1)
+def get_shared() -> Optional[SharedHeavyHitters]:
+    """The shared heavy-hitter store, if HEAVY_HITTERS_TABLE is configured."""
+    return SharedHeavyHitters(aws.lazy_table(HEAVY_HITTERS_TABLE)) if HEAVY_HITTERS_TABLE else None
+
+def top_talkers(window: Union[str, int] = '1h', k: int = 50, dimension: str = 'source_ip') -> List[Dict[str, Any]]:
+    """The k noisiest source IPs (or principals) over a 5m, 1h or 24h window, across all collectors."""
+    shared = get_shared()
+    if shared is None:
+        raise ValueError('HEAVY_HITTERS_TABLE is not configured')
+    return shared.top_talkers(window, k, dimension)
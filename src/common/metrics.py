@@ -0,0 +1,165 @@
+"""
+SecureShield AI - Metrics Sink
+Aggregates custom metrics in-process and flushes them once per invocation as EMF log lines or batched PutMetricData calls.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+import structlog
+
+from . import aws
+
+logger = structlog.get_logger()
+
+# 'api' keeps publishing through PutMetricData; 'emf' writes Embedded Metric Format log lines instead
+METRICS_MODE = os.getenv('METRICS_MODE', 'api')
+
+# CloudWatch limits
+EMF_MAX_VALUES_PER_METRIC = 100
+EMF_MAX_METRICS_PER_LINE = 100
+API_MAX_VALUES_PER_DATUM = 150
+API_MAX_DATUMS_PER_REQUEST = 1000
+
+MetricKey = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+class MetricsSink:
+    """
+    Buffers counters and distributions and emits them in bulk.
+    
+    Counters are summed per (name, unit, dimensions). Distributions keep a
+    value -> occurrence count map so PutMetricData can send Values/Counts
+    pairs. In 'emf' mode metrics are printed as CloudWatch Embedded Metric
+    Format lines, which CloudWatch Logs turns into metrics with no API calls;
+    in 'api' mode they are sent with as few PutMetricData calls as the limits allow.
+    """
+    
+    def __init__(self, namespace: str, mode: str = METRICS_MODE, cloudwatch_client: Any = None):
+        if mode not in ('emf', 'api'):
+            raise ValueError(f'Unsupported metrics mode: {mode}')
+        self.namespace = namespace
+        self.mode = mode
+        self._cloudwatch = cloudwatch_client
+        self._counters: Dict[MetricKey, float] = {}
+        self._distributions: Dict[MetricKey, Dict[float, int]] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(name: str, unit: str, dimensions: Optional[Dict[str, str]]) -> MetricKey:
+        return name, unit, tuple(sorted((dimensions or {}).items()))
+    
+    def count(self, name: str, value: float = 1, dimensions: Optional[Dict[str, str]] = None, unit: str = 'Count') -> None:
+        """Add to a counter."""
+        key = self._key(name, unit, dimensions)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def record(self, name: str, value: float, dimensions: Optional[Dict[str, str]] = None, unit: str = 'None') -> None:
+        """Record one observation of a distribution."""
+        key = self._key(name, unit, dimensions)
+        with self._lock:
+            values = self._distributions.setdefault(key, {})
+            values[value] = values.get(value, 0) + 1
+    
+    def pending(self) -> int:
+        """Number of buffered metric series."""
+        with self._lock:
+            return len(self._counters) + len(self._distributions)
+    
+    def flush(self) -> None:
+        """Emit and clear everything buffered so far."""
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            distributions, self._distributions = self._distributions, {}
+        if not counters and not distributions:
+            return
+        try:
+            if self.mode == 'emf':
+                self._flush_emf(counters, distributions)
+            else:
+                self._flush_api(counters, distributions)
+        except Exception as e:
+            logger.error("failed_to_flush_metrics", namespace=self.namespace, error=str(e))
+    
+    def _flush_emf(self, counters: Dict[MetricKey, float], distributions: Dict[MetricKey, Dict[float, int]]) -> None:
+        """Print one EMF document per dimension set (and per 100 metrics)."""
+        by_dimensions: Dict[Tuple[Tuple[str, str], ...], List[Tuple[str, str, List[float]]]] = {}
+        for (name, unit, dimensions), total in counters.items():
+            by_dimensions.setdefault(dimensions, []).append((name, unit, [total]))
+        for (name, unit, dimensions), values in distributions.items():
+            samples = [value for value, occurrences in values.items() for _ in range(occurrences)]
+            for start in range(0, len(samples), EMF_MAX_VALUES_PER_METRIC):
+                by_dimensions.setdefault(dimensions, []).append((name, unit, samples[start:start + EMF_MAX_VALUES_PER_METRIC]))
+        
+        timestamp = int(time.time() * 1000)
+        for dimensions, metrics in by_dimensions.items():
+            self._emit_emf_documents(timestamp, dimensions, metrics)
+        sys.stdout.flush()
+    
+    def _emit_emf_documents(self, timestamp: int, dimensions: Tuple[Tuple[str, str], ...],
+                            metrics: List[Tuple[str, str, List[float]]]) -> None:
+        """Split metrics for one dimension set into EMF documents and print them."""
+        remaining = list(metrics)
+        while remaining:
+            # A metric name may appear once per document, so further chunks of
+            # the same distribution are deferred to the next document
+            document_metrics, deferred, names = [], [], set()
+            for metric in remaining:
+                if metric[0] in names or len(document_metrics) >= EMF_MAX_METRICS_PER_LINE:
+                    deferred.append(metric)
+                else:
+                    names.add(metric[0])
+                    document_metrics.append(metric)
+            remaining = deferred
+            
+            document: Dict[str, Any] = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [[name for name, _ in dimensions]],
+                        'Metrics': [{'Name': name, 'Unit': unit} for name, unit, _ in document_metrics]
+                    }]
+                }
+            }
+            document.update(dict(dimensions))
+            for name, _, values in document_metrics:
+                document[name] = values[0] if len(values) == 1 else values
+            sys.stdout.write(json.dumps(document) + '\n')
+    
+    def _flush_api(self, counters: Dict[MetricKey, float], distributions: Dict[MetricKey, Dict[float, int]]) -> None:
+        """Send buffered metrics with batched PutMetricData calls."""
+        datums: List[Dict[str, Any]] = []
+        for (name, unit, dimensions), total in counters.items():
+            datums.append(self._datum(name, unit, dimensions, Value=total))
+        for (name, unit, dimensions), values in distributions.items():
+            items = list(values.items())
+            for start in range(0, len(items), API_MAX_VALUES_PER_DATUM):
+                chunk = items[start:start + API_MAX_VALUES_PER_DATUM]
+                datums.append(self._datum(
+                    name, unit, dimensions,
+                    Values=[value for value, _ in chunk],
+                    Counts=[float(occurrences) for _, occurrences in chunk]
+                ))
+        
+        if self._cloudwatch is None:
+            self._cloudwatch = aws.client('cloudwatch')
+        for start in range(0, len(datums), API_MAX_DATUMS_PER_REQUEST):
+            self._cloudwatch.put_metric_data(
+                Namespace=self.namespace,
+                MetricData=datums[start:start + API_MAX_DATUMS_PER_REQUEST]
+            )
+    
+    @staticmethod
+    def _datum(name: str, unit: str, dimensions: Tuple[Tuple[str, str], ...], **values: Any) -> Dict[str, Any]:
+        datum = {
+            'MetricName': name,
+            'Unit': unit,
+            'Dimensions': [{'Name': dim_name, 'Value': dim_value} for dim_name, dim_value in dimensions]
+        }
+        datum.update(values)
+        return datum
@@ -0,0 +1,27 @@
+"""
+SecureShield AI - Batch Records
+Decoding of SQS and Kinesis records shared by the batch handlers.
+"""
+
+import base64
+import json
+from typing import Dict, Any
+
+def record_identifier(record: Dict[str, Any]) -> str:
+    """Return the identifier Lambda expects in batchItemFailures for a record."""
+    if 'kinesis' in record:
+        return record['kinesis'].get('sequenceNumber', '')
+    return record.get('messageId', '')
+
+def decode_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode an SQS or Kinesis record into an EventBridge-shaped event."""
+    if 'kinesis' in record:
+        payload = json.loads(base64.b64decode(record['kinesis']['data']))
+    else:
+        payload = json.loads(record['body'])
+    
+    # Bare CloudTrail records are wrapped so they read like EventBridge events
+    if 'detail' not in payload and 'eventName' in payload:
+        payload = {'id': payload.get('eventID'), 'detail': payload}
+    
+    return payload
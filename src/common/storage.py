@@ -0,0 +1,326 @@
+"""
+SecureShield AI - Storage Backends
+Pluggable persistence for the Lambda functions: DynamoDB in AWS, or an embedded SQLite database for local runs and replays.
+"""
+
+import abc
+import base64
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+
+import structlog
+
+from . import aws
+from .batch_writer import BatchWriteError, BufferedTableWriter
+from .codec import json_default
+
+logger = structlog.get_logger()
+
+# Configuration
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'dynamodb').lower()
+STORAGE_SQLITE_PATH = os.getenv('STORAGE_SQLITE_PATH', '/tmp/secureshield.db')
+
+# SQLite has no key schema; items are keyed on the first of these attributes they carry
+SQLITE_KEY_ATTRIBUTES = ('intelligence_id', 'event_id')
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    table_name TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    source_ip TEXT,
+    threat_level TEXT,
+    timestamp TEXT,
+    item TEXT NOT NULL,
+    PRIMARY KEY (table_name, item_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_source_ip ON items (table_name, source_ip, timestamp);
+CREATE INDEX IF NOT EXISTS items_threat_level ON items (table_name, threat_level, timestamp);
+CREATE INDEX IF NOT EXISTS items_timestamp ON items (table_name, timestamp);
+CREATE TABLE IF NOT EXISTS attacker_profiles (
+    source_ip TEXT PRIMARY KEY,
+    last_activity TEXT,
+    profile TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attacker_profiles_last_activity ON attacker_profiles (last_activity);
+"""
+
+def _item_default(value: Any) -> Any:
+    """Like json_default, but keeps bytes (encoded attributes) round-trippable."""
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(bytes(value)).decode('ascii')}
+    return json_default(value)
+
+def _item_hook(value: Dict[str, Any]) -> Any:
+    if len(value) == 1 and '__bytes__' in value:
+        return base64.b64decode(value['__bytes__'])
+    return value
+
+def dump_item(item: Dict[str, Any]) -> str:
+    """Serialize an item for SQLite storage."""
+    return json.dumps(item, separators=(',', ':'), default=_item_default)
+
+def load_item(data: str) -> Dict[str, Any]:
+    """Inverse of dump_item."""
+    return json.loads(data, object_hook=_item_hook)
+
+class SQLiteDatabase:
+    """
+    One embedded SQLite database shared by every writer and store in the process.
+    
+    The connection is opened on first use in WAL mode with synchronous=NORMAL,
+    so readers never block the writer and a commit costs no fsync. Writes go
+    through transaction(), which serializes threads on one connection.
+    """
+    
+    def __init__(self, path: str = STORAGE_SQLITE_PATH, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            with self._lock:
+                if self._connection is None:
+                    self._connection = self._connect()
+        return self._connection
+    
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; transaction() issues BEGIN IMMEDIATE explicitly
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SQLITE_SCHEMA)
+        logger.info("sqlite_storage_opened", path=self.path)
+        return connection
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block of statements as one write transaction."""
+        with self._lock:
+            connection = self.connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+    
+    def query(self, sql: str, parameters: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        """Run a read-only statement and return all rows."""
+        with self._lock:
+            return self.connection.execute(sql, parameters).fetchall()
+    
+    def put_items(self, table_name: str, items: Sequence[Dict[str, Any]],
+                  key_attributes: Sequence[str] = SQLITE_KEY_ATTRIBUTES) -> int:
+        """Insert or replace items in one transaction."""
+        rows = [
+            (
+                table_name,
+                self.item_key(item, key_attributes),
+                item.get('source_ip'),
+                item.get('threat_level'),
+                item.get('timestamp'),
+                dump_item(item)
+            )
+            for item in items
+        ]
+        with self.transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO items (table_name, item_key, source_ip, threat_level, timestamp, item) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+        return len(rows)
+    
+    def get_items(self, table_name: str, source_ip: Optional[str] = None, threat_level: Optional[str] = None,
+                  start: Optional[str] = None, end: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Items of one table in time order, filtered on the indexed attributes."""
+        clauses, parameters = ['table_name = ?'], [table_name]
+        for column, value in (('source_ip', source_ip), ('threat_level', threat_level)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                parameters.append(value)
+        if start is not None:
+            clauses.append('timestamp >= ?')
+            parameters.append(start)
+        if end is not None:
+            clauses.append('timestamp <= ?')
+            parameters.append(end)
+        sql = f'SELECT item FROM items WHERE {" AND ".join(clauses)} ORDER BY timestamp'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        return [load_item(row[0]) for row in self.query(sql, parameters)]
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+    
+    @staticmethod
+    def item_key(item: Dict[str, Any], key_attributes: Sequence[str] = SQLITE_KEY_ATTRIBUTES) -> str:
+        """The stored key: the first key attribute the item carries, or a random one."""
+        for name in key_attributes:
+            if item.get(name) is not None:
+                return str(item[name])
+        return uuid.uuid4().hex
+
+class SQLiteTableWriter:
+    """
+    BufferedTableWriter counterpart that writes to the embedded database.
+    
+    Buffered items are written in one transaction per flush, which is what
+    makes SQLite fast; committing per item would be dominated by WAL appends.
+    """
+    
+    def __init__(self, database: SQLiteDatabase, table_name: str, key_attributes: Optional[Sequence[str]] = None,
+                 max_buffered_items: int = 1000):
+        self.database = database
+        self.table_name = table_name
+        self.key_attributes = tuple(key_attributes) if key_attributes else SQLITE_KEY_ATTRIBUTES
+        self.max_buffered_items = max_buffered_items
+        self._buffer: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._failed: List[tuple] = []
+        self.stats = {'buffered': 0, 'deduplicated': 0, 'written': 0, 'retries': 0, 'dropped': 0}
+    
+    def key(self, item: Dict[str, Any]) -> tuple:
+        """The key values of an item, as reported in BatchWriteError.failed_keys."""
+        return tuple(item.get(name) for name in self.key_attributes)
+    
+    def put(self, item: Dict[str, Any]) -> None:
+        """Buffer an item, replacing any buffered item with the same key."""
+        key = self.database.item_key(item, self.key_attributes)
+        with self._lock:
+            if key in self._buffer:
+                self.stats['deduplicated'] += 1
+                del self._buffer[key]
+            self._buffer[key] = item
+            self.stats['buffered'] += 1
+            should_flush = len(self._buffer) >= self.max_buffered_items
+        if should_flush:
+            self._flush()
+    
+    def pending(self) -> int:
+        """Number of buffered items."""
+        with self._lock:
+            return len(self._buffer)
+    
+    def watch_deadline(self, context: Any) -> None:
+        """Local writes cannot outlive an invocation, so there is no deadline to watch."""
+    
+    def flush(self) -> int:
+        """
+        Write everything buffered so far and return the number of items written.
+        
+        Raises BatchWriteError if any item could not be written since the previous flush() call.
+        """
+        written = self._flush()
+        with self._lock:
+            failed, self._failed = self._failed, []
+        if failed:
+            raise BatchWriteError(self.table_name, failed)
+        return written
+    
+    def discard(self) -> int:
+        """Drop anything buffered and return the number of items dropped."""
+        with self._lock:
+            dropped = len(self._buffer)
+            self._buffer.clear()
+            self._failed = []
+        if dropped:
+            logger.warning("sqlite_writer_discarded", table=self.table_name, items=dropped)
+        return dropped
+    
+    def close(self) -> None:
+        """Write anything still buffered."""
+        self.flush()
+    
+    def _flush(self) -> int:
+        with self._lock:
+            items = list(self._buffer.values())
+            self._buffer.clear()
+        if not items:
+            return 0
+        
+        try:
+            written = self.database.put_items(self.table_name, items, self.key_attributes)
+        except sqlite3.Error as e:
+            logger.error("sqlite_write_failed", table=self.table_name, items=len(items), error=str(e))
+            written = 0
+        
+        with self._lock:
+            self.stats['written'] += written
+            self.stats['dropped'] += len(items) - written
+            if not written:
+                self._failed.extend(self.key(item) for item in items)
+        return written
+
+class StorageBackend(abc.ABC):
+    """Where the functions persist items; see DynamoDBBackend and SQLiteBackend."""
+    
+    name = ''
+    
+    @abc.abstractmethod
+    def writer(self, table_name: str, key_attributes: Sequence[str]) -> Any:
+        """A buffered writer (put/pending/watch_deadline/flush/close) for a table keyed on key_attributes."""
+    
+    def close(self) -> None:
+        """Release any resources held by the backend."""
+
+class DynamoDBBackend(StorageBackend):
+    """The production backend: shared boto3 Table objects and BatchWriteItem writers."""
+    
+    name = 'dynamodb'
+    
+    def table(self, table_name: str) -> Any:
+        """The shared boto3 Table for a table name."""
+        return aws.table(table_name)
+    
+    def writer(self, table_name: str, key_attributes: Sequence[str]) -> BufferedTableWriter:
+        return BufferedTableWriter(aws.lazy_table(table_name), key_attributes)
+
+class SQLiteBackend(StorageBackend):
+    """Embedded backend for load tests and offline replays; table names map to rows of one database."""
+    
+    name = 'sqlite'
+    
+    def __init__(self, path: str = STORAGE_SQLITE_PATH):
+        self.database = SQLiteDatabase(path)
+    
+    def writer(self, table_name: str, key_attributes: Sequence[str]) -> SQLiteTableWriter:
+        return SQLiteTableWriter(self.database, table_name, key_attributes)
+    
+    def close(self) -> None:
+        self.database.close()
+
+STORAGE_BACKENDS = {
+    DynamoDBBackend.name: DynamoDBBackend,
+    SQLiteBackend.name: SQLiteBackend
+}
+
+def create_backend(name: str = STORAGE_BACKEND) -> StorageBackend:
+    """Instantiate a backend by name."""
+    backend_class = STORAGE_BACKENDS.get(name)
+    if backend_class is None:
+        raise ValueError(f'Unknown STORAGE_BACKEND {name!r}; expected one of {sorted(STORAGE_BACKENDS)}')
+    return backend_class()
+
+@lru_cache(maxsize=1)
+def get_backend() -> StorageBackend:
+    """The backend selected by STORAGE_BACKEND, created once per container."""
+    return create_backend(STORAGE_BACKEND)
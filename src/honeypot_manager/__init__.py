@@ -0,0 +1,9 @@
+"""
+SecureShield AI - Honeypot Management Module
+Adaptive decoy resources driven by observed attack patterns.
+"""
+
+from .lambda_function import HoneypotManager, lambda_handler
+
+__all__ = ['HoneypotManager', 'lambda_handler']
+__version__ = '1.0.0'
\ No newline at end of file
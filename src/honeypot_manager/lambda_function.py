@@ -9,18 +9,23 @@ import os
 import random
 import string
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Dict, Any, List
 
-import boto3
 import structlog
 
+from ..common import aws
+from ..common.metrics import MetricsSink
+
 logger = structlog.get_logger()
 
-# Initialize AWS clients
-ec2 = boto3.resource('ec2')
-s3 = boto3.client('s3')
-rds = boto3.client('rds')
-iam = boto3.client('iam')
+# AWS clients, created on first use and reused across warm invocations
+ec2 = aws.lazy_resource('ec2')
+s3 = aws.lazy_client('s3')
+rds = aws.lazy_client('rds')
+iam = aws.lazy_client('iam')
+
+metrics = MetricsSink('SecureShield/Honeypots')
 
 # Configuration
 HONEYPOT_VPC_ID = os.getenv('HONEYPOT_VPC_ID')
@@ -52,7 +57,9 @@ class HoneypotManager:
                 try:
                     honeypot = self.honeypot_configs[honeypot_type](attack_patterns)
                     created_honeypots.append(honeypot)
+                    metrics.count('HoneypotsCreated', dimensions={'HoneypotType': honeypot_type})
                 except Exception as e:
+                    metrics.count('HoneypotCreationFailures', dimensions={'HoneypotType': honeypot_type})
                     logger.error(f"failed_to_create_{honeypot_type}_honeypot", error=str(e))
             
             # Update existing honeypots
@@ -402,6 +409,11 @@ pip3 install flask
 nohup python3 /home/ec2-user/api_server.py > /var/log/api_server.log 2>&1 &
 """
 
+@lru_cache(maxsize=1)
+def get_manager() -> HoneypotManager:
+    """Build the manager once per container."""
+    return HoneypotManager()
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Main Lambda handler for honeypot management."""
     try:
@@ -411,7 +423,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         attack_patterns = detail.get('attack_patterns', {})
         threat_assessment = detail.get('threat_assessment', {})
         
-        manager = HoneypotManager()
+        manager = get_manager()
         result = manager.adapt_honeypots(attack_patterns, threat_assessment)
         
         return {
@@ -424,4 +436,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
     except Exception as e:
         logger.error("honeypot_management_failed", error=str(e))
-        raise 
\ No newline at end of file
+        raise 
+    
+    finally:
+        metrics.flush()
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""
+SecureShield AI - Incident Response Module
+Automated countermeasures for detected threats.
+"""
+
+from .lambda_function import IncidentResponseOrchestrator, lambda_handler
+
+__all__ = ['IncidentResponseOrchestrator', 'lambda_handler']
+__version__ = '1.0.0'
\ No newline at end of file
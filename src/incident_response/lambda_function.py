@@ -6,32 +6,52 @@ Executes automated countermeasures when threats are detected.
 import json
 import logging
 import os
+import time
 from datetime import datetime, timezone
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
-import boto3
 import structlog
 
+from ..common import aws, claim_check, heavy_hitters
+from ..common.events import EVENT_SLIM_PAYLOADS, EventPublisher, slim_event
+from ..common.metrics import MetricsSink
+
 logger = structlog.get_logger()
 
-# Initialize AWS clients
-wafv2 = boto3.client('wafv2')
-ec2 = boto3.resource('ec2')
-eventbridge = boto3.client('events')
+# Configuration
+ALERT_TOP_TALKERS = int(os.getenv('ALERT_TOP_TALKERS', '10'))
+ALERT_TOP_TALKERS_WINDOW = os.getenv('ALERT_TOP_TALKERS_WINDOW', '1h')
+
+# AWS clients, created on first use and reused across warm invocations
+wafv2 = aws.lazy_client('wafv2')
+ec2 = aws.lazy_resource('ec2')
+eventbridge = aws.lazy_client('events')
+
+metrics = MetricsSink('SecureShield/IncidentResponse')
+
+alerts = EventPublisher(eventbridge, 'secure-shield.incident-response')
 
 class IncidentResponseOrchestrator:
     """Orchestrates automated incident response actions."""
     
+    def __init__(self):
+        self._top_talkers: Optional[Tuple[float, List[Dict[str, Any]]]] = None
+    
     def execute_response(self, threat_assessment: Dict[str, Any], original_event: Dict[str, Any]) -> Dict[str, Any]:
         """Execute appropriate response based on threat level."""
         threat_level = threat_assessment.get('threat_level', 'LOW')
-        source_ip = original_event.get('detail', {}).get('sourceIPAddress')
         
-        logger.info("executing_incident_response", threat_level=threat_level, source_ip=source_ip)
+        logger.info("executing_incident_response", threat_level=threat_level)
         
         actions_taken = []
+        top_talkers = None
         
         if threat_level in ['HIGH', 'CRITICAL']:
+            # Only countermeasures need the event itself; a claim-checked one is fetched here
+            source_ip = claim_check.resolve(original_event).get('detail', {}).get('sourceIPAddress')
+            logger.info("countermeasures_targeted", source_ip=source_ip)
+            
             # Block IP in WAF
             if source_ip:
                 self._block_ip_waf(source_ip)
@@ -42,10 +62,15 @@ class IncidentResponseOrchestrator:
                 self._update_security_group(source_ip)
                 actions_taken.append('security_group_deny')
         
+            top_talkers = self._current_top_talkers()
+        
         # Send alert
-        self._send_alert(threat_assessment, original_event)
+        self._send_alert(threat_assessment, original_event, top_talkers)
         actions_taken.append('alert_sent')
         
+        for action in actions_taken:
+            metrics.count('ResponseActions', dimensions={'Action': action, 'ThreatLevel': threat_level})
+        
         return {
             'response_type': threat_level,
             'actions_taken': actions_taken,
@@ -68,24 +93,55 @@ class IncidentResponseOrchestrator:
         except Exception as e:
             logger.error("failed_to_update_security_group", error=str(e))
     
-    def _send_alert(self, threat_assessment: Dict[str, Any], original_event: Dict[str, Any]) -> None:
-        """Send alert to notification system."""
+    def _current_top_talkers(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        The noisiest source IPs across all collectors, or None if heavy hitters are not configured.
+        
+        Collectors merge their counts at most every HEAVY_HITTERS_MERGE_SECONDS,
+        so the shared table is read at most that often per container.
+        """
+        if ALERT_TOP_TALKERS <= 0 or heavy_hitters.get_shared() is None:
+            return None
+        now = time.time()
+        if self._top_talkers is not None and now - self._top_talkers[0] < heavy_hitters.HEAVY_HITTERS_MERGE_SECONDS:
+            return self._top_talkers[1]
+        try:
+            talkers = heavy_hitters.top_talkers(ALERT_TOP_TALKERS_WINDOW, k=ALERT_TOP_TALKERS)
+        except Exception as e:
+            logger.warning("top_talkers_unavailable", error=str(e))
+            return None
+        self._top_talkers = (now, talkers)
+        return talkers
+    
+    def _send_alert(self, threat_assessment: Dict[str, Any], original_event: Dict[str, Any],
+                    top_talkers: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Queue an alert for the notification system; alerts are sent when the handler flushes."""
         try:
-            alert_event = {
-                'source': 'secure-shield.incident-response',
-                'detail-type': f'{threat_assessment.get("threat_level", "LOW")} Priority Alert',
-                'detail': {
-                    'threat_assessment': threat_assessment,
-                    'original_event': original_event,
-                    'timestamp': datetime.now(timezone.utc).isoformat()
-                }
+            detail = {
+                'threat_assessment': threat_assessment,
+                'original_event': self._outbound_event(original_event),
+                'timestamp': datetime.now(timezone.utc).isoformat()
             }
+            if top_talkers is not None:
+                detail['top_talkers'] = top_talkers
             
-            eventbridge.put_events(Entries=[alert_event])
-            logger.info("alert_sent", threat_level=threat_assessment.get('threat_level'))
+            alerts.publish(f'{threat_assessment.get("threat_level", "LOW")} Priority Alert', detail)
+            logger.info("alert_queued", threat_level=threat_assessment.get('threat_level'))
             
         except Exception as e:
             logger.error("failed_to_send_alert", error=str(e))
+    
+    @staticmethod
+    def _outbound_event(original_event: Dict[str, Any]) -> Dict[str, Any]:
+        """The original event as forwarded in alerts; claim-check references are passed on without fetching."""
+        if claim_check.is_reference(original_event):
+            return original_event
+        return claim_check.offload(slim_event(original_event) if EVENT_SLIM_PAYLOADS else original_event)
+
+@lru_cache(maxsize=1)
+def get_orchestrator() -> IncidentResponseOrchestrator:
+    """Build the orchestrator once per container."""
+    return IncidentResponseOrchestrator()
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Main Lambda handler for incident response."""
@@ -96,7 +152,7 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         threat_assessment = detail.get('threat_assessment', {})
         original_event = detail.get('original_event', {})
         
-        orchestrator = IncidentResponseOrchestrator()
+        orchestrator = get_orchestrator()
         response_result = orchestrator.execute_response(threat_assessment, original_event)
         
         return {
@@ -109,4 +165,8 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
     except Exception as e:
         logger.error("incident_response_failed", error=str(e))
-        raise 
\ No newline at end of file
+        raise 
+    
+    finally:
+        alerts.flush()
+        metrics.flush()
\ No newline at end of file
@@ -0,0 +1,9 @@
+"""
+SecureShield AI - Intelligence Collection Module
+Attacker behavior analysis and threat intelligence storage.
+"""
+
+from .lambda_function import IntelligenceCollector, batch_handler, deep_analysis_worker_handler, lambda_handler
+
+__all__ = ['IntelligenceCollector', 'batch_handler', 'deep_analysis_worker_handler', 'lambda_handler']
+__version__ = '1.0.0'
\ No newline at end of file
@@ -0,0 +1,391 @@
+"""
+SecureShield AI - Deep Analysis Queue
+Prioritized, per-IP de-duplicated deep-analysis jobs on SQS or an in-process heap, drained by a bounded worker pool.
+"""
+
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import structlog
+
+from ..common import aws, claim_check
+from ..common.codec import json_default
+
+logger = structlog.get_logger()
+
+# Configuration
+DEEP_ANALYSIS_CRITICAL_QUEUE_URL = os.getenv('DEEP_ANALYSIS_CRITICAL_QUEUE_URL')
+DEEP_ANALYSIS_HIGH_QUEUE_URL = os.getenv('DEEP_ANALYSIS_HIGH_QUEUE_URL')
+DEEP_ANALYSIS_DEDUP_SECONDS = float(os.getenv('DEEP_ANALYSIS_DEDUP_SECONDS', '300'))
+DEEP_ANALYSIS_MAX_PENDING = int(os.getenv('DEEP_ANALYSIS_MAX_PENDING', '1000'))
+DEEP_ANALYSIS_CONCURRENCY = int(os.getenv('DEEP_ANALYSIS_CONCURRENCY', '4'))
+DEEP_ANALYSIS_JOB_TIMEOUT_SECONDS = float(os.getenv('DEEP_ANALYSIS_JOB_TIMEOUT_SECONDS', '60'))
+DEEP_ANALYSIS_MAX_ATTEMPTS = int(os.getenv('DEEP_ANALYSIS_MAX_ATTEMPTS', '3'))
+DEEP_ANALYSIS_RETRY_BASE_SECONDS = int(os.getenv('DEEP_ANALYSIS_RETRY_BASE_SECONDS', '30'))
+DEEP_ANALYSIS_RETRY_MAX_SECONDS = int(os.getenv('DEEP_ANALYSIS_RETRY_MAX_SECONDS', '900'))
+# Set by the Lambda runtime; collector and worker then run in separate containers
+RUNNING_IN_LAMBDA = bool(os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+
+THREAT_LEVEL_RANKS = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2, 'CRITICAL': 3}
+SQS_MAX_BATCH_ENTRIES = 10
+SQS_MAX_MESSAGE_BYTES = 262144
+
+def _epoch(event_time: Optional[str]) -> float:
+    if event_time:
+        try:
+            return datetime.fromisoformat(event_time.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return 0.0
+
+def analysis_job(event_details: Dict[str, Any], threat_assessment: Dict[str, Any]) -> Dict[str, Any]:
+    """A deep-analysis job for one event; event details are claim-checked if large."""
+    source_ip = event_details.get('source_ip') or 'unknown'
+    return {
+        'job_id': f'deep_{source_ip}_{uuid.uuid4().hex[:12]}',
+        'source_ip': source_ip,
+        'threat_level': threat_assessment.get('threat_level'),
+        'risk_score': threat_assessment.get('risk_score') or 0,
+        'event_time': event_details.get('event_time'),
+        'submitted_at': time.time(),
+        'attempts': 0,
+        'threat_assessment': threat_assessment,
+        'event_details': claim_check.offload(event_details)
+    }
+
+def job_priority(job: Dict[str, Any]) -> Tuple[int, float, float]:
+    """Sort key where larger is more urgent: threat level, then risk score, then the newest event."""
+    return (
+        THREAT_LEVEL_RANKS.get(job.get('threat_level'), 0),
+        float(job.get('risk_score') or 0),
+        _epoch(job.get('event_time')) or float(job.get('submitted_at') or 0)
+    )
+
+class LocalJobQueue:
+    """
+    In-process priority heap of jobs for local runs and tests.
+    
+    At most max_pending jobs are held; when full, the least urgent job is
+    dropped, which may be the one being submitted.
+    """
+    
+    def __init__(self, max_pending: int = DEEP_ANALYSIS_MAX_PENDING, max_attempts: int = DEEP_ANALYSIS_MAX_ATTEMPTS):
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._heap: List[Tuple[Tuple[float, ...], int, Dict[str, Any]]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'dropped': 0, 'received': 0, 'retried': 0}
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
+    
+    def _push(self, job: Dict[str, Any]) -> None:
+        # Negated so the heap's minimum is the most urgent job; ties go first-in first-out
+        heapq.heappush(self._heap, (tuple(-part for part in job_priority(job)), next(self._sequence), job))
+    
+    def submit(self, job: Dict[str, Any]) -> bool:
+        with self._lock:
+            self.stats['submitted'] += 1
+            self._push(job)
+            if len(self._heap) <= self.max_pending:
+                return True
+            least_urgent = max(self._heap)
+            self._heap.remove(least_urgent)
+            heapq.heapify(self._heap)
+            self.stats['dropped'] += 1
+            return least_urgent[2] is not job
+    
+    def flush(self) -> None:
+        """Jobs are visible as soon as they are submitted."""
+    
+    def receive(self, max_jobs: int) -> List[Tuple[Dict[str, Any], Any]]:
+        """Up to max_jobs (job, receipt) pairs, most urgent first."""
+        with self._lock:
+            jobs = [heapq.heappop(self._heap)[2] for _ in range(min(max_jobs, len(self._heap)))]
+            self.stats['received'] += len(jobs)
+        return [(job, job) for job in jobs]
+    
+    def ack(self, receipt: Any) -> None:
+        """Completed jobs need no bookkeeping."""
+    
+    def nack(self, receipt: Any) -> None:
+        """Requeue a failed job until it has used max_attempts."""
+        receipt['attempts'] = receipt.get('attempts', 0) + 1
+        if receipt['attempts'] >= self.max_attempts:
+            logger.error("deep_analysis_job_abandoned", job_id=receipt.get('job_id'), attempts=receipt['attempts'])
+            return
+        with self._lock:
+            self._push(receipt)
+            self.stats['retried'] += 1
+
+class SQSJobQueue:
+    """
+    Jobs on one SQS queue per threat level, received in level order.
+    
+    SQS has no message priority, so urgency comes from separate queues:
+    receive() empties the CRITICAL queue before looking at HIGH, and sorts
+    each received batch by job_priority. Levels without their own queue use
+    the lowest configured one. Submitted jobs are buffered and sent with
+    SendMessageBatch on flush(), off the per-event path. FIFO queues get the
+    source IP as message group and a per-window deduplication ID, which
+    extends de-duplication across containers. Jobs whose body would exceed
+    the SQS message limit are dropped with an error; event details are
+    claim-checked by analysis_job, so this only happens when no claim-check
+    store is configured. Failed jobs become visible again after an
+    exponential backoff on their receive count, from retry_base_seconds up
+    to retry_max_seconds; retries are capped by the queue's redrive policy.
+    """
+    
+    def __init__(self, queue_urls: Dict[str, str], client: Any = None, dedup_seconds: float = DEEP_ANALYSIS_DEDUP_SECONDS,
+                 wait_seconds: int = 1, retry_base_seconds: int = DEEP_ANALYSIS_RETRY_BASE_SECONDS,
+                 retry_max_seconds: int = DEEP_ANALYSIS_RETRY_MAX_SECONDS):
+        if not queue_urls:
+            raise ValueError('At least one deep-analysis queue URL is required')
+        self.queue_urls = dict(sorted(queue_urls.items(), key=lambda item: -THREAT_LEVEL_RANKS.get(item[0], 0)))
+        self.client = client if client is not None else aws.lazy_client('sqs')
+        self.dedup_seconds = dedup_seconds
+        self.wait_seconds = wait_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._buffer: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'oversized': 0, 'sent': 0, 'send_failures': 0, 'received': 0}
+    
+    def _queue_for(self, threat_level: Optional[str]) -> str:
+        return self.queue_urls.get(threat_level) or list(self.queue_urls.values())[-1]
+    
+    def submit(self, job: Dict[str, Any]) -> bool:
+        queue_url = self._queue_for(job.get('threat_level'))
+        body = json.dumps(job, separators=(',', ':'), default=json_default)
+        size = len(body.encode('utf-8'))
+        if size > SQS_MAX_MESSAGE_BYTES:
+            logger.error("deep_analysis_job_too_large", job_id=job.get('job_id'), bytes=size)
+            with self._lock:
+                self.stats['oversized'] += 1
+            return False
+        entry: Dict[str, Any] = {'MessageBody': body}
+        if queue_url.endswith('.fifo'):
+            entry['MessageGroupId'] = job['source_ip']
+            entry['MessageDeduplicationId'] = f"{job['source_ip']}-{job.get('threat_level')}-{int(time.time() // self.dedup_seconds)}"
+        with self._lock:
+            self._buffer.setdefault(queue_url, []).append(entry)
+            self.stats['submitted'] += 1
+        return True
+    
+    def flush(self) -> int:
+        """Send buffered jobs in batches of ten; returns the number accepted."""
+        with self._lock:
+            buffered, self._buffer = self._buffer, {}
+        sent = 0
+        for queue_url, entries in buffered.items():
+            for start in range(0, len(entries), SQS_MAX_BATCH_ENTRIES):
+                batch = [dict(entry, Id=str(index)) for index, entry in enumerate(entries[start:start + SQS_MAX_BATCH_ENTRIES])]
+                try:
+                    response = self.client.send_message_batch(QueueUrl=queue_url, Entries=batch)
+                    failed = response.get('Failed', [])
+                except Exception as e:
+                    logger.error("deep_analysis_enqueue_failed", queue_url=queue_url, jobs=len(batch), error=str(e))
+                    failed = batch
+                if failed:
+                    logger.error("deep_analysis_jobs_not_enqueued", queue_url=queue_url, jobs=len(failed))
+                sent += len(batch) - len(failed)
+                self.stats['send_failures'] += len(failed)
+        self.stats['sent'] += sent
+        return sent
+    
+    def receive(self, max_jobs: int) -> List[Tuple[Dict[str, Any], Any]]:
+        """Up to max_jobs (job, receipt) pairs from the most urgent non-empty queues, most urgent first."""
+        received: List[Tuple[Dict[str, Any], Any]] = []
+        for queue_url in self.queue_urls.values():
+            if len(received) >= max_jobs:
+                break
+            received.extend(self._receive_from(queue_url, max_jobs - len(received), 0))
+        if not received:
+            # Short polls can miss messages; wait briefly on the most urgent queue before reporting empty
+            received = self._receive_from(next(iter(self.queue_urls.values())), max_jobs, self.wait_seconds)
+        received.sort(key=lambda pair: job_priority(pair[0]), reverse=True)
+        self.stats['received'] += len(received)
+        return received
+    
+    def _receive_from(self, queue_url: str, max_jobs: int, wait_seconds: int) -> List[Tuple[Dict[str, Any], Any]]:
+        response = self.client.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=min(SQS_MAX_BATCH_ENTRIES, max_jobs),
+            WaitTimeSeconds=wait_seconds,
+            AttributeNames=['ApproximateReceiveCount']
+        )
+        return [
+            (json.loads(message['Body']),
+             (queue_url, message['ReceiptHandle'], int(message.get('Attributes', {}).get('ApproximateReceiveCount', 1))))
+            for message in response.get('Messages', [])
+        ]
+    
+    def retry_delay(self, receive_count: int) -> int:
+        """Seconds a job stays hidden after its receive_count-th attempt failed."""
+        return min(self.retry_max_seconds, self.retry_base_seconds * 2 ** max(0, receive_count - 1))
+    
+    def ack(self, receipt: Any) -> None:
+        queue_url, receipt_handle, _ = receipt
+        self.client.delete_message(QueueUrl=queue_url, ReceiptHandle=receipt_handle)
+    
+    def nack(self, receipt: Any) -> None:
+        queue_url, receipt_handle, receive_count = receipt
+        self.client.change_message_visibility(
+            QueueUrl=queue_url, ReceiptHandle=receipt_handle, VisibilityTimeout=self.retry_delay(receive_count)
+        )
+
+class DeepAnalysisQueue:
+    """
+    Front end the collector submits to: one job per source IP per dedup window.
+    
+    A repeat within the window is dropped unless it raises the IP's threat
+    level, so an actor escalating from HIGH to CRITICAL is re-prioritized.
+    The recent-IP table is an LRU bounded by max_tracked_ips.
+    """
+    
+    def __init__(self, backend: Any, dedup_seconds: float = DEEP_ANALYSIS_DEDUP_SECONDS, max_tracked_ips: int = 100000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.backend = backend
+        self.dedup_seconds = dedup_seconds
+        self.max_tracked_ips = max_tracked_ips
+        self.clock = clock
+        # source_ip -> (submitted_at, threat level rank)
+        self._recent: 'OrderedDict[str, Tuple[float, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'deduplicated': 0}
+    
+    def submit(self, event_details: Dict[str, Any], threat_assessment: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Queue deep analysis for an event; returns the job, or None if the IP was queued recently."""
+        source_ip = event_details.get('source_ip') or 'unknown'
+        rank = THREAT_LEVEL_RANKS.get(threat_assessment.get('threat_level'), 0)
+        now = self.clock()
+        with self._lock:
+            recent = self._recent.get(source_ip)
+            if recent is not None and now - recent[0] < self.dedup_seconds and rank <= recent[1]:
+                self.stats['deduplicated'] += 1
+                return None
+            self._recent[source_ip] = (now, rank)
+            self._recent.move_to_end(source_ip)
+            while len(self._recent) > self.max_tracked_ips:
+                self._recent.popitem(last=False)
+            self.stats['submitted'] += 1
+        
+        job = analysis_job(event_details, threat_assessment)
+        return job if self.backend.submit(job) else None
+    
+    def flush(self) -> None:
+        self.backend.flush()
+
+class DeepAnalysisWorker:
+    """
+    Drains a job queue with at most concurrency jobs in flight, most urgent first.
+    
+    analyze(job, deadline) gets a time.monotonic() deadline of
+    job_timeout_seconds and should stop by then; a job still running past it
+    is reported as timed out and handed back to the queue, though its thread
+    cannot be interrupted. run() stops when the queue is empty, max_jobs have
+    been started or there is not enough time before its own deadline to give
+    another job its full budget.
+    """
+    
+    def __init__(self, queue: Any, analyze: Callable[[Dict[str, Any], float], Any],
+                 concurrency: int = DEEP_ANALYSIS_CONCURRENCY, job_timeout_seconds: float = DEEP_ANALYSIS_JOB_TIMEOUT_SECONDS):
+        self.queue = queue
+        self.analyze = analyze
+        self.concurrency = max(1, concurrency)
+        self.job_timeout_seconds = job_timeout_seconds
+        self.stats = {'completed': 0, 'failed': 0, 'timed_out': 0}
+    
+    def run(self, deadline: Optional[float] = None, max_jobs: Optional[int] = None) -> Dict[str, int]:
+        """Process jobs until the queue is drained or a limit is reached; returns this run's counts."""
+        counts = {'completed': 0, 'failed': 0, 'timed_out': 0}
+        started = 0
+        # False once receive() comes back empty, until a job is handed back for retry
+        has_jobs = True
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        # future -> (job, receipt, job deadline)
+        in_flight: Dict[Any, Tuple[Dict[str, Any], Any, float]] = {}
+        try:
+            while True:
+                now = time.monotonic()
+                draining = has_jobs
+                if deadline is not None and now + self.job_timeout_seconds > deadline:
+                    draining = False
+                if max_jobs is not None and started >= max_jobs:
+                    draining = False
+                slots = self.concurrency - len(in_flight)
+                if draining and slots > 0:
+                    if max_jobs is not None:
+                        slots = min(slots, max_jobs - started)
+                    received = self.queue.receive(slots)
+                    if not received:
+                        has_jobs = False
+                    for job, receipt in received:
+                        job_deadline = time.monotonic() + self.job_timeout_seconds
+                        in_flight[executor.submit(self.analyze, job, job_deadline)] = (job, receipt, job_deadline)
+                        started += 1
+                if not in_flight:
+                    break
+                
+                next_deadline = min(entry[2] for entry in in_flight.values())
+                done, _ = wait(list(in_flight), timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    job, receipt, _ = in_flight.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        self.queue.ack(receipt)
+                        counts['completed'] += 1
+                    else:
+                        logger.error("deep_analysis_job_failed", job_id=job.get('job_id'), error=str(error))
+                        self.queue.nack(receipt)
+                        counts['failed'] += 1
+                        has_jobs = True
+                now = time.monotonic()
+                for future in [f for f, entry in in_flight.items() if entry[2] <= now]:
+                    job, receipt, _ = in_flight.pop(future)
+                    logger.warning("deep_analysis_job_timed_out", job_id=job.get('job_id'), timeout=self.job_timeout_seconds)
+                    self.queue.nack(receipt)
+                    counts['timed_out'] += 1
+                    has_jobs = True
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        for name, value in counts.items():
+            self.stats[name] += value
+        return counts
+
+def configured_queue_urls() -> Dict[str, str]:
+    """Per-threat-level queue URLs from the environment."""
+    urls = {'CRITICAL': DEEP_ANALYSIS_CRITICAL_QUEUE_URL, 'HIGH': DEEP_ANALYSIS_HIGH_QUEUE_URL}
+    return {level: url for level, url in urls.items() if url}
+
+@lru_cache(maxsize=1)
+def get_queue() -> Optional[DeepAnalysisQueue]:
+    """
+    The container-wide deep-analysis queue: SQS when queue URLs are configured, otherwise an in-process heap.
+    
+    The heap only works when submitting and draining share a process, so
+    inside Lambda there is no queue without URLs and None is returned.
+    """
+    queue_urls = configured_queue_urls()
+    if queue_urls:
+        if claim_check.get_claim_check().store is None:
+            logger.warning("deep_analysis_claim_check_not_configured", max_message_bytes=SQS_MAX_MESSAGE_BYTES)
+        return DeepAnalysisQueue(SQSJobQueue(queue_urls))
+    if RUNNING_IN_LAMBDA:
+        logger.error("deep_analysis_queue_not_configured",
+                     required=['DEEP_ANALYSIS_CRITICAL_QUEUE_URL', 'DEEP_ANALYSIS_HIGH_QUEUE_URL'])
+        return None
+    return DeepAnalysisQueue(LocalJobQueue())
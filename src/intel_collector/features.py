@@ -0,0 +1,176 @@
+"""
+SecureShield AI - Attack Pattern Features
+Attack vector, tool, time and behavior features for one event or, computed column-wise, for a whole batch.
+
+pandas and numpy are imported by the batch functions only, so handlers that
+analyze single events do not pay for loading them on a cold start.
+"""
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Any, List, Sequence
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# (attack vector, event name substrings that indicate it)
+ATTACK_VECTOR_RULES = (
+    ('reconnaissance', ('Describe',)),
+    ('data_access', ('Get',)),
+    ('resource_creation', ('Create', 'Put'))
+)
+
+# Tool names matched against the lowercased user agent
+TOOL_SIGNATURES = ('nmap', 'sqlmap', 'metasploit')
+
+OFF_HOURS_BEFORE = 6
+OFF_HOURS_AFTER = 22
+BULK_RESOURCE_THRESHOLD = 5
+
+# CloudTrail's timestamp shape; the batch path parses these columnar and hands anything else to fromisoformat
+_CANONICAL_TIME = r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?(?:Z|[+-]\d{2}:\d{2})?$'
+
+def _empty_patterns() -> Dict[str, Any]:
+    return {
+        'attack_vectors': [],
+        'tools_used': [],
+        'time_patterns': {},
+        'geographic_patterns': {},
+        'behavioral_patterns': []
+    }
+
+def _time_patterns(hour: int, day_of_week: int) -> Dict[str, Any]:
+    return {
+        'hour': hour,
+        'day_of_week': day_of_week,
+        'is_off_hours': hour < OFF_HOURS_BEFORE or hour > OFF_HOURS_AFTER
+    }
+
+def attack_patterns(event_details: Dict[str, Any]) -> Dict[str, Any]:
+    """Attack patterns for a single event."""
+    patterns = _empty_patterns()
+    
+    event_name = event_details.get('event_name') or ''
+    for vector, markers in ATTACK_VECTOR_RULES:
+        if any(marker in event_name for marker in markers):
+            patterns['attack_vectors'].append(vector)
+    
+    user_agent = (event_details.get('user_agent') or '').lower()
+    for tool in TOOL_SIGNATURES:
+        if tool in user_agent:
+            patterns['tools_used'].append(tool)
+    
+    # Hour and weekday are wall-clock values in the timestamp's own offset
+    event_time = event_details.get('event_time')
+    if event_time:
+        dt = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
+        patterns['time_patterns'] = _time_patterns(dt.hour, dt.weekday())
+    
+    if event_details.get('error_code'):
+        patterns['behavioral_patterns'].append('failed_attempts')
+    if len(event_details.get('resources') or []) > BULK_RESOURCE_THRESHOLD:
+        patterns['behavioral_patterns'].append('bulk_operations')
+    
+    return patterns
+
+def attack_feature_frame(event_details: Sequence[Dict[str, Any]]) -> 'pd.DataFrame':
+    """
+    Columnar attack features for a batch of events, one row per event.
+    
+    Boolean columns are named vector_<name>, tool_<name>, failed_attempts and
+    bulk_operations; hour and day_of_week are -1 for events without a time.
+    Canonical CloudTrail timestamps are parsed in one vectorized pass from
+    their wall-clock prefix; other formats fall back to fromisoformat so
+    the result always equals attack_patterns().
+    """
+    import numpy as np
+    import pandas as pd
+    
+    count = len(event_details)
+    names = pd.Series([d.get('event_name') or '' for d in event_details], dtype='string')
+    # str.lower() per value: Arrow's Unicode lowercasing differs from Python's for a few characters
+    agents = pd.Series([(d.get('user_agent') or '').lower() for d in event_details], dtype='string')
+    raw_times = [d.get('event_time') or '' for d in event_details]
+    times = pd.Series(raw_times, dtype='string')
+    
+    columns: Dict[str, Any] = {}
+    for vector, markers in ATTACK_VECTOR_RULES:
+        matched = np.zeros(count, dtype=bool)
+        for marker in markers:
+            matched |= names.str.contains(marker, regex=False).to_numpy(dtype=bool)
+        columns[f'vector_{vector}'] = matched
+    for tool in TOOL_SIGNATURES:
+        columns[f'tool_{tool}'] = agents.str.contains(tool, regex=False).to_numpy(dtype=bool)
+    
+    hours = np.full(count, -1, dtype=np.int64)
+    weekdays = np.full(count, -1, dtype=np.int64)
+    canonical = times.str.match(_CANONICAL_TIME).to_numpy(dtype=bool)
+    if canonical.any():
+        rows = np.flatnonzero(canonical)
+        parsed = pd.to_datetime(times[canonical].str.slice(0, 19), format='%Y-%m-%dT%H:%M:%S', errors='coerce')
+        valid = parsed.notna().to_numpy()
+        hours[rows[valid]] = parsed.dt.hour.to_numpy()[valid]
+        weekdays[rows[valid]] = parsed.dt.dayofweek.to_numpy()[valid]
+        # Impossible dates (month 13) go through fromisoformat so they fail the same way
+        canonical[rows[~valid]] = False
+    for index in np.flatnonzero(~canonical & (times.str.len() > 0).to_numpy(dtype=bool)):
+        dt = datetime.fromisoformat(raw_times[index].replace('Z', '+00:00'))
+        hours[index], weekdays[index] = dt.hour, dt.weekday()
+    columns['hour'] = hours
+    columns['day_of_week'] = weekdays
+    columns['is_off_hours'] = (hours >= 0) & ((hours < OFF_HOURS_BEFORE) | (hours > OFF_HOURS_AFTER))
+    
+    columns['failed_attempts'] = np.fromiter((bool(d.get('error_code')) for d in event_details), dtype=bool, count=count)
+    columns['bulk_operations'] = np.fromiter(
+        (len(d.get('resources') or []) > BULK_RESOURCE_THRESHOLD for d in event_details), dtype=bool, count=count
+    )
+    return pd.DataFrame(columns)
+
+def _flag_codes(frame: 'pd.DataFrame', columns: Sequence[str]) -> List[int]:
+    """Pack boolean columns into one integer per row (bit i = columns[i])."""
+    import numpy as np
+    
+    codes = np.zeros(len(frame), dtype=np.int64)
+    for bit, column in enumerate(columns):
+        codes |= frame[column].to_numpy(dtype=np.int64) << bit
+    return codes.tolist()
+
+def _labels_by_code(labels: Sequence[str]) -> List[List[str]]:
+    """For every bit pattern over labels, the labels whose bits are set, in order."""
+    return [[label for bit, label in enumerate(labels) if code >> bit & 1] for code in range(1 << len(labels))]
+
+def attack_patterns_batch(event_details: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Attack patterns for many events, equal element by element to attack_patterns().
+    
+    Matching and timestamp parsing run column-wise in attack_feature_frame();
+    the result dicts are then built by a per-row Python loop over lookup
+    tables, so the output step does not get the column-wise speedup.
+    """
+    if not event_details:
+        return []
+    frame = attack_feature_frame(event_details)
+    
+    # Each row picks its lists from per-bit-pattern lookup tables instead of evaluating conditionals
+    vectors = [vector for vector, _ in ATTACK_VECTOR_RULES]
+    behaviors = ['failed_attempts', 'bulk_operations']
+    vector_lists = _labels_by_code(vectors)
+    tool_lists = _labels_by_code(TOOL_SIGNATURES)
+    behavior_lists = _labels_by_code(behaviors)
+    time_table = {(hour, day): _time_patterns(hour, day) for hour in range(24) for day in range(7)}
+    
+    results = []
+    for vector_code, tool_code, behavior_code, hour, day in zip(
+        _flag_codes(frame, [f'vector_{vector}' for vector in vectors]),
+        _flag_codes(frame, [f'tool_{tool}' for tool in TOOL_SIGNATURES]),
+        _flag_codes(frame, behaviors),
+        frame['hour'].tolist(),
+        frame['day_of_week'].tolist()
+    ):
+        results.append({
+            'attack_vectors': list(vector_lists[vector_code]),
+            'tools_used': list(tool_lists[tool_code]),
+            'time_patterns': dict(time_table[hour, day]) if hour >= 0 else {},
+            'geographic_patterns': {},
+            'behavioral_patterns': list(behavior_lists[behavior_code])
+        })
+    return results
@@ -6,40 +6,98 @@ Analyzes attacker behavior patterns and stores threat intelligence in DynamoDB.
 import json
 import logging
 import os
+import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Dict, Any, List
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-import boto3
 import structlog
 
+from ..common import aws, claim_check, heavy_hitters, storage
+from ..common.batch_writer import BatchWriteError
+from ..common.codec import THREAT_INTEL_ENCODED_ATTRIBUTES, encode_item
+from ..common.metrics import MetricsSink
+from ..common.records import decode_record, record_identifier
+from . import deep_analysis, features
+from .profile_cache import ProfileCache
+from .profiles import ProfileDelta, open_profile_store
+from .sessions import Sessionizer, principal_of
+
 logger = structlog.get_logger()
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-bedrock = boto3.client('bedrock-runtime')
+# AWS clients, created on first use and reused across warm invocations
+bedrock = aws.lazy_client('bedrock-runtime')
+
+metrics = MetricsSink('SecureShield/Intelligence')
 
 # Configuration
 THREAT_INTEL_TABLE = os.getenv('THREAT_INTEL_TABLE', 'secure-shield-threat-intel')
 ATTACKER_PROFILES_TABLE = os.getenv('ATTACKER_PROFILES_TABLE', 'secure-shield-attacker-profiles')
+PROFILE_CACHE_ENABLED = os.getenv('PROFILE_CACHE_ENABLED', 'true').lower() == 'true'
+PROFILE_CACHE_MAX_PENDING = int(os.getenv('PROFILE_CACHE_MAX_PENDING', '500'))
+PROFILE_CACHE_MAX_AGE_SECONDS = float(os.getenv('PROFILE_CACHE_MAX_AGE_SECONDS', '30'))
+PROFILE_CACHE_MAX_PROFILES = int(os.getenv('PROFILE_CACHE_MAX_PROFILES', '10000'))
+SESSIONS_ENABLED = os.getenv('SESSIONS_ENABLED', 'true').lower() == 'true'
+SESSION_GAP_SECONDS = float(os.getenv('SESSION_GAP_SECONDS', '1800'))
+SESSION_TOLERANCE_SECONDS = float(os.getenv('SESSION_TOLERANCE_SECONDS', '300'))
+SESSION_MAX_KEYS = int(os.getenv('SESSION_MAX_KEYS', '250000'))
+HEAVY_HITTERS_ENABLED = os.getenv('HEAVY_HITTERS_ENABLED', 'true').lower() == 'true'
+DEEP_ANALYSIS_ENABLED = os.getenv('DEEP_ANALYSIS_ENABLED', 'true').lower() == 'true'
+# Time kept back from the worker's Lambda timeout for acknowledging jobs and flushing metrics
+DEEP_ANALYSIS_DEADLINE_MARGIN_SECONDS = float(os.getenv('DEEP_ANALYSIS_DEADLINE_MARGIN_SECONDS', '5'))
 
 class IntelligenceCollector:
     """Collects and analyzes threat intelligence from security events."""
     
     def __init__(self):
-        self.threat_intel_table = dynamodb.Table(THREAT_INTEL_TABLE)
-        self.attacker_profiles_table = dynamodb.Table(ATTACKER_PROFILES_TABLE)
+        backend = storage.get_backend()
+        self.intel_writer = backend.writer(THREAT_INTEL_TABLE, key_attributes=('intelligence_id',))
+        self.profiles = open_profile_store(backend, ATTACKER_PROFILES_TABLE)
+        # Write-behind profile cache kept across warm invocations
+        self.profile_cache = ProfileCache(
+            self.profiles,
+            max_pending=PROFILE_CACHE_MAX_PENDING,
+            max_age_seconds=PROFILE_CACHE_MAX_AGE_SECONDS,
+            max_profiles=PROFILE_CACHE_MAX_PROFILES
+        ) if PROFILE_CACHE_ENABLED else None
+        # Unbounded cache used only for the duration of a bulk_profile_updates() block
+        self._bulk_cache: Optional[ProfileCache] = None
+        # Open attacker sessions kept across warm invocations
+        self.sessionizer = Sessionizer(
+            gap_seconds=SESSION_GAP_SECONDS,
+            tolerance_seconds=SESSION_TOLERANCE_SECONDS,
+            max_keys=SESSION_MAX_KEYS
+        ) if SESSIONS_ENABLED else None
+        # Noisiest sources per time bucket, merged into the shared table when one is configured
+        self.heavy_hitters = heavy_hitters.HeavyHitterTracker(
+            heavy_hitters.get_shared()
+        ) if HEAVY_HITTERS_ENABLED else None
+        self.deep_analysis = deep_analysis.get_queue() if DEEP_ANALYSIS_ENABLED else None
     
-    def collect_intelligence(self, threat_assessment: Dict[str, Any], original_event: Dict[str, Any]) -> Dict[str, Any]:
-        """Collect intelligence from security event."""
+    def collect_intelligence(self, threat_assessment: Dict[str, Any], original_event: Dict[str, Any],
+                             event_details: Optional[Dict[str, Any]] = None,
+                             attack_patterns: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Collect intelligence from security event; batch callers may pass precomputed details and patterns."""
         try:
             # Extract event details
-            event_details = self._extract_event_details(original_event)
+            if event_details is None:
+                event_details = self._extract_event_details(original_event)
             
             # Analyze attack patterns
-            attack_patterns = self._analyze_attack_patterns(event_details, threat_assessment)
+            if attack_patterns is None:
+                attack_patterns = self._analyze_attack_patterns(event_details, threat_assessment)
             
             # Update attacker profile
-            attacker_profile = self._update_attacker_profile(event_details, attack_patterns)
+            attacker_profile = self._update_attacker_profile(
+                event_details, attack_patterns, threat_assessment.get('threat_level')
+            )
+            
+            # Track the attacker's session and how noisy the source is
+            self._track_session(event_details)
+            if self.heavy_hitters is not None:
+                self.heavy_hitters.record(event_details.get('source_ip'), principal_of(event_details))
             
             # Store intelligence
             intelligence_id = self._store_intelligence(event_details, threat_assessment, attack_patterns)
@@ -48,6 +106,8 @@ class IntelligenceCollector:
             if threat_assessment.get('threat_level') in ['HIGH', 'CRITICAL']:
                 self._trigger_deep_analysis(event_details, threat_assessment)
             
+            metrics.count('IntelligenceCollected', dimensions={'ThreatLevel': threat_assessment.get('threat_level', 'UNKNOWN')})
+            
             logger.info(
                 "intelligence_collected",
                 intelligence_id=intelligence_id,
@@ -63,12 +123,13 @@ class IntelligenceCollector:
             }
             
         except Exception as e:
+            metrics.count('IntelligenceCollectionFailures')
             logger.error("intelligence_collection_failed", error=str(e))
             raise
     
     def _extract_event_details(self, original_event: Dict[str, Any]) -> Dict[str, Any]:
-        """Extract relevant details from the original event."""
-        detail = original_event.get('detail', {})
+        """Extract relevant details from the original event, fetching it first if it was claim-checked."""
+        detail = claim_check.resolve(original_event).get('detail', {})
         
         return {
             'event_id': detail.get('eventID'),
@@ -89,96 +150,103 @@ class IntelligenceCollector:
     
     def _analyze_attack_patterns(self, event_details: Dict[str, Any], threat_assessment: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze attack patterns from event details."""
-        patterns = {
-            'attack_vectors': [],
-            'tools_used': [],
-            'time_patterns': {},
-            'geographic_patterns': {},
-            'behavioral_patterns': []
-        }
-        
-        # Analyze attack vectors
-        event_name = event_details.get('event_name', '')
-        if 'Describe' in event_name:
-            patterns['attack_vectors'].append('reconnaissance')
-        if 'Get' in event_name:
-            patterns['attack_vectors'].append('data_access')
-        if 'Create' in event_name or 'Put' in event_name:
-            patterns['attack_vectors'].append('resource_creation')
-        
-        # Analyze tools used
-        user_agent = event_details.get('user_agent', '').lower()
-        if 'nmap' in user_agent:
-            patterns['tools_used'].append('nmap')
-        if 'sqlmap' in user_agent:
-            patterns['tools_used'].append('sqlmap')
-        if 'metasploit' in user_agent:
-            patterns['tools_used'].append('metasploit')
+        return features.attack_patterns(event_details)
         
-        # Analyze time patterns
-        event_time = event_details.get('event_time')
-        if event_time:
-            dt = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
-            patterns['time_patterns'] = {
-                'hour': dt.hour,
-                'day_of_week': dt.weekday(),
-                'is_off_hours': dt.hour < 6 or dt.hour > 22
-            }
-        
-        # Analyze behavioral patterns
-        if event_details.get('error_code'):
-            patterns['behavioral_patterns'].append('failed_attempts')
-        
-        if len(event_details.get('resources', [])) > 5:
-            patterns['behavioral_patterns'].append('bulk_operations')
-        
-        return patterns
+    def analyze_attack_patterns_batch(self, event_details: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Attack patterns for many events at once; same results as _analyze_attack_patterns per event."""
+        return features.attack_patterns_batch(event_details)
     
-    def _update_attacker_profile(self, event_details: Dict[str, Any], attack_patterns: Dict[str, Any]) -> Dict[str, Any]:
-        """Update or create attacker profile."""
+    def _update_attacker_profile(self, event_details: Dict[str, Any], attack_patterns: Dict[str, Any],
+                                 threat_level: Optional[str] = None) -> Dict[str, Any]:
+        """Update or create attacker profile with a single atomic UpdateItem."""
         source_ip = event_details.get('source_ip')
         if not source_ip:
             return {}
         
+        delta = ProfileDelta.from_event(event_details, attack_patterns, threat_level)
+        
         try:
-            # Get existing profile
-            response = self.attacker_profiles_table.get_item(
-                Key={'source_ip': source_ip}
-            )
-            
-            profile = response.get('Item', {
-                'source_ip': source_ip,
-                'first_seen': event_details.get('event_time'),
-                'attack_count': 0,
-                'attack_vectors': set(),
-                'tools_used': set(),
-                'threat_levels': [],
-                'last_activity': event_details.get('event_time')
-            })
-            
-            # Update profile
-            profile['attack_count'] += 1
-            profile['attack_vectors'].update(attack_patterns.get('attack_vectors', []))
-            profile['tools_used'].update(attack_patterns.get('tools_used', []))
-            profile['last_activity'] = event_details.get('event_time')
-            
-            # Convert sets to lists for DynamoDB storage
-            profile['attack_vectors'] = list(profile['attack_vectors'])
-            profile['tools_used'] = list(profile['tools_used'])
-            
-            # Store updated profile
-            self.attacker_profiles_table.put_item(Item=profile)
-            
-            return profile
+            # With a cache the write is deferred and merged with other events from the same IP
+            cache = self.profile_cache or self._bulk_cache
+            if cache is not None:
+                return cache.record(delta)
+            return self.profiles.apply(delta)
             
         except Exception as e:
             logger.error("failed_to_update_attacker_profile", error=str(e))
             return {}
     
+    def _track_session(self, event_details: Dict[str, Any]) -> None:
+        """Add the event to its attacker session and emit summaries of sessions that closed."""
+        if self.sessionizer is None:
+            return
+        try:
+            self._emit_sessions(self.sessionizer.add(event_details))
+        except Exception as e:
+            logger.error("failed_to_track_session", error=str(e))
+    
+    def close_sessions(self) -> List[Dict[str, Any]]:
+        """Close and emit every open session, e.g. at the end of a replay."""
+        if self.sessionizer is None:
+            return []
+        summaries = self.sessionizer.flush()
+        self._emit_sessions(summaries)
+        return summaries
+    
+    def _emit_sessions(self, summaries: List[Dict[str, Any]]) -> None:
+        for summary in summaries:
+            metrics.count('AttackSessionsClosed', dimensions={'CloseReason': summary['close_reason']})
+            metrics.record('AttackSessionDuration', summary['duration_seconds'], unit='Seconds')
+            metrics.record('AttackSessionKillChainStages', len(summary['kill_chain_stages']))
+            logger.info("attack_session_closed", **summary)
+    
+    @contextmanager
+    def bulk_profile_updates(self) -> Iterator[None]:
+        """Collapse every profile update made inside the block into one write per IP."""
+        if self.profile_cache is not None:
+            # The profile cache already coalesces; write what it holds when the block ends
+            try:
+                yield
+            finally:
+                self.profile_cache.flush()
+            return
+        if self._bulk_cache is not None:
+            yield
+            return
+        self._bulk_cache = ProfileCache(self.profiles, max_pending=None, max_age_seconds=None)
+        try:
+            yield
+        finally:
+            cache, self._bulk_cache = self._bulk_cache, None
+            cache.flush()
+    
+    def get_attacker_profile(self, source_ip: str) -> Optional[Dict[str, Any]]:
+        """Current attacker profile, including updates that have not been written yet."""
+        if self.profile_cache is not None:
+            return self.profile_cache.get(source_ip)
+        return self.profiles.get(source_ip)
+    
+    def flush(self) -> None:
+        """
+        Write buffered profile updates, intelligence records and deep-analysis jobs, and merge heavy hitters if due.
+        
+        Raises BatchWriteError, once everything else is flushed, if intelligence records could not be written.
+        """
+        if self.profile_cache is not None:
+            self.profile_cache.flush()
+        try:
+            self.intel_writer.flush()
+        finally:
+            if self.deep_analysis is not None:
+                self.deep_analysis.flush()
+            if self.heavy_hitters is not None:
+                self.heavy_hitters.merge_shared()
+    
     def _store_intelligence(self, event_details: Dict[str, Any], threat_assessment: Dict[str, Any], attack_patterns: Dict[str, Any]) -> str:
-        """Store threat intelligence in DynamoDB."""
+        """Queue threat intelligence for a batched DynamoDB write."""
         try:
             intelligence_id = f"intel_{event_details.get('event_id', 'unknown')}_{int(datetime.now().timestamp())}"
+            risk_score = threat_assessment.get('risk_score')
             
             item = {
                 'intelligence_id': intelligence_id,
@@ -186,14 +254,15 @@ class IntelligenceCollector:
                 'timestamp': datetime.now(timezone.utc).isoformat(),
                 'source_ip': event_details.get('source_ip'),
                 'threat_level': threat_assessment.get('threat_level'),
-                'risk_score': threat_assessment.get('risk_score'),
+                # DynamoDB stores numbers as Decimal and rejects floats
+                'risk_score': Decimal(str(risk_score)) if risk_score is not None else None,
                 'attack_patterns': attack_patterns,
                 'event_details': event_details,
                 'threat_categories': threat_assessment.get('categories', []),
                 'ttl': int(datetime.now().timestamp()) + (90 * 24 * 60 * 60)  # 90 days TTL
             }
             
-            self.threat_intel_table.put_item(Item=item)
+            self.intel_writer.put(encode_item(item, THREAT_INTEL_ENCODED_ATTRIBUTES))
             
             return intelligence_id
             
@@ -202,21 +271,65 @@ class IntelligenceCollector:
             raise
     
     def _trigger_deep_analysis(self, event_details: Dict[str, Any], threat_assessment: Dict[str, Any]) -> None:
-        """Trigger deep analysis for high/critical threats."""
+        """Queue deep analysis for high/critical threats; the job runs later in the deep-analysis worker."""
+        if self.deep_analysis is None:
+            if DEEP_ANALYSIS_ENABLED:
+                # Enabled but no queue is configured (see deep_analysis.get_queue)
+                metrics.count('DeepAnalysisSkipped', dimensions={'ThreatLevel': threat_assessment.get('threat_level', 'UNKNOWN')})
+            return
         try:
-            # This would trigger additional analysis Lambda functions
-            # For now, we'll log the trigger
+            job = self.deep_analysis.submit(event_details, threat_assessment)
+            if job is None:
+                metrics.count('DeepAnalysisDeduplicated')
+                return
+            
+            metrics.count('DeepAnalysisQueued', dimensions={'ThreatLevel': threat_assessment.get('threat_level', 'UNKNOWN')})
             logger.info(
                 "deep_analysis_triggered",
+                job_id=job['job_id'],
                 source_ip=event_details.get('source_ip'),
                 threat_level=threat_assessment.get('threat_level')
             )
             
         except Exception as e:
             logger.error("failed_to_trigger_deep_analysis", error=str(e))
+    
+    def deep_analyze(self, job: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        """Deep analysis of one queued job: the attacker's accumulated profile and standing among current top talkers."""
+        event_details = claim_check.resolve(job.get('event_details') or {})
+        source_ip = job.get('source_ip')
+        profile = self.get_attacker_profile(source_ip) or {}
+        
+        report = {
+            'job_id': job.get('job_id'),
+            'source_ip': source_ip,
+            'threat_level': job.get('threat_level'),
+            'risk_score': job.get('risk_score'),
+            'event_name': event_details.get('event_name'),
+            'attack_count': profile.get('attack_count', 0),
+            'attack_vectors': profile.get('attack_vectors', []),
+            'tools_used': profile.get('tools_used', []),
+            'distinct_apis': profile.get('distinct_apis'),
+            'queue_latency_seconds': time.time() - float(job.get('submitted_at') or time.time()),
+            'analyzed_at': datetime.now(timezone.utc).isoformat()
+        }
+        if self.heavy_hitters is not None and time.monotonic() < deadline:
+            top = [entry['source_ip'] for entry in self.heavy_hitters.top_talkers('1h', k=50)]
+            report['top_talker_rank'] = top.index(source_ip) + 1 if source_ip in top else None
+        
+        metrics.count('DeepAnalysisCompleted', dimensions={'ThreatLevel': job.get('threat_level') or 'UNKNOWN'})
+        metrics.record('DeepAnalysisQueueLatency', report['queue_latency_seconds'], unit='Seconds')
+        logger.info("deep_analysis_completed", **report)
+        return report
+
+@lru_cache(maxsize=1)
+def get_collector() -> IntelligenceCollector:
+    """Build the collector once per container."""
+    return IntelligenceCollector()
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Main Lambda handler for intelligence collection."""
+    collector = None
     try:
         logger.info("intelligence_collection_started")
         
@@ -224,8 +337,12 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         threat_assessment = detail.get('threat_assessment', {})
         original_event = detail.get('original_event', {})
         
-        collector = IntelligenceCollector()
+        collector = get_collector()
+        collector.intel_writer.watch_deadline(context)
         result = collector.collect_intelligence(threat_assessment, original_event)
+        # Nothing may stay buffered in a frozen container, so profile writes from
+        # this handler are never coalesced across invocations; batch_handler coalesces per batch
+        collector.flush()
         
         return {
             'statusCode': 200,
@@ -237,4 +354,104 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
     except Exception as e:
         logger.error("intelligence_collection_failed", error=str(e))
-        raise 
\ No newline at end of file
+        raise 
+    
+    finally:
+        # A failed invocation must not leave records or an armed deadline timer for the next one
+        if collector is not None:
+            collector.intel_writer.discard()
+        metrics.flush()
+
+def batch_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda handler for SQS and Kinesis batches of threat detection events.
+    
+    Profile updates for the same attacker IP are merged across the batch and
+    written once. Records that fail are reported as partial batch failures.
+    """
+    records = event.get('Records', [])
+    logger.info("batch_intelligence_collection_started", record_count=len(records))
+    
+    collector = get_collector()
+    collector.intel_writer.watch_deadline(context)
+    failures = []
+    # Intelligence record key -> records stored under it
+    stored_keys: Dict[Tuple, List[str]] = {}
+    
+    decoded = []
+    for record in records:
+        item_identifier = record_identifier(record)
+        try:
+            detail = decode_record(record).get('detail', {})
+            original_event = detail.get('original_event', {})
+            decoded.append((item_identifier, detail, original_event, collector._extract_event_details(original_event)))
+        except Exception as e:
+            logger.error("batch_record_failed", item_identifier=item_identifier, error=str(e))
+            failures.append(item_identifier)
+    
+    # Feature extraction runs columnar over the whole batch; if any event cannot
+    # be handled there, each event is analyzed on its own so only it fails
+    try:
+        batch_patterns = collector.analyze_attack_patterns_batch([entry[3] for entry in decoded])
+    except Exception as e:
+        logger.warning("batch_feature_extraction_failed", error=str(e))
+        batch_patterns = [None] * len(decoded)
+    
+    try:
+        with collector.bulk_profile_updates():
+            for (item_identifier, detail, original_event, event_details), patterns in zip(decoded, batch_patterns):
+                try:
+                    result = collector.collect_intelligence(
+                        detail.get('threat_assessment', {}), original_event,
+                        event_details=event_details, attack_patterns=patterns
+                    )
+                    intel_key = collector.intel_writer.key({'intelligence_id': result['intelligence_id']})
+                    stored_keys.setdefault(intel_key, []).append(item_identifier)
+                except Exception as e:
+                    logger.error("batch_record_failed", item_identifier=item_identifier, error=str(e))
+                    failures.append(item_identifier)
+        try:
+            collector.flush()
+        except BatchWriteError as e:
+            logger.error("batch_intelligence_write_failed", failed_count=len(e.failed_keys))
+            failures.extend(item_id for key in e.failed_keys for item_id in stored_keys.get(key, ()))
+    
+    finally:
+        collector.intel_writer.discard()
+        metrics.flush()
+    
+    logger.info("batch_intelligence_collection_completed", record_count=len(records), failed_count=len(failures))
+    
+    return {
+        'batchItemFailures': [{'itemIdentifier': item_id} for item_id in failures]
+    }
+
+def deep_analysis_worker_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda handler, run on a schedule, that drains the deep-analysis queue most urgent first.
+    
+    Jobs run DEEP_ANALYSIS_CONCURRENCY at a time, each within
+    DEEP_ANALYSIS_JOB_TIMEOUT_SECONDS, and no job is started that could not
+    finish before the invocation times out. Without SQS queue URLs there is
+    nothing shared to drain, so the worker refuses to run inside Lambda.
+    """
+    queue = deep_analysis.get_queue()
+    if queue is None:
+        raise RuntimeError('Deep-analysis worker requires DEEP_ANALYSIS_CRITICAL_QUEUE_URL or DEEP_ANALYSIS_HIGH_QUEUE_URL')
+    collector = get_collector()
+    deadline = None
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if get_remaining is not None:
+        deadline = time.monotonic() + get_remaining() / 1000 - DEEP_ANALYSIS_DEADLINE_MARGIN_SECONDS
+    
+    try:
+        worker = deep_analysis.DeepAnalysisWorker(queue.backend, collector.deep_analyze)
+        counts = worker.run(deadline=deadline, max_jobs=event.get('max_jobs'))
+        for name, value in counts.items():
+            if value:
+                metrics.count(f'DeepAnalysisJobs{name.title().replace("_", "")}', value)
+        logger.info("deep_analysis_worker_completed", **counts)
+        return {'statusCode': 200, 'body': json.dumps(counts)}
+    
+    finally:
+        metrics.flush()
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+SecureShield AI - Attacker Profile Cache
+Write-behind cache that coalesces attacker profile updates per source IP and serves read-through lookups.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import structlog
+
+from .profiles import ProfileDelta, ProfileStore
+
+logger = structlog.get_logger()
+
+class ProfileCache:
+    """
+    Coalesces profile deltas per source IP in front of a ProfileStore.
+    
+    record() merges a delta into the pending write for its IP, so a scanner
+    sending hundreds of events a minute costs one UpdateItem per flush instead
+    of one per event. Pending deltas are written when max_pending IPs are
+    waiting, when the oldest has waited max_age_seconds, or on flush() at the
+    end of an invocation. Profiles returned by the store are kept in an LRU so
+    get() and record() can answer from memory, overlaying any pending delta;
+    get() reads an IP not in the LRU through from the store.
+    """
+    
+    def __init__(self, store: ProfileStore, max_pending: Optional[int] = 500, max_age_seconds: Optional[float] = 30.0,
+                 max_profiles: int = 10000, profile_ttl_seconds: float = 300.0):
+        self.store = store
+        self.max_pending = max_pending
+        self.max_age_seconds = max_age_seconds
+        self.max_profiles = max_profiles
+        self.profile_ttl_seconds = profile_ttl_seconds
+        self._pending: Dict[str, ProfileDelta] = {}
+        self._oldest_pending: Optional[float] = None
+        # source_ip -> (loaded_at, stored profile or None if the IP has no profile yet)
+        self._profiles: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'recorded': 0, 'coalesced': 0, 'writes': 0, 'hits': 0, 'misses': 0}
+    
+    def record(self, delta: ProfileDelta) -> Dict[str, Any]:
+        """
+        Queue a delta and return the profile as it will look once written.
+        
+        Nothing is read here, so the ingest path costs no DynamoDB call: for
+        an IP not in the LRU the returned profile holds only the pending
+        changes, and callers that need the full totals use get().
+        """
+        with self._lock:
+            pending = self._pending.get(delta.source_ip)
+            if pending is None:
+                pending = self._pending[delta.source_ip] = ProfileDelta(delta.source_ip)
+                if self._oldest_pending is None:
+                    self._oldest_pending = time.monotonic()
+            else:
+                self.stats['coalesced'] += 1
+            pending.merge(delta)
+            self.stats['recorded'] += 1
+            view = self._view(delta.source_ip)
+            should_flush = (
+                (self.max_pending is not None and len(self._pending) >= self.max_pending) or
+                (self.max_age_seconds is not None and time.monotonic() - self._oldest_pending >= self.max_age_seconds)
+            )
+        
+        if should_flush:
+            self.flush()
+        return view
+    
+    def get(self, source_ip: str, read_through: bool = True) -> Optional[Dict[str, Any]]:
+        """Return the current profile for an IP, reading it from DynamoDB only on a cache miss."""
+        with self._lock:
+            if self._fresh(source_ip):
+                self.stats['hits'] += 1
+                return self._view(source_ip)
+            self.stats['misses'] += 1
+            if not read_through:
+                return self._view(source_ip)
+        
+        profile = self.store.get(source_ip)
+        with self._lock:
+            self._remember(source_ip, profile)
+            return self._view(source_ip)
+    
+    def pending(self) -> int:
+        """Number of IPs with unwritten deltas."""
+        with self._lock:
+            return len(self._pending)
+    
+    def flush(self) -> int:
+        """Write every pending delta and return the number of profiles updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._oldest_pending = None
+        
+        written = 0
+        for source_ip, delta in pending.items():
+            try:
+                profile = self.store.apply(delta)
+            except Exception as e:
+                logger.error("failed_to_update_attacker_profile", source_ip=source_ip, error=str(e))
+                # Keep the delta so the next flush retries it instead of losing the counts
+                with self._lock:
+                    retained = self._pending.setdefault(source_ip, ProfileDelta(source_ip))
+                    retained.merge(delta)
+                    if self._oldest_pending is None:
+                        self._oldest_pending = time.monotonic()
+                continue
+            written += 1
+            with self._lock:
+                self._remember(source_ip, profile)
+        
+        with self._lock:
+            self.stats['writes'] += written
+        return written
+    
+    def _fresh(self, source_ip: str) -> bool:
+        entry = self._profiles.get(source_ip)
+        if entry is None:
+            return False
+        if time.monotonic() - entry[0] > self.profile_ttl_seconds:
+            del self._profiles[source_ip]
+            return False
+        self._profiles.move_to_end(source_ip)
+        return True
+    
+    def _remember(self, source_ip: str, profile: Optional[Dict[str, Any]]) -> None:
+        self._profiles[source_ip] = (time.monotonic(), profile)
+        self._profiles.move_to_end(source_ip)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+    
+    def _view(self, source_ip: str) -> Optional[Dict[str, Any]]:
+        """Stored profile (if cached) with the pending delta applied; sketch estimates are as of the last write."""
+        entry = self._profiles.get(source_ip)
+        stored = entry[1] if entry else None
+        pending = self._pending.get(source_ip)
+        if pending is None:
+            return stored
+        return pending.applied_to(stored, include_sketches=False) if stored else pending.as_profile(include_sketches=False)
@@ -0,0 +1,354 @@
+"""
+SecureShield AI - Attacker Profiles
+Attacker profile maintenance as single UpdateItem requests built from mergeable per-IP deltas.
+"""
+
+import base64
+import json
+from decimal import Decimal
+from typing import Dict, Any, Iterable, Mapping, Optional, Set
+
+from boto3.dynamodb.types import Binary
+from botocore.exceptions import ClientError
+import structlog
+
+from ..common.storage import SQLiteBackend, SQLiteDatabase, StorageBackend
+from .sketches import SKETCH_ATTRIBUTES, ProfileSketches, counter_attributes, hour_of_week, is_counter_attribute
+
+logger = structlog.get_logger()
+
+PROFILE_SET_ATTRIBUTES = ('attack_vectors', 'tools_used', 'threat_levels')
+# Conditional HyperLogLog writes attempted before a delta's distinct-count registers are given up under contention
+SKETCH_MERGE_ATTEMPTS = 5
+
+def _resource_names(resources: Optional[Iterable[Any]]) -> Iterable[str]:
+    """ARNs (or names) of the resources in a CloudTrail event."""
+    for resource in resources or ():
+        if isinstance(resource, dict):
+            name = resource.get('ARN') or resource.get('arn')
+            if name:
+                yield name
+        elif resource:
+            yield str(resource)
+
+class ProfileDelta:
+    """
+    Changes to one attacker profile; deltas for the same IP merge into one update.
+    
+    API calls, resources and active hours are kept exactly while the delta
+    is pending and only folded into the profile's fixed-size sketches when it
+    is written, so coalescing events stays cheap.
+    """
+    
+    def __init__(self, source_ip: str, attack_count: int = 0, attack_vectors: Optional[Iterable[str]] = None,
+                 tools_used: Optional[Iterable[str]] = None, threat_levels: Optional[Iterable[str]] = None,
+                 first_seen: Optional[str] = None, last_activity: Optional[str] = None,
+                 api_calls: Optional[Mapping[str, int]] = None, resources: Optional[Iterable[str]] = None,
+                 active_hours: Optional[Mapping[int, int]] = None):
+        self.source_ip = source_ip
+        self.attack_count = attack_count
+        self.attack_vectors: Set[str] = set(attack_vectors or ())
+        self.tools_used: Set[str] = set(tools_used or ())
+        self.threat_levels: Set[str] = set(threat_levels or ())
+        self.first_seen = first_seen
+        self.last_activity = last_activity
+        self.api_calls: Dict[str, int] = dict(api_calls or {})
+        self.resources: Set[str] = set(resources or ())
+        self.active_hours: Dict[int, int] = dict(active_hours or {})
+    
+    @classmethod
+    def from_event(cls, event_details: Dict[str, Any], attack_patterns: Dict[str, Any],
+                   threat_level: Optional[str] = None) -> 'ProfileDelta':
+        """Delta for one observed event."""
+        return cls(
+            source_ip=event_details['source_ip'],
+            attack_count=1,
+            attack_vectors=attack_patterns.get('attack_vectors', []),
+            tools_used=attack_patterns.get('tools_used', []),
+            threat_levels=[threat_level] if threat_level else [],
+            first_seen=event_details.get('event_time'),
+            last_activity=event_details.get('event_time'),
+            api_calls={event_details['event_name']: 1} if event_details.get('event_name') else None,
+            resources=_resource_names(event_details.get('resources')),
+            active_hours={hour_of_week(event_details['event_time']): 1} if event_details.get('event_time') else None
+        )
+    
+    def merge(self, other: 'ProfileDelta') -> 'ProfileDelta':
+        """Fold another delta for the same IP into this one."""
+        self.attack_count += other.attack_count
+        self.attack_vectors |= other.attack_vectors
+        self.tools_used |= other.tools_used
+        self.threat_levels |= other.threat_levels
+        for event_name, count in other.api_calls.items():
+            self.api_calls[event_name] = self.api_calls.get(event_name, 0) + count
+        self.resources |= other.resources
+        for bucket, count in other.active_hours.items():
+            self.active_hours[bucket] = self.active_hours.get(bucket, 0) + count
+        # ISO 8601 timestamps in the same format order lexicographically
+        if other.first_seen and (not self.first_seen or other.first_seen < self.first_seen):
+            self.first_seen = other.first_seen
+        if other.last_activity and (not self.last_activity or other.last_activity > self.last_activity):
+            self.last_activity = other.last_activity
+        return self
+    
+    def has_sketch_updates(self) -> bool:
+        """True if writing this delta changes the profile's sketches."""
+        return bool(self.api_calls or self.resources or self.active_hours)
+    
+    def sketches(self) -> ProfileSketches:
+        """This delta's observations as sketches, ready to merge into a profile's."""
+        return ProfileSketches().observe(self.api_calls, self.resources, self.active_hours)
+    
+    def update_arguments(self) -> Dict[str, Any]:
+        """
+        Keyword arguments for Table.update_item applying this delta's counters and sets atomically.
+        
+        API call frequencies and active hours are ADDed to the profile's
+        count-min cells and hour-of-week buckets in the same request.
+        """
+        add_clauses = ['attack_count :attack_count']
+        set_clauses = []
+        values: Dict[str, Any] = {':attack_count': self.attack_count}
+        
+        # DynamoDB rejects empty sets, so only non-empty ones are added
+        for attribute in PROFILE_SET_ATTRIBUTES:
+            members = getattr(self, attribute)
+            if members:
+                add_clauses.append(f'{attribute} :{attribute}')
+                values[f':{attribute}'] = set(members)
+        
+        if self.first_seen:
+            set_clauses.append('first_seen = if_not_exists(first_seen, :first_seen)')
+            values[':first_seen'] = self.first_seen
+        if self.last_activity:
+            set_clauses.append('last_activity = :last_activity')
+            values[':last_activity'] = self.last_activity
+        
+        for attribute, count in counter_attributes(self.api_calls, self.active_hours).items():
+            add_clauses.append(f'{attribute} :{attribute}')
+            values[f':{attribute}'] = count
+        
+        expression = 'ADD ' + ', '.join(add_clauses)
+        if set_clauses:
+            expression += ' SET ' + ', '.join(set_clauses)
+        
+        return {
+            'Key': {'source_ip': self.source_ip},
+            'UpdateExpression': expression,
+            'ExpressionAttributeValues': values,
+            'ReturnValues': 'ALL_NEW'
+        }
+    
+    def as_profile(self, include_sketches: bool = True) -> Dict[str, Any]:
+        """The profile this delta would create for a previously unseen IP."""
+        return self.applied_to({'source_ip': self.source_ip}, include_sketches)
+    
+    def applied_to(self, profile: Dict[str, Any], include_sketches: bool = True) -> Dict[str, Any]:
+        """
+        The profile writing this delta would produce from a normalized stored profile.
+        
+        Without include_sketches the stored sketches and their estimates are
+        carried over unchanged, which is much cheaper for read-only views.
+        """
+        updated = dict(profile)
+        updated['attack_count'] = int(profile.get('attack_count', 0)) + self.attack_count
+        for attribute in PROFILE_SET_ATTRIBUTES:
+            updated[attribute] = set(profile.get(attribute, ())) | getattr(self, attribute)
+        if self.first_seen and not profile.get('first_seen'):
+            updated['first_seen'] = self.first_seen
+        if self.last_activity:
+            updated['last_activity'] = self.last_activity
+        if not include_sketches or not self.has_sketch_updates():
+            return normalize_profile(updated)
+        sketches = ProfileSketches.from_item(profile).merge(self.sketches())
+        updated.update(sketches.attribute_values())
+        return normalize_profile(updated, sketches)
+
+def normalize_profile(item: Dict[str, Any], sketches: Optional[ProfileSketches] = None) -> Dict[str, Any]:
+    """
+    Convert a stored profile to plain JSON types (sorted lists, ints and base64 sketches).
+    
+    Estimates are derived from binary sketches, or from sketches the caller
+    already decoded; profiles that were normalized before keep theirs.
+    Count-min cells and hour-of-week buckets stored as counter attributes
+    are folded back into base64 sketches, so every store returns one shape.
+    """
+    profile = {}
+    binary_sketches = False
+    counter_sketches = False
+    for name, value in item.items():
+        if is_counter_attribute(name):
+            counter_sketches = True
+            continue
+        if isinstance(value, str):
+            pass
+        elif isinstance(value, (set, frozenset, list)):
+            value = sorted(value)
+        elif isinstance(value, Decimal):
+            value = int(value) if value == value.to_integral_value() else float(value)
+        elif isinstance(value, (bytes, bytearray, Binary)):
+            value = base64.b64encode(bytes(getattr(value, 'value', value))).decode('ascii')
+            binary_sketches = binary_sketches or name in SKETCH_ATTRIBUTES
+        profile[name] = value
+    for attribute in PROFILE_SET_ATTRIBUTES:
+        profile.setdefault(attribute, [])
+    if sketches is None and (binary_sketches or counter_sketches):
+        sketches = ProfileSketches.from_item(item)
+    if sketches is not None:
+        if counter_sketches:
+            profile.update({
+                attribute: base64.b64encode(data).decode('ascii') for attribute, data in sketches.attribute_values().items()
+            })
+        profile.update(sketches.summary())
+    return profile
+
+class ProfileStore:
+    """Applies profile deltas to the attacker profiles table with one UpdateItem each."""
+    
+    def __init__(self, table: Any):
+        self.table = table
+    
+    def get(self, source_ip: str) -> Optional[Dict[str, Any]]:
+        """Read a stored profile."""
+        item = self.table.get_item(Key={'source_ip': source_ip}).get('Item')
+        return normalize_profile(item) if item else None
+    
+    def apply(self, delta: ProfileDelta) -> Dict[str, Any]:
+        """
+        Apply a delta and return the updated profile.
+        
+        Counters, sets, API call frequencies and active hours are one
+        UpdateItem. DynamoDB cannot take the register-wise maximum of the
+        HyperLogLog sketches, so those are merged in-process into the
+        registers that update returned and written back only if a register
+        changed, conditional on the stored sketch being unchanged.
+        """
+        item = self._update(delta.source_ip, delta.update_arguments())
+        if delta.api_calls or delta.resources:
+            item = self._merge_distinct(delta, item)
+        return normalize_profile(item)
+        
+    def _merge_distinct(self, delta: ProfileDelta, item: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Raise the stored HyperLogLog registers to the delta's, retrying on a conflict.
+        
+        Merging by maximum is idempotent, so a retry re-merges into the re-read
+        registers without double counting. Registers still unwritten after
+        SKETCH_MERGE_ATTEMPTS only make distinct counts underestimate; the
+        counters written by the first request are unaffected.
+        """
+        observed = delta.sketches().distinct()
+        for _ in range(SKETCH_MERGE_ATTEMPTS):
+            stored = ProfileSketches.from_item(item)
+            changed = {}
+            for attribute, sketch in observed.sketches.items():
+                current = stored.sketches.get(attribute)
+                merged = type(sketch).from_bytes(sketch.to_bytes())
+                if current is not None:
+                    merged.merge(current)
+                    if (merged.registers == current.registers).all():
+                        continue
+                changed[attribute] = merged.to_bytes()
+            if not changed:
+                return item
+            
+            values: Dict[str, Any] = {}
+            conditions = []
+            for attribute, data in changed.items():
+                values[f':{attribute}'] = data
+                if item.get(attribute) is None:
+                    conditions.append(f'attribute_not_exists({attribute})')
+                else:
+                    conditions.append(f'{attribute} = :previous_{attribute}')
+                    values[f':previous_{attribute}'] = item[attribute]
+            try:
+                response = self.table.update_item(
+                    Key={'source_ip': delta.source_ip},
+                    UpdateExpression='SET ' + ', '.join(f'{attribute} = :{attribute}' for attribute in changed),
+                    ConditionExpression=' AND '.join(conditions),
+                    ExpressionAttributeValues=values,
+                    ReturnValues='ALL_NEW'
+                )
+                return response.get('Attributes', {})
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+            item = self.table.get_item(Key={'source_ip': delta.source_ip}, ConsistentRead=True).get('Item', {})
+        logger.warning("attacker_profile_sketch_merge_abandoned", source_ip=delta.source_ip)
+        return item
+    
+    def _update(self, source_ip: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one UpdateItem, migrating a legacy profile and retrying once if it fails validation."""
+        try:
+            response = self.table.update_item(**arguments)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ValidationException' or not self._migrate_legacy_lists(source_ip):
+                raise
+            response = self.table.update_item(**arguments)
+        return response.get('Attributes', {})
+    
+    def _migrate_legacy_lists(self, source_ip: str) -> bool:
+        """
+        Convert list attributes written by the old get/put code to string sets.
+        
+        ADD cannot operate on lists, so the first update of a legacy profile
+        fails validation; each conversion is conditional on the attribute still
+        being a list so concurrent migrations cannot clobber newer data.
+        """
+        item = self.table.get_item(Key={'source_ip': source_ip}, ConsistentRead=True).get('Item', {})
+        migrated = False
+        for attribute in PROFILE_SET_ATTRIBUTES:
+            value = item.get(attribute)
+            if not isinstance(value, list):
+                continue
+            members = {str(member) for member in value}
+            try:
+                if members:
+                    self.table.update_item(
+                        Key={'source_ip': source_ip},
+                        UpdateExpression=f'SET {attribute} = :members',
+                        ConditionExpression=f'attribute_type({attribute}, :list_type)',
+                        ExpressionAttributeValues={':members': members, ':list_type': 'L'}
+                    )
+                else:
+                    self.table.update_item(
+                        Key={'source_ip': source_ip},
+                        UpdateExpression=f'REMOVE {attribute}',
+                        ConditionExpression=f'attribute_type({attribute}, :list_type)',
+                        ExpressionAttributeValues={':list_type': 'L'}
+                    )
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                    raise
+            migrated = True
+        if migrated:
+            logger.info("attacker_profile_migrated", source_ip=source_ip)
+        return migrated
+
+class SQLiteProfileStore:
+    """ProfileStore counterpart over the embedded SQLite database; each delta is one read-modify-write transaction."""
+    
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+    
+    def get(self, source_ip: str) -> Optional[Dict[str, Any]]:
+        """Read a stored profile."""
+        rows = self.database.query('SELECT profile FROM attacker_profiles WHERE source_ip = ?', (source_ip,))
+        return json.loads(rows[0][0]) if rows else None
+    
+    def apply(self, delta: ProfileDelta) -> Dict[str, Any]:
+        """Apply a delta and return the updated profile."""
+        with self.database.transaction() as connection:
+            row = connection.execute('SELECT profile FROM attacker_profiles WHERE source_ip = ?', (delta.source_ip,)).fetchone()
+            profile = delta.applied_to(json.loads(row[0])) if row else delta.as_profile()
+            connection.execute(
+                'INSERT OR REPLACE INTO attacker_profiles (source_ip, last_activity, profile) VALUES (?, ?, ?)',
+                (delta.source_ip, profile.get('last_activity'), json.dumps(profile, separators=(',', ':')))
+            )
+        return profile
+
+def open_profile_store(backend: StorageBackend, table_name: str) -> Any:
+    """The profile store for the configured storage backend."""
+    if isinstance(backend, SQLiteBackend):
+        return SQLiteProfileStore(backend.database)
+    return ProfileStore(backend.table(table_name))
\ No newline at end of file
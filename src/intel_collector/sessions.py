@@ -0,0 +1,216 @@
+"""
+SecureShield AI - Attack Sessions
+Streaming sessionization of attacker activity per source IP and principal with an inactivity gap.
+"""
+
+import heapq
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Kill-chain stage -> CloudTrail event name prefixes that indicate it
+KILL_CHAIN_RULES = (
+    ('reconnaissance', ('Describe', 'List', 'GetCallerIdentity', 'GetAccountAuthorizationDetails', 'GetBucketAcl')),
+    ('credential_access', ('GetSecretValue', 'GetPasswordData', 'CreateAccessKey', 'GetSessionToken',
+                           'GetFederationToken')),
+    ('privilege_escalation', ('AttachUserPolicy', 'AttachRolePolicy', 'PutUserPolicy', 'PutRolePolicy',
+                              'CreatePolicyVersion', 'AddUserToGroup', 'AssumeRole', 'UpdateLoginProfile')),
+    ('persistence', ('CreateUser', 'CreateLoginProfile', 'CreateRole', 'UpdateAssumeRolePolicy', 'ImportKeyPair',
+                     'CreateFunction')),
+    ('defense_evasion', ('StopLogging', 'DeleteTrail', 'UpdateTrail', 'PutEventSelectors', 'DeleteFlowLogs',
+                         'DeleteDetector', 'DisableSecurityHub', 'DeleteConfigRule')),
+    ('collection', ('GetObject', 'CopyObject', 'CreateSnapshot', 'GetParameter')),
+    ('exfiltration', ('PutBucketPolicy', 'PutBucketAcl', 'ModifySnapshotAttribute', 'ModifyImageAttribute',
+                      'CreateExportTask', 'ModifyDBSnapshotAttribute')),
+    ('impact', ('DeleteBucket', 'DeleteObject', 'TerminateInstances', 'DeleteDBInstance', 'PutBucketEncryption',
+                'DeleteSecret', 'ScheduleKeyDeletion'))
+)
+KILL_CHAIN_STAGES = tuple(stage for stage, _ in KILL_CHAIN_RULES)
+
+@lru_cache(maxsize=4096)
+def kill_chain_mask(event_name: str) -> int:
+    """Bit mask of the kill-chain stages an API call belongs to (bit i = KILL_CHAIN_STAGES[i])."""
+    mask = 0
+    for bit, (_, prefixes) in enumerate(KILL_CHAIN_RULES):
+        if event_name.startswith(prefixes):
+            mask |= 1 << bit
+    return mask
+
+def _epoch(event_time: Optional[str]) -> Optional[float]:
+    if not event_time:
+        return None
+    try:
+        parsed = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+def principal_of(event_details: Dict[str, Any]) -> str:
+    """The acting principal of an event: its ARN, else its principal ID."""
+    identity = event_details.get('user_identity') or {}
+    return identity.get('arn') or identity.get('principalId') or 'anonymous'
+
+class Session:
+    """Running aggregates for one open session; slotted since a container may hold hundreds of thousands."""
+    
+    __slots__ = ('source_ip', 'principal', 'start', 'end', 'events', 'errors', 'apis', 'stages')
+    
+    def __init__(self, source_ip: str, principal: str, event_time: float):
+        self.source_ip = source_ip
+        self.principal = principal
+        self.start = event_time
+        self.end = event_time
+        self.events = 0
+        self.errors = 0
+        self.apis: set = set()
+        self.stages = 0
+    
+    def add(self, event_time: float, event_name: str, failed: bool) -> None:
+        if event_time < self.start:
+            self.start = event_time
+        elif event_time > self.end:
+            self.end = event_time
+        self.events += 1
+        if failed:
+            self.errors += 1
+        if event_name:
+            self.apis.add(event_name)
+            self.stages |= kill_chain_mask(event_name)
+    
+    def summary(self, reason: str) -> Dict[str, Any]:
+        """Session summary; the event rate is per minute over at least one minute."""
+        duration = self.end - self.start
+        return {
+            'source_ip': self.source_ip,
+            'principal': self.principal,
+            'start': _iso(self.start),
+            'end': _iso(self.end),
+            'duration_seconds': duration,
+            'event_count': self.events,
+            'events_per_minute': self.events * 60.0 / max(duration, 60.0),
+            'distinct_apis': len(self.apis),
+            'error_ratio': self.errors / self.events if self.events else 0.0,
+            'kill_chain_stages': [stage for bit, stage in enumerate(KILL_CHAIN_STAGES) if self.stages >> bit & 1],
+            'close_reason': reason
+        }
+
+class Sessionizer:
+    """
+    Groups events into sessions per (source IP, principal) separated by gap_seconds of inactivity.
+    
+    Event time drives everything: the watermark trails the latest event time
+    seen by tolerance_seconds, and a session closes once the watermark is more
+    than gap_seconds past its last event, so events arriving up to
+    tolerance_seconds out of order still land in the right session. Older
+    events with no open session are counted as late and dropped. Open sessions
+    are indexed by a min-heap on their end time, since an out-of-order event
+    can update a session without extending it; expiry only inspects the top,
+    and beyond max_keys the session that ended earliest is closed early. Heap
+    entries left behind by extended or closed sessions are skipped lazily and
+    dropped when the heap grows past twice the number of open sessions.
+    add() and flush() return summaries of the sessions they close.
+    """
+    
+    def __init__(self, gap_seconds: float = 1800.0, tolerance_seconds: float = 300.0, max_keys: int = 250000):
+        self.gap_seconds = gap_seconds
+        self.tolerance_seconds = tolerance_seconds
+        self.max_keys = max_keys
+        self._sessions: Dict[Tuple[str, str], Session] = {}
+        self._by_end: List[Tuple[float, Tuple[str, str]]] = []
+        self._max_event_time: Optional[float] = None
+        self.stats = {'events': 0, 'late': 0, 'unparseable': 0, 'closed': 0, 'evicted': 0}
+    
+    @property
+    def watermark(self) -> Optional[float]:
+        """Event time before which no more events are expected."""
+        if self._max_event_time is None:
+            return None
+        return self._max_event_time - self.tolerance_seconds
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def add(self, event_details: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Add one event (in _extract_event_details form) and return summaries of sessions it closed."""
+        source_ip = event_details.get('source_ip')
+        event_time = _epoch(event_details.get('event_time'))
+        if not source_ip or event_time is None:
+            self.stats['unparseable'] += 1
+            return []
+        
+        closed: List[Dict[str, Any]] = []
+        key = (source_ip, principal_of(event_details))
+        session = self._sessions.get(key)
+        
+        if session is not None and event_time > session.end + self.gap_seconds:
+            # Same attacker back after a gap: the old session is over
+            closed.append(self._close(key, 'gap'))
+            session = None
+        if session is None:
+            watermark = self.watermark
+            if watermark is not None and event_time < watermark:
+                self.stats['late'] += 1
+                return closed + self.expire()
+            session = self._sessions[key] = Session(key[0], key[1], event_time)
+            self._index(key, session)
+        
+        end = session.end
+        session.add(event_time, event_details.get('event_name') or '', bool(event_details.get('error_code')))
+        if session.end != end:
+            self._index(key, session)
+        self.stats['events'] += 1
+        if self._max_event_time is None or event_time > self._max_event_time:
+            self._max_event_time = event_time
+        
+        while len(self._sessions) > self.max_keys:
+            oldest, _ = self._earliest()
+            closed.append(self._close(oldest, 'evicted'))
+            self.stats['evicted'] += 1
+        return closed + self.expire()
+    
+    def expire(self) -> List[Dict[str, Any]]:
+        """Close sessions whose inactivity gap has passed the watermark."""
+        watermark = self.watermark
+        if watermark is None:
+            return []
+        closed = []
+        while self._sessions:
+            key, session = self._earliest()
+            if session.end + self.gap_seconds >= watermark:
+                break
+            closed.append(self._close(key, 'gap'))
+        return closed
+    
+    def flush(self) -> List[Dict[str, Any]]:
+        """Close every open session, e.g. at the end of a replay."""
+        closed = [self._close(key, 'flush') for key in list(self._sessions)]
+        self._by_end.clear()
+        return closed
+    
+    def _index(self, key: Tuple[str, str], session: Session) -> None:
+        heapq.heappush(self._by_end, (session.end, key))
+        if len(self._by_end) > 2 * len(self._sessions) + 64:
+            self._by_end = [(open_session.end, open_key) for open_key, open_session in self._sessions.items()]
+            heapq.heapify(self._by_end)
+    
+    def _earliest(self) -> Tuple[Tuple[str, str], Session]:
+        """The open session with the earliest end time; only called while sessions are open."""
+        while True:
+            end, key = self._by_end[0]
+            session = self._sessions.get(key)
+            if session is not None and session.end == end:
+                return key, session
+            heapq.heappop(self._by_end)
+    
+    def _close(self, key: Tuple[str, str], reason: str) -> Dict[str, Any]:
+        self.stats['closed'] += 1
+        return self._sessions.pop(key).summary(reason)
@@ -0,0 +1,284 @@
+"""
+SecureShield AI - Profile Sketches
+Fixed-size mergeable sketches (HyperLogLog, count-min, hour-of-week histogram) stored as binary or counter attributes.
+"""
+
+import base64
+import hashlib
+import math
+import struct
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+# Sketch kinds, the first byte of every serialized sketch
+_HYPERLOGLOG = 1
+_COUNT_MIN = 2
+_HOUR_OF_WEEK = 3
+
+HOURS_PER_WEEK = 7 * 24
+_UINT32_MAX = int(np.iinfo(np.uint32).max)
+
+def _hash64(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def hour_of_week(event_time: str) -> int:
+    """UTC hour of the week of an ISO 8601 timestamp, 0 for Monday 00:00."""
+    dt = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.weekday() * 24 + dt.hour
+
+def _binary_value(value: Any) -> bytes:
+    """Raw bytes from bytes, a boto3 Binary or the base64 text normalized profiles carry."""
+    if isinstance(value, str):
+        return base64.b64decode(value)
+    return bytes(getattr(value, 'value', value))
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**precision one-byte registers; merging takes the register-wise maximum."""
+    
+    def __init__(self, precision: int = 10, registers: Optional[np.ndarray] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError(f'HyperLogLog precision must be between 4 and 16, got {precision}')
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+    
+    def add(self, key: str) -> None:
+        hashed = _hash64(key)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def update(self, keys: Iterable[str]) -> 'HyperLogLog':
+        for key in keys:
+            self.add(key)
+        return self
+    
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog sketches of different precision')
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+    
+    def estimate(self) -> int:
+        """Estimated number of distinct keys added."""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / float(np.ldexp(1.0, -self.registers.astype(np.int32)).sum())
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+    
+    def to_bytes(self) -> bytes:
+        return struct.pack('>BB', _HYPERLOGLOG, self.precision) + self.registers.tobytes()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        kind, precision = struct.unpack_from('>BB', data)
+        if kind != _HYPERLOGLOG or len(data) != 2 + (1 << precision):
+            raise ValueError('Not a serialized HyperLogLog sketch')
+        return cls(precision, np.frombuffer(data, dtype=np.uint8, offset=2).copy())
+
+class CountMinSketch:
+    """Frequency sketch of depth rows by width saturating 32-bit counters; merging adds counters."""
+    
+    def __init__(self, width: int = 256, depth: int = 4, counters: Optional[np.ndarray] = None):
+        self.width = width
+        self.depth = depth
+        self.counters = counters if counters is not None else np.zeros((depth, width), dtype=np.uint32)
+    
+    def _columns(self, key: str) -> np.ndarray:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return np.array([(first + row * second) % self.width for row in range(self.depth)])
+    
+    def add(self, key: str, count: int = 1) -> None:
+        rows = np.arange(self.depth)
+        columns = self._columns(key)
+        self.counters[rows, columns] = np.minimum(
+            self.counters[rows, columns].astype(np.uint64) + count, _UINT32_MAX
+        )
+    
+    def estimate(self, key: str) -> int:
+        """Upper-bound estimate of how many times key was added."""
+        return int(self.counters[np.arange(self.depth), self._columns(key)].min())
+    
+    def merge(self, other: 'CountMinSketch') -> 'CountMinSketch':
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError('Cannot merge count-min sketches of different dimensions')
+        total = self.counters.astype(np.uint64) + other.counters
+        self.counters = np.minimum(total, _UINT32_MAX).astype(np.uint32)
+        return self
+    
+    def to_bytes(self) -> bytes:
+        return struct.pack('>BBH', _COUNT_MIN, self.depth, self.width) + self.counters.astype('>u4').tobytes()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CountMinSketch':
+        kind, depth, width = struct.unpack_from('>BBH', data)
+        if kind != _COUNT_MIN or len(data) != 4 + 4 * depth * width:
+            raise ValueError('Not a serialized count-min sketch')
+        counters = np.frombuffer(data, dtype='>u4', offset=4).astype(np.uint32).reshape(depth, width)
+        return cls(width, depth, counters)
+
+class HourOfWeekHistogram:
+    """Event counts per UTC hour of the week (Monday 00:00 is bucket 0)."""
+    
+    def __init__(self, counts: Optional[np.ndarray] = None):
+        self.counts = counts if counts is not None else np.zeros(HOURS_PER_WEEK, dtype=np.uint32)
+    
+    def add(self, bucket: int, count: int = 1) -> None:
+        self.counts[bucket] = min(int(self.counts[bucket]) + count, _UINT32_MAX)
+    
+    def merge(self, other: 'HourOfWeekHistogram') -> 'HourOfWeekHistogram':
+        total = self.counts.astype(np.uint64) + other.counts
+        self.counts = np.minimum(total, _UINT32_MAX).astype(np.uint32)
+        return self
+    
+    def to_bytes(self) -> bytes:
+        return struct.pack('>B', _HOUR_OF_WEEK) + self.counts.astype('>u4').tobytes()
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HourOfWeekHistogram':
+        if data[:1] != bytes([_HOUR_OF_WEEK]) or len(data) != 1 + 4 * HOURS_PER_WEEK:
+            raise ValueError('Not a serialized hour-of-week histogram')
+        return cls(np.frombuffer(data, dtype='>u4', offset=1).astype(np.uint32))
+
+# Profile attribute -> sketch type
+SKETCH_ATTRIBUTES = {
+    'api_distinct_sketch': HyperLogLog,
+    'resource_distinct_sketch': HyperLogLog,
+    'api_frequency_sketch': CountMinSketch,
+    'hour_of_week_sketch': HourOfWeekHistogram
+}
+# Sketches merged by register-wise maximum, which DynamoDB cannot do itself
+DISTINCT_SKETCH_ATTRIBUTES = ('api_distinct_sketch', 'resource_distinct_sketch')
+# Count-min cells (prefix + "<row>_<column>") and hour-of-week buckets (prefix + "<bucket>") kept as
+# top-level numbers in DynamoDB profiles, since UpdateItem can ADD to those but not inside a binary
+API_FREQUENCY_COUNTER_PREFIX = 'cm_'
+HOUR_OF_WEEK_COUNTER_PREFIX = 'hw_'
+
+def is_counter_attribute(name: str) -> bool:
+    """True if a profile attribute is one count-min cell or hour-of-week bucket."""
+    return name.startswith((API_FREQUENCY_COUNTER_PREFIX, HOUR_OF_WEEK_COUNTER_PREFIX))
+
+def counter_attributes(api_calls: Optional[Mapping[str, int]] = None,
+                       active_hours: Optional[Mapping[int, int]] = None) -> Dict[str, int]:
+    """Amounts to ADD to counter attributes for call counts per API name and event counts per hour of the week."""
+    counters: Dict[str, int] = {}
+    if api_calls:
+        frequency = CountMinSketch()
+        for event_name, count in api_calls.items():
+            for row, column in enumerate(frequency._columns(event_name)):
+                name = f'{API_FREQUENCY_COUNTER_PREFIX}{row}_{column}'
+                counters[name] = counters.get(name, 0) + count
+    for bucket, count in (active_hours or {}).items():
+        name = f'{HOUR_OF_WEEK_COUNTER_PREFIX}{bucket}'
+        counters[name] = counters.get(name, 0) + count
+    return counters
+
+def _counter_sketches(item: Mapping[str, Any]) -> Dict[str, Any]:
+    """Count-min and hour-of-week sketches rebuilt from a profile's counter attributes."""
+    frequency = hours = None
+    for name, value in item.items():
+        if name.startswith(API_FREQUENCY_COUNTER_PREFIX):
+            row, column = name[len(API_FREQUENCY_COUNTER_PREFIX):].split('_')
+            frequency = frequency or CountMinSketch()
+            frequency.counters[int(row), int(column)] = min(int(value), _UINT32_MAX)
+        elif name.startswith(HOUR_OF_WEEK_COUNTER_PREFIX):
+            hours = hours or HourOfWeekHistogram()
+            hours.counts[int(name[len(HOUR_OF_WEEK_COUNTER_PREFIX):])] = min(int(value), _UINT32_MAX)
+    sketches = {}
+    if frequency is not None:
+        sketches['api_frequency_sketch'] = frequency
+    if hours is not None:
+        sketches['hour_of_week_sketch'] = hours
+    return sketches
+
+class ProfileSketches:
+    """
+    The sketches stored with one attacker profile.
+    
+    Sketches are created on first use, so a profile without API names,
+    resources or timestamps carries none. Every sketch has a fixed size
+    however many events it summarizes (about 6.8 KB for all four), which
+    keeps long-lived attackers' profiles far below the item size limit.
+    """
+    
+    def __init__(self, sketches: Optional[Dict[str, Any]] = None):
+        self.sketches: Dict[str, Any] = dict(sketches or {})
+    
+    def __bool__(self) -> bool:
+        return bool(self.sketches)
+    
+    def _sketch(self, attribute: str) -> Any:
+        sketch = self.sketches.get(attribute)
+        if sketch is None:
+            sketch = self.sketches[attribute] = SKETCH_ATTRIBUTES[attribute]()
+        return sketch
+    
+    def observe(self, api_calls: Optional[Mapping[str, int]] = None, resources: Iterable[str] = (),
+                active_hours: Optional[Mapping[int, int]] = None) -> 'ProfileSketches':
+        """Add call counts per API name, resource names and event counts per hour of the week."""
+        for event_name, count in (api_calls or {}).items():
+            self._sketch('api_distinct_sketch').add(event_name)
+            self._sketch('api_frequency_sketch').add(event_name, count)
+        for resource in resources:
+            self._sketch('resource_distinct_sketch').add(resource)
+        for bucket, count in (active_hours or {}).items():
+            self._sketch('hour_of_week_sketch').add(bucket, count)
+        return self
+    
+    def distinct(self) -> 'ProfileSketches':
+        """Only the HyperLogLog sketches."""
+        return ProfileSketches({
+            attribute: sketch for attribute, sketch in self.sketches.items() if attribute in DISTINCT_SKETCH_ATTRIBUTES
+        })
+    
+    def merge(self, other: 'ProfileSketches') -> 'ProfileSketches':
+        for attribute, sketch in other.sketches.items():
+            mine = self.sketches.get(attribute)
+            if mine is None:
+                self.sketches[attribute] = type(sketch).from_bytes(sketch.to_bytes())
+            else:
+                mine.merge(sketch)
+        return self
+    
+    def attribute_values(self) -> Dict[str, bytes]:
+        """Serialized sketches keyed by profile attribute."""
+        return {attribute: sketch.to_bytes() for attribute, sketch in self.sketches.items()}
+    
+    def summary(self) -> Dict[str, Any]:
+        """Readable estimates derived from the sketches."""
+        summary: Dict[str, Any] = {}
+        if 'api_distinct_sketch' in self.sketches:
+            summary['distinct_apis'] = self.sketches['api_distinct_sketch'].estimate()
+        if 'resource_distinct_sketch' in self.sketches:
+            summary['distinct_resources'] = self.sketches['resource_distinct_sketch'].estimate()
+        return summary
+    
+    def api_frequency(self, event_name: str) -> int:
+        """Estimated number of calls to an API."""
+        sketch = self.sketches.get('api_frequency_sketch')
+        return sketch.estimate(event_name) if sketch is not None else 0
+    
+    def hour_of_week(self) -> List[int]:
+        """Event counts for the 168 UTC hours of the week."""
+        sketch = self.sketches.get('hour_of_week_sketch')
+        return sketch.counts.tolist() if sketch is not None else [0] * HOURS_PER_WEEK
+    
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'ProfileSketches':
+        """Sketches stored in a profile as binary attributes, normalized base64 text or counter attributes."""
+        sketches = cls({
+            attribute: sketch_type.from_bytes(_binary_value(item[attribute]))
+            for attribute, sketch_type in SKETCH_ATTRIBUTES.items() if item.get(attribute)
+        })
+        return sketches.merge(cls(_counter_sketches(item)))
@@ -3,7 +3,7 @@ SecureShield AI - Threat Detection Module
 AI-powered threat detection engine for analyzing CloudTrail events.
 """
 
-from .lambda_function import ThreatDetector, lambda_handler
+from .lambda_function import ThreatDetector, batch_handler, lambda_handler
 
-__all__ = ['ThreatDetector', 'lambda_handler']
+__all__ = ['ThreatDetector', 'batch_handler', 'lambda_handler']
 __version__ = '1.0.0' 
\ No newline at end of file
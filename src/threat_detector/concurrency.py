@@ -0,0 +1,121 @@
+"""
+SecureShield AI - Adaptive Concurrency
+AIMD concurrency limiter and thread-pool fan-out for Bedrock calls.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, TypeVar
+
+from botocore.exceptions import ClientError
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+THROTTLING_ERROR_CODES = frozenset({
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException'
+})
+
+def is_throttling_error(error: Exception) -> bool:
+    """Check whether an exception is a service throttling response."""
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits in-flight calls with additive-increase/multiplicative-decrease.
+    
+    Each success grows the limit by 1/limit (about +1 per round of calls); a
+    throttle multiplies it by backoff_factor, at most once per cooldown so a
+    burst of throttles from the same round only backs off once.
+    """
+    
+    def __init__(self, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 backoff_factor: float = 0.5, cooldown_seconds: float = 1.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_factor = backoff_factor
+        self.cooldown_seconds = cooldown_seconds
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._last_backoff = 0.0
+        self._condition = threading.Condition()
+        self._counters = {
+            'in_flight': 0,
+            'queued': 0,
+            'successes': 0,
+            'throttles': 0,
+            'failures': 0
+        }
+    
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+    
+    def acquire(self) -> None:
+        """Block until a call slot is available."""
+        with self._condition:
+            self._counters['queued'] += 1
+            while self._counters['in_flight'] >= int(self._limit):
+                self._condition.wait()
+            self._counters['queued'] -= 1
+            self._counters['in_flight'] += 1
+    
+    def release(self, outcome: str) -> None:
+        """Release a slot and adapt the limit to the call outcome ('success', 'throttled' or 'failure')."""
+        with self._condition:
+            self._counters['in_flight'] -= 1
+            if outcome == 'success':
+                self._counters['successes'] += 1
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            elif outcome == 'throttled':
+                self._counters['throttles'] += 1
+                now = time.monotonic()
+                if now - self._last_backoff >= self.cooldown_seconds:
+                    self._limit = max(self.min_limit, self._limit * self.backoff_factor)
+                    self._last_backoff = now
+            else:
+                self._counters['failures'] += 1
+            self._condition.notify_all()
+    
+    def call(self, fn: Callable[..., R], *args: Any, max_attempts: int = 4, base_delay: float = 0.2, **kwargs: Any) -> R:
+        """Call fn within the limit, retrying throttled attempts with jittered backoff."""
+        attempt = 1
+        while True:
+            self.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                self.release('throttled' if throttled else 'failure')
+                if not throttled or attempt >= max_attempts:
+                    raise
+            else:
+                self.release('success')
+                return result
+            
+            delay = base_delay * (2 ** (attempt - 1))
+            time.sleep(random.uniform(delay / 2, delay))
+            attempt += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of the limiter counters."""
+        with self._condition:
+            return dict(self._counters, limit=self.limit)
+
+def fan_out(fn: Callable[[T], R], items: Iterable[T], limiter: AdaptiveConcurrencyLimiter) -> List[R]:
+    """
+    Apply fn to every item on a thread pool sized for the limiter's ceiling.
+    
+    The limiter, not the pool, decides how many calls are actually in flight,
+    so workers beyond the current limit wait in the limiter's queue.
+    """
+    items = list(items)
+    if not items:
+        return []
+    if len(items) == 1:
+        return [fn(items[0])]
+    with ThreadPoolExecutor(max_workers=min(limiter.max_limit, len(items))) as executor:
+        return list(executor.map(fn, items))
@@ -0,0 +1,182 @@
+"""
+SecureShield AI - Event Deduplication
+Drops EventBridge redeliveries by CloudTrail event ID before any expensive work is done.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from botocore.exceptions import ClientError
+import structlog
+
+logger = structlog.get_logger()
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing of one BLAKE2b digest."""
+    
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.num_bits for i in range(self.num_hashes))
+    
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class RotatingBloomFilter:
+    """
+    Two-generation Bloom filter that forgets old keys.
+    
+    Keys go into the current generation and are checked against both. When the
+    current generation is full or older than rotation_seconds it becomes the
+    previous one and the old previous generation is dropped, so memory and the
+    false-positive rate stay bounded in long-lived containers while every key
+    is remembered for at least one rotation period.
+    """
+    
+    def __init__(self, capacity: int = 100000, error_rate: float = 1e-6, rotation_seconds: float = 3600.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotation_seconds = rotation_seconds
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous: Optional[BloomFilter] = None
+        self._rotated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def add(self, key: str) -> None:
+        with self._lock:
+            if self._current.count >= self.capacity or time.monotonic() - self._rotated_at >= self.rotation_seconds:
+                self._previous, self._current = self._current, BloomFilter(self.capacity, self.error_rate)
+                self._rotated_at = time.monotonic()
+            self._current.add(key)
+    
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._current or (self._previous is not None and key in self._previous)
+
+class EventDeduplicator:
+    """
+    Idempotency guard keyed on CloudTrail event IDs.
+    
+    claim() takes a short in-progress lease in the optional DynamoDB table
+    with a conditional PutItem, which fails while another invocation holds an
+    unexpired lease or the event is completed. The lease lasts the caller's
+    remaining time plus lease_margin_seconds, so an invocation that times out
+    or dies without calling release() only blocks retries until it would
+    have ended. complete() marks the item completed with the long
+    ttl_seconds and adds the event to the in-memory filter; a filter hit is
+    then confirmed with a GetItem instead of another claim write, since a
+    Bloom false positive must not drop an event nobody has processed.
+    Without a table the filter is the only guard. DynamoDB errors fail open:
+    reprocessing a duplicate is preferable to dropping an event.
+    """
+    
+    def __init__(self, table: Any = None, ttl_seconds: int = 86400, lease_margin_seconds: float = 30.0,
+                 max_lease_seconds: float = 900.0, bloom_capacity: int = 100000, bloom_error_rate: float = 1e-6,
+                 bloom_rotation_seconds: float = 3600.0):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.lease_margin_seconds = lease_margin_seconds
+        self.max_lease_seconds = max_lease_seconds
+        self.seen = RotatingBloomFilter(bloom_capacity, bloom_error_rate, bloom_rotation_seconds)
+        self.stats = {'claimed': 0, 'local_duplicates': 0, 'shared_duplicates': 0, 'claim_errors': 0,
+                      'bloom_false_positives': 0, 'completion_errors': 0}
+    
+    def lease_seconds(self, context: Any = None) -> int:
+        """How long an in-progress claim lasts: the invocation's remaining time (or the Lambda maximum) plus the margin."""
+        get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+        remaining_ms = get_remaining() if get_remaining is not None else None
+        remaining = remaining_ms / 1000 if isinstance(remaining_ms, (int, float)) else self.max_lease_seconds
+        return int(math.ceil(min(remaining, self.max_lease_seconds) + self.lease_margin_seconds))
+    
+    def claim(self, event_id: Optional[str], context: Any = None) -> bool:
+        """Return True if the caller should process the event, False if it is a duplicate."""
+        if not event_id:
+            return True
+        seen_locally = event_id in self.seen
+        if seen_locally:
+            if self.table is None or self._completed_elsewhere(event_id):
+                self.stats['local_duplicates'] += 1
+                return False
+        if self.table is not None:
+            now = int(time.time())
+            try:
+                self.table.put_item(
+                    Item={'event_id': event_id, 'status': 'in_progress', 'claimed_at': now,
+                          'ttl': now + self.lease_seconds(context)},
+                    # DynamoDB TTL deletion is lazy, so expired leases can be taken over
+                    ConditionExpression='attribute_not_exists(event_id) OR #ttl < :now',
+                    ExpressionAttributeNames={'#ttl': 'ttl'},
+                    ExpressionAttributeValues={':now': now}
+                )
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                    self.stats['shared_duplicates'] += 1
+                    return False
+                self.stats['claim_errors'] += 1
+                logger.warning("event_claim_failed", event_id=event_id, error=str(e))
+            except Exception as e:
+                self.stats['claim_errors'] += 1
+                logger.warning("event_claim_failed", event_id=event_id, error=str(e))
+        if seen_locally:
+            self.stats['bloom_false_positives'] += 1
+        self.stats['claimed'] += 1
+        return True
+    
+    def _completed_elsewhere(self, event_id: str) -> bool:
+        """Confirm a filter hit: True if the table holds a completed, unexpired claim for the event."""
+        try:
+            item = self.table.get_item(Key={'event_id': event_id}, ConsistentRead=True).get('Item')
+        except Exception as e:
+            self.stats['claim_errors'] += 1
+            logger.warning("event_claim_lookup_failed", event_id=event_id, error=str(e))
+            return False
+        return bool(item) and item.get('status') == 'completed' and int(item.get('ttl', 0)) >= int(time.time())
+    
+    def complete(self, event_id: Optional[str]) -> None:
+        """Mark a processed event completed so redeliveries are skipped for ttl_seconds."""
+        if not event_id:
+            return
+        self.seen.add(event_id)
+        if self.table is None:
+            return
+        try:
+            self.table.update_item(
+                Key={'event_id': event_id},
+                UpdateExpression='SET #status = :completed, #ttl = :ttl',
+                ExpressionAttributeNames={'#status': 'status', '#ttl': 'ttl'},
+                ExpressionAttributeValues={':completed': 'completed', ':ttl': int(time.time()) + self.ttl_seconds}
+            )
+        except Exception as e:
+            # The lease still expires, after which a redelivery is processed again
+            self.stats['completion_errors'] += 1
+            logger.warning("event_claim_completion_failed", event_id=event_id, error=str(e))
+    
+    def release(self, event_id: Optional[str]) -> None:
+        """Give up a claim after a failure so a redelivery is processed again."""
+        if not event_id or self.table is None:
+            return
+        try:
+            self.table.delete_item(Key={'event_id': event_id})
+        except Exception as e:
+            logger.warning("event_claim_release_failed", event_id=event_id, error=str(e))
+
+def event_id_of(event: Dict[str, Any]) -> Optional[str]:
+    """The CloudTrail event ID of an EventBridge event."""
+    return (event.get('detail') or {}).get('eventID')
@@ -0,0 +1,227 @@
+"""
+SecureShield AI - IP Reputation Index
+Longest-prefix-match lookups over IPv4/IPv6 reputation and allowlist CIDRs, served from a memory-mapped blob.
+
+The prefix trie is flattened at build time into sorted, non-overlapping address
+ranges where each range carries the entry of its most specific covering prefix.
+Lookups are a binary search over the mapped arrays, so opening an index with
+millions of CIDRs costs one mmap call and no parsing.
+"""
+
+import argparse
+import bisect
+import ipaddress
+import json
+import mmap
+import struct
+import sys
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+MAGIC = b'SSIPIDX1'
+FORMAT_VERSION = 1
+
+# magic, version, IPv4 range count, IPv6 range count, entry table length
+_HEADER = struct.Struct('<8sIIII')
+
+KIND_DENY = 'deny'
+KIND_ALLOW = 'allow'
+DEFAULT_DENY_SCORE = 5
+
+class _UInt128Array:
+    """Sequence view over little-endian 128-bit integers stored as (high, low) uint64 pairs."""
+    
+    def __init__(self, words: memoryview):
+        self._words = words
+    
+    def __len__(self) -> int:
+        return len(self._words) // 2
+    
+    def __getitem__(self, index: int) -> int:
+        return (self._words[2 * index] << 64) | self._words[2 * index + 1]
+
+def _flatten(prefixes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    Turn nested prefixes into disjoint (start, end, entry) ranges.
+    
+    Prefixes are (start, end, prefix_len, entry) tuples. CIDR blocks are either
+    disjoint or nested, so a stack sweep over prefixes sorted by start address
+    (widest first) yields the most specific entry for every address.
+    """
+    ranges: List[Tuple[int, int, int]] = []
+    
+    def emit(start: int, end: int, entry: int) -> None:
+        if start > end:
+            return
+        if ranges and ranges[-1][1] + 1 == start and ranges[-1][2] == entry:
+            ranges[-1] = (ranges[-1][0], end, entry)
+        else:
+            ranges.append((start, end, entry))
+    
+    stack: List[Tuple[int, int]] = []
+    position = 0
+    for start, end, _, entry in sorted(prefixes, key=lambda p: (p[0], p[2])):
+        while stack and stack[-1][0] < start:
+            top_end, top_entry = stack.pop()
+            emit(position, top_end, top_entry)
+            position = top_end + 1
+        if stack:
+            emit(position, start - 1, stack[-1][1])
+        position = start
+        stack.append((end, entry))
+    
+    while stack:
+        top_end, top_entry = stack.pop()
+        emit(position, top_end, top_entry)
+        position = top_end + 1
+    
+    return ranges
+
+def parse_cidr_file(path: str, kind: str) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """
+    Parse a reputation or allowlist file.
+    
+    Each non-comment line is "CIDR[,score[,label]]"; bare addresses are treated
+    as host routes.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            fields = [field.strip() for field in line.split(',')]
+            score = int(fields[1]) if len(fields) > 1 and fields[1] else (DEFAULT_DENY_SCORE if kind == KIND_DENY else 0)
+            label = fields[2] if len(fields) > 2 and fields[2] else kind
+            yield fields[0], {'kind': kind, 'score': score, 'label': label}
+
+def build_index(entries: Iterable[Tuple[str, Dict[str, Any]]]) -> bytes:
+    """
+    Build a serialized index from (cidr, entry) pairs.
+    
+    When the same CIDR appears more than once, allowlist entries win over
+    reputation entries, and later entries win over earlier ones of the same kind.
+    """
+    entry_table: List[Dict[str, Any]] = []
+    entry_ids: Dict[Tuple, int] = {}
+    prefixes: Dict[int, Dict[Tuple[int, int], Tuple[int, int, int, int]]] = {4: {}, 6: {}}
+    
+    for cidr, entry in entries:
+        network = ipaddress.ip_network(cidr, strict=False)
+        entry_key = (entry['kind'], int(entry.get('score', 0)), entry.get('label', entry['kind']))
+        if entry_key not in entry_ids:
+            entry_ids[entry_key] = len(entry_table)
+            entry_table.append({'kind': entry_key[0], 'score': entry_key[1], 'label': entry_key[2]})
+        entry_id = entry_ids[entry_key]
+        
+        prefix_key = (int(network.network_address), network.prefixlen)
+        existing = prefixes[network.version].get(prefix_key)
+        if existing and entry_table[existing[3]]['kind'] == KIND_ALLOW and entry_key[0] != KIND_ALLOW:
+            continue
+        prefixes[network.version][prefix_key] = (
+            int(network.network_address), int(network.broadcast_address), network.prefixlen, entry_id
+        )
+    
+    ranges_v4 = _flatten(list(prefixes[4].values()))
+    ranges_v6 = _flatten(list(prefixes[6].values()))
+    entry_blob = json.dumps(entry_table, separators=(',', ':')).encode('utf-8')
+    
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(ranges_v4), len(ranges_v6), len(entry_blob))]
+    parts.append(struct.pack(f'<{len(ranges_v4)}I', *(r[0] for r in ranges_v4)))
+    parts.append(struct.pack(f'<{len(ranges_v4)}I', *(r[1] for r in ranges_v4)))
+    parts.append(struct.pack(f'<{len(ranges_v4)}I', *(r[2] for r in ranges_v4)))
+    for column in (0, 1):
+        words = []
+        for r in ranges_v6:
+            words.extend((r[column] >> 64, r[column] & 0xFFFFFFFFFFFFFFFF))
+        parts.append(struct.pack(f'<{len(words)}Q', *words))
+    parts.append(struct.pack(f'<{len(ranges_v6)}I', *(r[2] for r in ranges_v6)))
+    parts.append(entry_blob)
+    return b''.join(parts)
+
+class IPReputationIndex:
+    """Read-only longest-prefix-match index over a serialized blob."""
+    
+    def __init__(self, buffer: Any):
+        if sys.byteorder != 'little':
+            raise RuntimeError('IP reputation index requires a little-endian host')
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, count_v4, count_v6, entry_length = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('Not an IP reputation index or unsupported version')
+        
+        offset = _HEADER.size
+        self._starts_v4 = view[offset:offset + 4 * count_v4].cast('I')
+        offset += 4 * count_v4
+        self._ends_v4 = view[offset:offset + 4 * count_v4].cast('I')
+        offset += 4 * count_v4
+        self._entries_v4 = view[offset:offset + 4 * count_v4].cast('I')
+        offset += 4 * count_v4
+        self._starts_v6 = _UInt128Array(view[offset:offset + 16 * count_v6].cast('Q'))
+        offset += 16 * count_v6
+        self._ends_v6 = _UInt128Array(view[offset:offset + 16 * count_v6].cast('Q'))
+        offset += 16 * count_v6
+        self._entries_v6 = view[offset:offset + 4 * count_v6].cast('I')
+        offset += 4 * count_v6
+        self._entry_table: List[Dict[str, Any]] = json.loads(bytes(view[offset:offset + entry_length]))
+        self.range_count = count_v4 + count_v6
+    
+    @classmethod
+    def open(cls, path: str) -> 'IPReputationIndex':
+        """Memory-map an index file."""
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    
+    def lookup(self, address: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the entry of the most specific prefix covering address, if any."""
+        if not address:
+            return None
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            # CloudTrail uses service names (e.g. ec2.amazonaws.com) for AWS-originated calls
+            return None
+        
+        if ip.version == 4:
+            starts, ends, entries = self._starts_v4, self._ends_v4, self._entries_v4
+        else:
+            starts, ends, entries = self._starts_v6, self._ends_v6, self._entries_v6
+        
+        value = int(ip)
+        index = bisect.bisect_right(starts, value) - 1
+        if index < 0 or value > ends[index]:
+            return None
+        return self._entry_table[entries[index]]
+
+@lru_cache(maxsize=4)
+def load_ip_reputation_index(path: str) -> IPReputationIndex:
+    """Open an index once per container."""
+    index = IPReputationIndex.open(path)
+    logger.info("ip_reputation_index_loaded", path=path, ranges=index.range_count)
+    return index
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Build an index file from reputation and allowlist CIDR files."""
+    parser = argparse.ArgumentParser(description='Build a SecureShield IP reputation index')
+    parser.add_argument('--reputation', action='append', default=[], help='CIDR file of known-bad sources')
+    parser.add_argument('--allowlist', action='append', default=[], help='CIDR file of trusted sources')
+    parser.add_argument('--output', required=True, help='Path of the index file to write')
+    args = parser.parse_args(argv)
+    
+    def entries():
+        for path in args.reputation:
+            yield from parse_cidr_file(path, KIND_DENY)
+        for path in args.allowlist:
+            yield from parse_cidr_file(path, KIND_ALLOW)
+    
+    blob = build_index(entries())
+    with open(args.output, 'wb') as f:
+        f.write(blob)
+    print(f'Wrote {len(blob)} bytes to {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -7,13 +7,29 @@ import json
 import logging
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
 
-import boto3
-from botocore.exceptions import ClientError
 import structlog
 
+from ..common import aws, claim_check, storage
+from ..common.batch_writer import BatchWriteError
+from ..common.codec import THREAT_INTEL_ENCODED_ATTRIBUTES, encode_item
+from ..common.events import EVENT_SLIM_PAYLOADS, EventPublisher, slim_event
+from ..common.metrics import MetricsSink
+from ..common.records import decode_record, record_identifier
+from .concurrency import AdaptiveConcurrencyLimiter, fan_out
+from .dedup import EventDeduplicator, event_id_of
+from .ip_reputation import KIND_ALLOW, IPReputationIndex, load_ip_reputation_index
+from .prompt_batching import pack_batches, parse_batch_response
+from .signatures import SignaturePack, load_signature_pack
+from .triage import PATH_AI, TriageGate
+from .verdict_cache import VerdictCache, fingerprint
+from .windowed_counters import BurstTracker
+
 # Configure structured logging
 structlog.configure(
     processors=[
@@ -35,16 +51,51 @@ structlog.configure(
 
 logger = structlog.get_logger()
 
-# Initialize AWS clients
-bedrock = boto3.client('bedrock-runtime', region_name=os.getenv('AWS_REGION', 'us-east-1'))
-dynamodb = boto3.resource('dynamodb')
-eventbridge = boto3.client('events')
-cloudwatch = boto3.client('cloudwatch')
+# AWS clients, created on first use and reused across warm invocations
+bedrock = aws.lazy_client('bedrock-runtime', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+eventbridge = aws.lazy_client('events')
+cloudwatch = aws.lazy_client('cloudwatch')
+
+metrics = MetricsSink('SecureShield/ThreatDetection', cloudwatch_client=cloudwatch)
+
+# Incident response events are buffered and sent in batched PutEvents calls
+incident_events = EventPublisher(eventbridge, 'secure-shield.threat-detector')
 
 # Configuration
 BEDROCK_MODEL_ID = os.getenv('BEDROCK_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
 THREAT_INTEL_TABLE = os.getenv('THREAT_INTEL_TABLE', 'secure-shield-threat-intel')
 ALERT_TOPIC_ARN = os.getenv('ALERT_TOPIC_ARN')
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+BEDROCK_INITIAL_CONCURRENCY = int(os.getenv('BEDROCK_INITIAL_CONCURRENCY', '4'))
+BEDROCK_MAX_CONCURRENCY = int(os.getenv('BEDROCK_MAX_CONCURRENCY', '32'))
+VERDICT_CACHE_ENABLED = os.getenv('VERDICT_CACHE_ENABLED', 'true').lower() == 'true'
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv('VERDICT_CACHE_MAX_ENTRIES', '10000'))
+VERDICT_CACHE_TTL_SECONDS = int(os.getenv('VERDICT_CACHE_TTL_SECONDS', '900'))
+VERDICT_CACHE_TABLE = os.getenv('VERDICT_CACHE_TABLE')
+AI_BATCH_MAX_EVENTS = int(os.getenv('AI_BATCH_MAX_EVENTS', '10'))
+AI_BATCH_MAX_PROMPT_TOKENS = int(os.getenv('AI_BATCH_MAX_PROMPT_TOKENS', '4000'))
+AI_BATCH_OUTPUT_TOKENS_PER_EVENT = int(os.getenv('AI_BATCH_OUTPUT_TOKENS_PER_EVENT', '300'))
+SIGNATURE_PACK_PATH = os.getenv('SIGNATURE_PACK_PATH')
+IP_REPUTATION_INDEX_PATH = os.getenv('IP_REPUTATION_INDEX_PATH')
+BURST_TRACKING_ENABLED = os.getenv('BURST_TRACKING_ENABLED', 'true').lower() == 'true'
+BURST_ERROR_THRESHOLD = int(os.getenv('BURST_ERROR_THRESHOLD', '20'))
+BURST_DISTINCT_API_THRESHOLD = int(os.getenv('BURST_DISTINCT_API_THRESHOLD', '15'))
+BURST_REQUEST_THRESHOLD = int(os.getenv('BURST_REQUEST_THRESHOLD', '300'))
+BURST_COUNTER_TABLE = os.getenv('BURST_COUNTER_TABLE')
+BURST_EXPECTED_KEYS = int(os.getenv('BURST_EXPECTED_KEYS', '1000'))
+BURST_SKETCH_ERROR_RATE = float(os.getenv('BURST_SKETCH_ERROR_RATE', '0.01'))
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+DEDUP_TABLE = os.getenv('DEDUP_TABLE')
+DEDUP_TTL_SECONDS = int(os.getenv('DEDUP_TTL_SECONDS', '86400'))
+DEDUP_LEASE_MARGIN_SECONDS = float(os.getenv('DEDUP_LEASE_MARGIN_SECONDS', '30'))
+DEDUP_BLOOM_CAPACITY = int(os.getenv('DEDUP_BLOOM_CAPACITY', '100000'))
+DEDUP_BLOOM_ERROR_RATE = float(os.getenv('DEDUP_BLOOM_ERROR_RATE', '0.000001'))
+DEDUP_BLOOM_ROTATION_SECONDS = float(os.getenv('DEDUP_BLOOM_ROTATION_SECONDS', '3600'))
+TRIAGE_ENABLED = os.getenv('TRIAGE_ENABLED', 'true').lower() == 'true'
+TRIAGE_BENIGN_MAX_SCORE = int(os.getenv('TRIAGE_BENIGN_MAX_SCORE', '0'))
+TRIAGE_HOSTILE_MIN_SCORE = int(os.getenv('TRIAGE_HOSTILE_MIN_SCORE', '8'))
+TRIAGE_ALLOWLISTED_PRINCIPALS = [p.strip() for p in os.getenv('TRIAGE_ALLOWLISTED_PRINCIPALS', '').split(',') if p.strip()]
+TRIAGE_ALLOWLISTED_USER_AGENTS = [ua.strip() for ua in os.getenv('TRIAGE_ALLOWLISTED_USER_AGENTS', '').split(',') if ua.strip()]
 
 # Threat categories and their risk scores
 THREAT_CATEGORIES = {
@@ -59,12 +110,47 @@ THREAT_CATEGORIES = {
     'impact': 10
 }
 
+# Adaptive limit on in-flight Bedrock calls, kept across warm invocations
+model_limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=BEDROCK_INITIAL_CONCURRENCY,
+    max_limit=BEDROCK_MAX_CONCURRENCY
+)
+
+# Per-source burst counters, kept across warm invocations
+burst_tracker = BurstTracker(
+    windows=(60, 300, 3600),
+    expected_keys=BURST_EXPECTED_KEYS,
+    error_rate=BURST_SKETCH_ERROR_RATE
+) if BURST_TRACKING_ENABLED else None
+
+# Threat intelligence records are buffered and written in batches to the configured storage backend
+intel_writer = storage.get_backend().writer(THREAT_INTEL_TABLE, key_attributes=('event_id',))
+
+# Verdict cache shared by all detectors in this container
+verdict_cache = VerdictCache(
+    max_entries=VERDICT_CACHE_MAX_ENTRIES,
+    ttl_seconds=VERDICT_CACHE_TTL_SECONDS,
+    table=aws.lazy_table(VERDICT_CACHE_TABLE) if VERDICT_CACHE_TABLE else None
+) if VERDICT_CACHE_ENABLED else None
+
 class ThreatDetector:
     """AI-powered threat detection engine using AWS Bedrock."""
     
-    def __init__(self):
-        self.table = dynamodb.Table(THREAT_INTEL_TABLE)
+    def __init__(self, verdict_cache: Optional[VerdictCache] = verdict_cache, triage_gate: Optional[TriageGate] = None,
+                 burst_tracker: Optional[BurstTracker] = burst_tracker):
+        self.verdict_cache = verdict_cache
+        self.burst_tracker = burst_tracker
+        if triage_gate is None and TRIAGE_ENABLED:
+            triage_gate = TriageGate(
+                benign_max_score=TRIAGE_BENIGN_MAX_SCORE,
+                hostile_min_score=TRIAGE_HOSTILE_MIN_SCORE,
+                allowlisted_principals=TRIAGE_ALLOWLISTED_PRINCIPALS,
+                allowlisted_user_agents=TRIAGE_ALLOWLISTED_USER_AGENTS
+            )
+        self.triage_gate = triage_gate
         self.suspicious_patterns = self._load_suspicious_patterns()
+        self.signatures = self._load_signature_pack()
+        self.ip_reputation = self._load_ip_reputation_index()
     
     def _load_suspicious_patterns(self) -> Dict[str, List[str]]:
         """Load known suspicious patterns for pattern matching."""
@@ -74,45 +160,117 @@ class ThreatDetector:
                 'ListBuckets', 'GetBucketPolicy', 'DescribeDBInstances',
                 'GetUser', 'ListUsers', 'GetRole', 'ListRoles'
             ],
-            'ip_patterns': [
-                r'^10\.', r'^172\.(1[6-9]|2[0-9]|3[0-1])\.', r'^192\.168\.'
-            ],
             'user_agents': [
                 'nmap', 'sqlmap', 'nikto', 'dirb', 'gobuster', 'hydra',
                 'metasploit', 'burp', 'zap', 'w3af'
             ]
         }
     
+    def _load_signature_pack(self) -> SignaturePack:
+        """Load the signature pack from SIGNATURE_PACK_PATH, or compile the built-in patterns."""
+        if SIGNATURE_PACK_PATH:
+            try:
+                return load_signature_pack(SIGNATURE_PACK_PATH)
+            except Exception as e:
+                logger.error("signature_pack_load_failed", path=SIGNATURE_PACK_PATH, error=str(e))
+        return SignaturePack.from_dict(self.suspicious_patterns, version='builtin')
+    
+    def _load_ip_reputation_index(self) -> Optional[IPReputationIndex]:
+        """Open the IP reputation index named by IP_REPUTATION_INDEX_PATH, if any."""
+        if not IP_REPUTATION_INDEX_PATH:
+            return None
+        try:
+            return load_ip_reputation_index(IP_REPUTATION_INDEX_PATH)
+        except Exception as e:
+            logger.error("ip_reputation_index_load_failed", path=IP_REPUTATION_INDEX_PATH, error=str(e))
+            return None
+    
     def analyze_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze a CloudTrail event for potential threats."""
         try:
-            # Extract event details
-            event_details = self._extract_event_details(event)
-            
-            # Perform pattern-based analysis
-            pattern_analysis = self._pattern_analysis(event_details)
+            # Extract details, run pattern analysis and triage
+            event_details, pattern_analysis, ai_analysis, analysis_path = self._prepare_analysis(event)
             
             # Perform AI-powered analysis
-            ai_analysis = self._ai_analysis(event_details)
-            
-            # Combine analyses and determine threat level
-            threat_assessment = self._assess_threat_level(pattern_analysis, ai_analysis)
-            
-            # Log the analysis
-            logger.info(
-                "threat_analysis_complete",
-                event_id=event_details.get('event_id'),
-                threat_level=threat_assessment['threat_level'],
-                confidence=threat_assessment['confidence'],
-                categories=threat_assessment['categories']
-            )
-            
-            return threat_assessment
+            if ai_analysis is None:
+                ai_analysis = self._ai_analysis(event_details)
             
+            return self._complete_analysis(event_details, pattern_analysis, ai_analysis, analysis_path)
+        
         except Exception as e:
             logger.error("threat_analysis_failed", error=str(e), event=event)
             raise
     
+    def analyze_events(self, events: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Analyze a batch of CloudTrail events, sharing Bedrock calls between them.
+        
+        Events that still need AI analysis after triage and the verdict cache
+        are packed into micro-batched prompts. Results are returned in input
+        order; an entry is None if that event could not be analyzed.
+        """
+        prepared: Dict[int, tuple] = {}
+        pending: Dict[str, Dict[str, Any]] = {}
+        
+        for index, event in enumerate(events):
+            try:
+                event_details, pattern_analysis, ai_analysis, analysis_path = self._prepare_analysis(event)
+            except Exception as e:
+                logger.error("threat_analysis_failed", error=str(e), event=event)
+                continue
+            if ai_analysis is None and self.verdict_cache is not None:
+                ai_analysis = self.verdict_cache.get(fingerprint(event_details))
+            if ai_analysis is None:
+                pending[f'e{index}'] = event_details
+            prepared[index] = (event_details, pattern_analysis, ai_analysis, analysis_path)
+        
+        ai_results = self._ai_analysis_batch(pending)
+        
+        assessments: List[Optional[Dict[str, Any]]] = []
+        for index in range(len(events)):
+            if index not in prepared:
+                assessments.append(None)
+                continue
+            event_details, pattern_analysis, ai_analysis, analysis_path = prepared[index]
+            if ai_analysis is None:
+                ai_analysis = ai_results[f'e{index}']
+            assessments.append(self._complete_analysis(event_details, pattern_analysis, ai_analysis, analysis_path))
+        
+        return assessments
+    
+    def _prepare_analysis(self, event: Dict[str, Any]) -> tuple:
+        """Extract event details, run pattern analysis and apply the triage gate."""
+        # Extract event details
+        event_details = self._extract_event_details(event)
+        
+        # Perform pattern-based analysis
+        pattern_analysis = self._pattern_analysis(event_details)
+        
+        # Skip the model when pattern analysis is already decisive
+        ai_analysis = self.triage_gate.evaluate(event_details, pattern_analysis) if self.triage_gate else None
+        analysis_path = ai_analysis.pop('analysis_path') if ai_analysis else PATH_AI
+        
+        return event_details, pattern_analysis, ai_analysis, analysis_path
+    
+    def _complete_analysis(self, event_details: Dict[str, Any], pattern_analysis: Dict[str, Any],
+                           ai_analysis: Dict[str, Any], analysis_path: str) -> Dict[str, Any]:
+        """Combine analyses into a threat assessment and log it."""
+        # Combine analyses and determine threat level
+        threat_assessment = self._assess_threat_level(pattern_analysis, ai_analysis)
+        threat_assessment['analysis_path'] = analysis_path
+        
+        # Log the analysis
+        logger.info(
+            "threat_analysis_complete",
+            event_id=event_details.get('event_id'),
+            analysis_path=analysis_path,
+            threat_level=threat_assessment['threat_level'],
+            confidence=threat_assessment['confidence'],
+            categories=threat_assessment['categories']
+        )
+        
+        return threat_assessment
+    
     def _extract_event_details(self, event: Dict[str, Any]) -> Dict[str, Any]:
         """Extract relevant details from CloudTrail event."""
         detail = event.get('detail', {})
@@ -140,22 +298,33 @@ class ThreatDetector:
         
         # Check for suspicious API calls
         event_name = event_details.get('event_name', '')
-        if event_name in self.suspicious_patterns['api_calls']:
+        if self.signatures.is_suspicious_api(event_name):
             patterns_found.append(f'suspicious_api_call:{event_name}')
             risk_score += 2
         
         # Check for suspicious user agents
-        user_agent = event_details.get('user_agent', '').lower()
-        for suspicious_ua in self.suspicious_patterns['user_agents']:
-            if suspicious_ua in user_agent:
-                patterns_found.append(f'suspicious_user_agent:{suspicious_ua}')
-                risk_score += 5
+        for suspicious_ua in self.signatures.match_user_agent(event_details.get('user_agent')):
+            patterns_found.append(f'suspicious_user_agent:{suspicious_ua}')
+            risk_score += 5
+        
+        # Check source IP reputation
+        reputation = self.ip_reputation.lookup(event_details.get('source_ip')) if self.ip_reputation else None
+        if reputation and reputation['kind'] == KIND_ALLOW:
+            patterns_found.append('allowlisted_ip')
+        elif reputation:
+            patterns_found.append(f'ip_reputation:{reputation["label"]}')
+            risk_score += reputation['score']
         
         # Check for error patterns (potential brute force)
         if event_details.get('error_code'):
             patterns_found.append(f'api_error:{event_details["error_code"]}')
             risk_score += 1
         
+        # Check per-source bursts across recent events
+        burst_patterns, burst_score = self._burst_analysis(event_details)
+        patterns_found.extend(burst_patterns)
+        risk_score += burst_score
+        
         # Check for unusual timing patterns
         event_time = event_details.get('event_time')
         if event_time:
@@ -170,30 +339,67 @@ class ThreatDetector:
             'confidence': min(risk_score * 10, 100)
         }
     
-    def _ai_analysis(self, event_details: Dict[str, Any]) -> Dict[str, Any]:
-        """Perform AI-powered threat analysis using AWS Bedrock."""
+    def _burst_analysis(self, event_details: Dict[str, Any]) -> tuple:
+        """Score brute-force, enumeration and request-rate bursts per source IP and principal."""
+        if self.burst_tracker is None:
+            return [], 0
+        
+        keys = []
+        if event_details.get('source_ip'):
+            keys.append(f'ip:{event_details["source_ip"]}')
+        user_identity = event_details.get('user_identity') or {}
+        principal = user_identity.get('arn') or user_identity.get('principalId')
+        if principal:
+            keys.append(f'principal:{principal}')
+        if not keys:
+            return [], 0
+        
+        features = self.burst_tracker.observe(
+            keys,
+            event_details.get('event_name'),
+            bool(event_details.get('error_code')),
+            event_details.get('event_time')
+        )
+        
+        patterns_found = []
+        risk_score = 0
+        for key, windows in features.items():
+            source_type = key.split(':', 1)[0]
+            if windows['300s']['errors'] >= BURST_ERROR_THRESHOLD:
+                patterns_found.append(f'brute_force_burst:{source_type}')
+                risk_score += 4
+            if windows['300s']['distinct_apis'] >= BURST_DISTINCT_API_THRESHOLD:
+                patterns_found.append(f'reconnaissance_enumeration:{source_type}')
+                risk_score += 3
+            if windows['60s']['requests'] >= BURST_REQUEST_THRESHOLD:
+                patterns_found.append(f'request_rate_burst:{source_type}')
+                risk_score += 2
+        
+        return patterns_found, risk_score
+    
+    def _ai_analysis(self, event_details: Dict[str, Any], check_cache: bool = True) -> Dict[str, Any]:
+        """
+        Perform AI-powered threat analysis using AWS Bedrock.
+        
+        check_cache=False skips the verdict cache lookup for callers that
+        already missed it, so a miss is only counted once.
+        """
+        # Near-identical events reuse an earlier verdict instead of calling the model
+        cache_key = fingerprint(event_details) if self.verdict_cache is not None else None
+        if cache_key and check_cache:
+            cached_analysis = self.verdict_cache.get(cache_key)
+            if cached_analysis is not None:
+                return cached_analysis
+        
         try:
             # Prepare prompt for AI analysis
             prompt = self._create_ai_prompt(event_details)
             
-            # Call Bedrock
-            response = bedrock.invoke_model(
-                modelId=BEDROCK_MODEL_ID,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 1000,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                })
-            )
+            # Call Bedrock and parse response
+            ai_analysis = json.loads(self._invoke_model(prompt, max_tokens=1000))
             
-            # Parse response
-            response_body = json.loads(response['body'].read())
-            ai_analysis = json.loads(response_body['content'][0]['text'])
+            if cache_key:
+                self.verdict_cache.put(cache_key, ai_analysis)
             
             return ai_analysis
             
@@ -205,19 +411,87 @@ class ThreatDetector:
                 'reasoning': f'AI analysis failed: {str(e)}'
             }
     
+    def _ai_analysis_batch(self, pending: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Perform AI analysis for several events with micro-batched prompts.
+        
+        Events whose verdict is missing or malformed in a batch answer fall
+        back to a single-event _ai_analysis call.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        if not pending:
+            return results
+        
+        descriptions = [(event_id, self._describe_event(details)) for event_id, details in pending.items()]
+        batches = pack_batches(descriptions, AI_BATCH_MAX_EVENTS, AI_BATCH_MAX_PROMPT_TOKENS)
+        
+        def _analyze_batch(batch: List[str]) -> Dict[str, Dict[str, Any]]:
+            try:
+                prompt = self._create_batch_ai_prompt({event_id: pending[event_id] for event_id in batch})
+                text = self._invoke_model(prompt, max_tokens=AI_BATCH_OUTPUT_TOKENS_PER_EVENT * len(batch))
+                batch_results = parse_batch_response(text, batch)
+            except Exception as e:
+                logger.error("batch_ai_analysis_failed", error=str(e), batch_size=len(batch))
+                return {}
+            
+            logger.info("batch_ai_analysis_complete", batch_size=len(batch), parsed=len(batch_results))
+            
+            if self.verdict_cache is not None:
+                for event_id, ai_analysis in batch_results.items():
+                    self.verdict_cache.put(fingerprint(pending[event_id]), ai_analysis)
+            return batch_results
+        
+        # Keep many model calls in flight; model_limiter adapts how many
+        for batch_results in fan_out(_analyze_batch, [batch for batch in batches if len(batch) > 1], model_limiter):
+            results.update(batch_results)
+            
+        # Single-event fallback for singletons and anything the batch answers missed
+        fallback_ids = [event_id for event_id in pending if event_id not in results]
+        # pending events already missed the verdict cache in analyze_events
+        fallback_results = fan_out(
+            lambda event_id: self._ai_analysis(pending[event_id], check_cache=False), fallback_ids, model_limiter
+        )
+        results.update(zip(fallback_ids, fallback_results))
+        
+        return results
+    
+    def _invoke_model(self, prompt: str, max_tokens: int) -> str:
+        """Send a prompt to Bedrock and return the text of the first content block."""
+        response = model_limiter.call(
+            bedrock.invoke_model,
+            modelId=BEDROCK_MODEL_ID,
+            body=json.dumps({
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": max_tokens,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ]
+            })
+        )
+        
+        response_body = json.loads(response['body'].read())
+        return response_body['content'][0]['text']
+    
+    def _describe_event(self, event_details: Dict[str, Any]) -> str:
+        """Describe the event fields the model reasons about."""
+        return f"""- Event Name: {event_details.get('event_name')}
+- Source IP: {event_details.get('source_ip')}
+- User Agent: {event_details.get('user_agent')}
+- Event Time: {event_details.get('event_time')}
+- AWS Region: {event_details.get('aws_region')}
+- Error Code: {event_details.get('error_code')}
+- Error Message: {event_details.get('error_message')}"""
+
     def _create_ai_prompt(self, event_details: Dict[str, Any]) -> str:
         """Create a prompt for AI threat analysis."""
         return f"""
 You are a cybersecurity threat analyst. Analyze the following AWS CloudTrail event for potential security threats.
 
 Event Details:
-- Event Name: {event_details.get('event_name')}
-- Source IP: {event_details.get('source_ip')}
-- User Agent: {event_details.get('user_agent')}
-- Event Time: {event_details.get('event_time')}
-- AWS Region: {event_details.get('aws_region')}
-- Error Code: {event_details.get('error_code')}
-- Error Message: {event_details.get('error_message')}
+{self._describe_event(event_details)}
 
 Analyze this event and respond with a JSON object containing:
 1. "threat_categories": List of threat categories this event might belong to (reconnaissance, brute_force, data_exfiltration, privilege_escalation, persistence, lateral_movement, command_control, exfiltration, impact)
@@ -232,6 +506,32 @@ Consider:
 - Are there any error patterns suggesting failed attacks?
 
 Respond only with valid JSON.
+"""
+
+    def _create_batch_ai_prompt(self, events: Dict[str, Dict[str, Any]]) -> str:
+        """Create a prompt for AI threat analysis of several events at once."""
+        event_blocks = "\n\n".join(
+            f"Event ID: {event_id}\n{self._describe_event(details)}" for event_id, details in events.items()
+        )
+        return f"""
+You are a cybersecurity threat analyst. Analyze each of the following AWS CloudTrail events for potential security threats.
+
+{event_blocks}
+
+Analyze each event independently and respond with a JSON array containing one object per event, each with:
+1. "event_id": The Event ID given above
+2. "threat_categories": List of threat categories this event might belong to (reconnaissance, brute_force, data_exfiltration, privilege_escalation, persistence, lateral_movement, command_control, exfiltration, impact)
+3. "confidence": Confidence score (0-100) in your assessment
+4. "reasoning": Brief explanation of your analysis
+5. "risk_score": Overall risk score (1-10)
+
+Consider:
+- Is this normal administrative activity or suspicious?
+- Are there indicators of reconnaissance, attack, or data theft?
+- Is the timing, source, or pattern unusual?
+- Are there any error patterns suggesting failed attacks?
+
+Respond only with a valid JSON array.
 """
     
     def _assess_threat_level(self, pattern_analysis: Dict[str, Any], ai_analysis: Dict[str, Any]) -> Dict[str, Any]:
@@ -276,6 +576,25 @@ Respond only with valid JSON.
             'timestamp': datetime.now(timezone.utc).isoformat()
         }
 
+@lru_cache(maxsize=1)
+def get_detector() -> ThreatDetector:
+    """Build the ThreatDetector once per container and reuse it across warm invocations."""
+    return ThreatDetector()
+
+@lru_cache(maxsize=1)
+def get_deduplicator() -> Optional[EventDeduplicator]:
+    """Build the event deduplicator once per container so its filter survives warm invocations."""
+    if not DEDUP_ENABLED:
+        return None
+    return EventDeduplicator(
+        table=aws.lazy_table(DEDUP_TABLE) if DEDUP_TABLE else None,
+        ttl_seconds=DEDUP_TTL_SECONDS,
+        lease_margin_seconds=DEDUP_LEASE_MARGIN_SECONDS,
+        bloom_capacity=DEDUP_BLOOM_CAPACITY,
+        bloom_error_rate=DEDUP_BLOOM_ERROR_RATE,
+        bloom_rotation_seconds=DEDUP_BLOOM_ROTATION_SECONDS
+    )
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for threat detection.
@@ -290,22 +609,34 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     try:
         logger.info("threat_detection_started", event_id=event.get('id'))
         
-        # Initialize threat detector
-        detector = ThreatDetector()
+        # Redeliveries are dropped before they cost a Bedrock call or a write
+        deduplicator = get_deduplicator()
+        event_id = event_id_of(event)
+        if deduplicator is not None and not deduplicator.claim(event_id, context):
+            logger.info("duplicate_event_skipped", event_id=event_id)
+            metrics.count('DuplicateEventsSkipped')
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'message': 'Duplicate event skipped', 'event_id': event_id})
+            }
         
-        # Analyze the event
-        threat_assessment = detector.analyze_event(event)
+        intel_writer.watch_deadline(context)
         
-        # Store threat intelligence
-        if threat_assessment['threat_level'] in ['MEDIUM', 'HIGH', 'CRITICAL']:
-            store_threat_intelligence(event, threat_assessment)
+        detector = get_detector()
         
-        # Send to response orchestrator if threat detected
-        if threat_assessment['threat_level'] in ['HIGH', 'CRITICAL']:
-            trigger_incident_response(event, threat_assessment)
+        # Analyze the event and dispatch the results; a record that cannot be
+        # stored fails the invocation so the event is retried
+        try:
+            threat_assessment = process_event(detector, event)
+            intel_writer.flush()
+        except Exception:
+            if deduplicator is not None:
+                deduplicator.release(event_id)
+            raise
+        if deduplicator is not None:
+            deduplicator.complete(event_id)
         
-        # Send metrics to CloudWatch
-        send_metrics(threat_assessment)
+        sync_burst_counters()
         
         logger.info("threat_detection_completed", threat_level=threat_assessment['threat_level'])
         
@@ -321,75 +652,186 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         logger.error("threat_detection_failed", error=str(e))
         raise
 
-def store_threat_intelligence(event: Dict[str, Any], threat_assessment: Dict[str, Any]) -> None:
-    """Store threat intelligence in DynamoDB."""
+    finally:
+        # A failed invocation must not leave records or an armed deadline timer for the next one
+        intel_writer.discard()
+        flush_incident_events()
+        metrics.flush()
+
+def batch_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Lambda handler for SQS and Kinesis record batches.
+    
+    Every record is analyzed with the same ThreatDetector; Bedrock prompts are
+    micro-batched and fanned out under an adaptive concurrency limit, and at
+    most BATCH_MAX_CONCURRENCY dispatches run at once. Records that fail are
+    reported back as partial batch failures so only they are retried; the
+    event source mapping must have ReportBatchItemFailures enabled.
+    
+    Args:
+        event: SQS or Kinesis event containing a list of records
+        context: Lambda context
+    
+    Returns:
+        Dict in the partial batch response format
+    """
+    records = event.get('Records', [])
+    logger.info("batch_threat_detection_started", record_count=len(records))
+    
+    detector = get_detector()
+    intel_writer.watch_deadline(context)
+    failures = []
+    decoded = []
+    # Threat intel key -> records whose assessment was stored under it
+    stored_keys: Dict[Tuple, List[str]] = {}
+    
     try:
-        table = dynamodb.Table(THREAT_INTEL_TABLE)
+        for record in records:
+            item_identifier = record_identifier(record)
+            try:
+                decoded.append((item_identifier, decode_record(record)))
+            except Exception as e:
+                logger.error("batch_record_failed", item_identifier=item_identifier, error=str(e))
+                failures.append(item_identifier)
+        
+        # Analyze all records together so Bedrock prompts can be micro-batched
+        assessments = detector.analyze_events([payload for _, payload in decoded])
         
+        def _dispatch_record(entry: tuple) -> Optional[str]:
+            """Dispatch one assessment, returning the record identifier if it failed."""
+            (item_identifier, payload), threat_assessment = entry
+            if threat_assessment is None:
+                return item_identifier
+            try:
+                intel_key = dispatch_assessment(payload, threat_assessment)
+                if intel_key is not None:
+                    stored_keys.setdefault(intel_key, []).append(item_identifier)
+                return None
+            except Exception as e:
+                logger.error("batch_record_failed", item_identifier=item_identifier, error=str(e))
+                return item_identifier
+        
+        if decoded:
+            with ThreadPoolExecutor(max_workers=max(1, min(BATCH_MAX_CONCURRENCY, len(decoded)))) as executor:
+                failures.extend(item_id for item_id in executor.map(_dispatch_record, zip(decoded, assessments)) if item_id)
+        
+        try:
+            intel_writer.flush()
+        except BatchWriteError as e:
+            logger.error("batch_threat_intelligence_write_failed", failed_count=len(e.failed_keys))
+            failures.extend(item_id for key in e.failed_keys for item_id in stored_keys.get(key, ()))
+        flush_incident_events()
+        sync_burst_counters()
+        metrics.flush()
+    finally:
+        intel_writer.discard()
+    
+    logger.info(
+        "batch_threat_detection_completed",
+        record_count=len(records),
+        failed_count=len(failures),
+        bedrock_concurrency=model_limiter.stats()
+    )
+    
+    return {
+        'batchItemFailures': [{'itemIdentifier': item_id} for item_id in failures]
+    }
+
+def process_event(detector: ThreatDetector, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyze a single event and store, escalate and report the assessment."""
+    threat_assessment = detector.analyze_event(event)
+    dispatch_assessment(event, threat_assessment)
+    return threat_assessment
+    
+def dispatch_assessment(event: Dict[str, Any], threat_assessment: Dict[str, Any]) -> Optional[Tuple]:
+    """Store, escalate and report a completed threat assessment; returns the stored intel key, if any."""
+    # Store threat intelligence
+    intel_key = None
+    if threat_assessment['threat_level'] in ['MEDIUM', 'HIGH', 'CRITICAL']:
+        intel_key = store_threat_intelligence(event, threat_assessment)
+    
+    # Send to response orchestrator if threat detected
+    if threat_assessment['threat_level'] in ['HIGH', 'CRITICAL']:
+        trigger_incident_response(event, threat_assessment)
+    
+    # Send metrics to CloudWatch
+    send_metrics(threat_assessment)
+    
+    return intel_key
+
+def flush_incident_events() -> None:
+    """Send queued incident response events, counting any EventBridge did not accept."""
+    pending = incident_events.pending()
+    if not pending:
+        return
+    failed = pending - incident_events.flush()
+    if failed:
+        metrics.count('IncidentResponseTriggerFailures', value=failed)
+
+def sync_burst_counters() -> None:
+    """Share this container's burst counts through BURST_COUNTER_TABLE, if configured."""
+    if burst_tracker is None or not BURST_COUNTER_TABLE:
+        return
+    try:
+        burst_tracker.sync(aws.table(BURST_COUNTER_TABLE))
+    except Exception as e:
+        logger.error("failed_to_sync_burst_counters", error=str(e))
+
+def store_threat_intelligence(event: Dict[str, Any], threat_assessment: Dict[str, Any]) -> Tuple:
+    """Queue threat intelligence for the batched DynamoDB write at the end of the invocation and return its key."""
+    try:
         item = {
             'event_id': event.get('id'),
             'timestamp': threat_assessment['timestamp'],
             'threat_level': threat_assessment['threat_level'],
-            'risk_score': threat_assessment['risk_score'],
+            # DynamoDB stores numbers as Decimal and rejects floats
+            'risk_score': Decimal(str(threat_assessment['risk_score'])),
             'categories': threat_assessment['categories'],
             'source_ip': event.get('detail', {}).get('sourceIPAddress'),
             'event_name': event.get('detail', {}).get('eventName'),
             'patterns_found': threat_assessment['patterns_found'],
             'ai_reasoning': threat_assessment['ai_reasoning'],
+            'analysis_path': threat_assessment.get('analysis_path'),
             'ttl': int(time.time()) + (30 * 24 * 60 * 60)  # 30 days TTL
         }
         
-        table.put_item(Item=item)
+        # Bulky attributes are stored compressed; keys and query attributes stay plain
+        intel_writer.put(encode_item(item, THREAT_INTEL_ENCODED_ATTRIBUTES))
         logger.info("threat_intelligence_stored", event_id=event.get('id'))
+        return intel_writer.key(item)
         
     except Exception as e:
         logger.error("failed_to_store_threat_intelligence", error=str(e))
+        raise
 
 def trigger_incident_response(event: Dict[str, Any], threat_assessment: Dict[str, Any]) -> None:
-    """Trigger incident response Lambda for high/critical threats."""
+    """Queue the event that triggers the incident response Lambda for high/critical threats."""
     try:
-        response_event = {
-            'source': 'secure-shield.threat-detector',
-            'detail-type': 'Threat Detected',
-            'detail': {
-                'original_event': event,
-                'threat_assessment': threat_assessment,
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            }
+        detail = {
+            # Large events travel as a claim-check reference instead of inline
+            'original_event': claim_check.offload(slim_event(event) if EVENT_SLIM_PAYLOADS else event),
+            'threat_assessment': threat_assessment,
+            'timestamp': datetime.now(timezone.utc).isoformat()
         }
         
-        eventbridge.put_events(Entries=[response_event])
+        if not incident_events.publish('Threat Detected', detail):
+            metrics.count('IncidentResponseTriggerFailures')
+            return
+        metrics.count('IncidentResponsesTriggered', dimensions={'ThreatLevel': threat_assessment['threat_level']})
         logger.info("incident_response_triggered", threat_level=threat_assessment['threat_level'])
         
     except Exception as e:
+        metrics.count('IncidentResponseTriggerFailures')
         logger.error("failed_to_trigger_incident_response", error=str(e))
 
 def send_metrics(threat_assessment: Dict[str, Any]) -> None:
-    """Send custom metrics to CloudWatch."""
+    """Buffer custom metrics for the assessment; they are emitted when the handler flushes the sink."""
     try:
-        metrics = [
-            {
-                'MetricName': 'ThreatsDetected',
-                'Value': 1,
-                'Unit': 'Count',
-                'Dimensions': [
-                    {'Name': 'ThreatLevel', 'Value': threat_assessment['threat_level']}
-                ]
-            },
-            {
-                'MetricName': 'RiskScore',
-                'Value': threat_assessment['risk_score'],
-                'Unit': 'None',
-                'Dimensions': [
-                    {'Name': 'ThreatLevel', 'Value': threat_assessment['threat_level']}
-                ]
-            }
-        ]
-        
-        cloudwatch.put_metric_data(
-            Namespace='SecureShield/ThreatDetection',
-            MetricData=metrics
-        )
+        dimensions = {'ThreatLevel': threat_assessment['threat_level']}
+        metrics.count('ThreatsDetected', dimensions=dimensions)
+        metrics.record('RiskScore', threat_assessment['risk_score'], dimensions=dimensions)
+        if threat_assessment.get('analysis_path'):
+            metrics.count('AssessmentsByPath', dimensions={'AnalysisPath': threat_assessment['analysis_path']})
         
     except Exception as e:
         logger.error("failed_to_send_metrics", error=str(e)) 
\ No newline at end of file
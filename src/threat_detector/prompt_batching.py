@@ -0,0 +1,71 @@
+"""
+SecureShield AI - Prompt Micro-Batching
+Packs several events into one Bedrock prompt and maps the JSON array answer back to events.
+"""
+
+import json
+from typing import Dict, Any, List, Sequence, Tuple
+
+# Rough characters-per-token ratio for English prompt text
+CHARS_PER_TOKEN = 4
+
+# Fields every per-event verdict must carry to be usable by _assess_threat_level
+REQUIRED_VERDICT_FIELDS = ('threat_categories', 'confidence', 'risk_score')
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a prompt fragment."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def pack_batches(descriptions: Sequence[Tuple[str, str]], max_events: int, max_tokens: int) -> List[List[str]]:
+    """
+    Greedily pack (event_id, description) pairs into batches.
+    
+    A batch closes when it reaches max_events or when the next description
+    would push it over the max_tokens budget. An event that is over budget on
+    its own still gets a batch of one.
+    """
+    batches: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    
+    for event_id, description in descriptions:
+        tokens = estimate_tokens(description)
+        if current and (len(current) >= max_events or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(event_id)
+        current_tokens += tokens
+    
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_batch_response(text: str, expected_ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Map a JSON array of verdicts back to event ids.
+    
+    Entries that are malformed, unknown or duplicated are dropped; the caller
+    falls back to single-event analysis for any id missing from the result.
+    """
+    try:
+        verdicts = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    if isinstance(verdicts, dict):
+        verdicts = verdicts.get('results', [])
+    if not isinstance(verdicts, list):
+        return {}
+    
+    expected = set(expected_ids)
+    results: Dict[str, Dict[str, Any]] = {}
+    for verdict in verdicts:
+        if not isinstance(verdict, dict):
+            continue
+        event_id = str(verdict.get('event_id', ''))
+        if event_id not in expected or event_id in results:
+            continue
+        if not all(field in verdict for field in REQUIRED_VERDICT_FIELDS):
+            continue
+        analysis = {key: value for key, value in verdict.items() if key != 'event_id'}
+        results[event_id] = analysis
+    return results
@@ -0,0 +1,115 @@
+"""
+SecureShield AI - Signature Engine
+Compiled multi-pattern matching for user-agent fingerprints and hashed lookups for API names.
+"""
+
+import json
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+class AhoCorasick:
+    """Aho-Corasick automaton that finds every pattern occurring in a text in one pass."""
+    
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._build_failure_links()
+    
+    def _add(self, pattern: str) -> None:
+        """Insert a pattern into the trie."""
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self.patterns))
+        self.patterns.append(pattern)
+    
+    def _build_failure_links(self) -> None:
+        """Compute failure links breadth-first and merge outputs along them."""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+    
+    def search(self, text: str) -> List[int]:
+        """Return the sorted indices of all patterns found in text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return sorted(found)
+
+class SignaturePack:
+    """A loaded set of tool fingerprints and suspicious API names."""
+    
+    def __init__(self, user_agents: Iterable[str], api_calls: Iterable[str], version: str = 'builtin'):
+        # Duplicates are dropped while keeping pack order, so findings stay stable
+        self.user_agents = list(dict.fromkeys(ua.lower() for ua in user_agents if ua))
+        self.api_calls = frozenset(api_calls)
+        self.version = version
+        self._automaton = AhoCorasick(self.user_agents)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], version: Optional[str] = None) -> 'SignaturePack':
+        """Build a pack from a dict with 'user_agents' and 'api_calls' lists."""
+        return cls(
+            user_agents=data.get('user_agents', []),
+            api_calls=data.get('api_calls', []),
+            version=version or str(data.get('version', 'unversioned'))
+        )
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'SignaturePack':
+        """Load a JSON signature pack from disk."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+    
+    def match_user_agent(self, user_agent: str) -> List[str]:
+        """Return every signature contained in the (lowercased) user agent, in pack order."""
+        if not user_agent:
+            return []
+        return [self.user_agents[index] for index in self._automaton.search(user_agent.lower())]
+    
+    def is_suspicious_api(self, event_name: Optional[str]) -> bool:
+        """Check an API name against the suspicious API set."""
+        return event_name in self.api_calls
+    
+    def __len__(self) -> int:
+        return len(self.user_agents) + len(self.api_calls)
+
+@lru_cache(maxsize=8)
+def load_signature_pack(path: str) -> SignaturePack:
+    """Load and compile a signature pack once per container."""
+    pack = SignaturePack.from_file(path)
+    logger.info("signature_pack_loaded", path=path, version=pack.version, signatures=len(pack))
+    return pack
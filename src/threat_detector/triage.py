@@ -0,0 +1,82 @@
+"""
+SecureShield AI - Triage Gate
+Decides whether pattern analysis is decisive enough to skip the Bedrock round trip.
+"""
+
+from typing import Dict, Any, Iterable, Optional
+
+# Analysis paths recorded on every threat assessment
+PATH_AI = 'ai'
+PATH_TRIAGE_BENIGN = 'triage_benign'
+PATH_TRIAGE_HOSTILE = 'triage_hostile'
+
+class TriageGate:
+    """
+    Short-circuits clearly benign or clearly hostile events before AI analysis.
+    
+    By default only events without any pattern signal are triaged as benign;
+    a lone error code or off-hours call still goes to the model.
+    """
+    
+    def __init__(self, benign_max_score: int = 0, hostile_min_score: int = 8,
+                 allowlisted_principals: Iterable[str] = (), allowlisted_user_agents: Iterable[str] = ()):
+        self.benign_max_score = benign_max_score
+        self.hostile_min_score = hostile_min_score
+        self.allowlisted_principals = frozenset(p for p in allowlisted_principals if p)
+        self.allowlisted_user_agents = tuple(ua.lower() for ua in allowlisted_user_agents if ua)
+    
+    def evaluate(self, event_details: Dict[str, Any], pattern_analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return a substitute AI analysis when the event is decisive, otherwise None.
+        
+        The substitute carries the pattern risk score so the combined score in
+        _assess_threat_level equals the pattern score.
+        """
+        risk_score = pattern_analysis.get('risk_score', 0)
+        
+        if risk_score >= self.hostile_min_score:
+            categories = []
+            if any(p.startswith(('suspicious_user_agent:', 'suspicious_api_call:')) for p in pattern_analysis.get('patterns_found', [])):
+                categories.append('reconnaissance')
+            return self._analysis(PATH_TRIAGE_HOSTILE, pattern_analysis, categories,
+                                  f'Triage: pattern risk score {risk_score} at or above hostile threshold {self.hostile_min_score}')
+        
+        allowlist_reason = self._allowlist_reason(event_details, pattern_analysis)
+        if allowlist_reason:
+            return self._analysis(PATH_TRIAGE_BENIGN, pattern_analysis, [], f'Triage: {allowlist_reason}')
+        
+        if risk_score <= self.benign_max_score:
+            return self._analysis(PATH_TRIAGE_BENIGN, pattern_analysis, [],
+                                  f'Triage: pattern risk score {risk_score} at or below benign threshold {self.benign_max_score}')
+        
+        return None
+    
+    def _allowlist_reason(self, event_details: Dict[str, Any], pattern_analysis: Dict[str, Any]) -> Optional[str]:
+        """Explain why an event is allowlisted, if it is."""
+        user_identity = event_details.get('user_identity') or {}
+        
+        # Calls made by AWS services on the account's behalf
+        if user_identity.get('type') == 'AWSService' or event_details.get('event_type') == 'AwsServiceEvent':
+            return 'internal AWS service call'
+        
+        if 'allowlisted_ip' in pattern_analysis.get('patterns_found', []):
+            return 'allowlisted source IP'
+        
+        if user_identity.get('arn') in self.allowlisted_principals:
+            return f'allowlisted principal {user_identity["arn"]}'
+        
+        user_agent = (event_details.get('user_agent') or '').lower()
+        if user_agent and user_agent.startswith(self.allowlisted_user_agents):
+            return 'allowlisted user agent'
+        
+        return None
+    
+    def _analysis(self, path: str, pattern_analysis: Dict[str, Any], categories: list, reasoning: str) -> Dict[str, Any]:
+        """Build an AI-analysis-shaped result from the pattern analysis."""
+        return {
+            'analysis_path': path,
+            'threat_categories': categories,
+            'confidence': pattern_analysis.get('confidence', 0),
+            'reasoning': reasoning,
+            'risk_score': pattern_analysis.get('risk_score', 0)
+        }
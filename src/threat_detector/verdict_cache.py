@@ -0,0 +1,134 @@
+"""
+SecureShield AI - Bedrock Verdict Cache
+Caches AI threat verdicts by a normalized fingerprint of the event fields the prompt uses.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+# Digit runs in user agents and error messages (versions, request IDs, account IDs)
+_DIGITS = re.compile(r'\d+')
+_WHITESPACE = re.compile(r'\s+')
+
+def _normalize_text(value: Optional[str]) -> str:
+    """Lowercase, collapse whitespace and mask digit runs."""
+    if not value:
+        return ''
+    return _DIGITS.sub('#', _WHITESPACE.sub(' ', str(value).strip().lower()))
+
+def _time_bucket(event_time: Optional[str]) -> str:
+    """Reduce an event time to the part the prompt reasons about (hour of day)."""
+    if not event_time:
+        return ''
+    try:
+        return str(datetime.fromisoformat(event_time.replace('Z', '+00:00')).hour)
+    except ValueError:
+        return ''
+
+def fingerprint(event_details: Dict[str, Any]) -> str:
+    """Build a stable fingerprint from the fields used by _create_ai_prompt."""
+    normalized = {
+        'event_name': event_details.get('event_name') or '',
+        'source_ip': event_details.get('source_ip') or '',
+        'user_agent': _normalize_text(event_details.get('user_agent')),
+        'event_hour': _time_bucket(event_details.get('event_time')),
+        'aws_region': event_details.get('aws_region') or '',
+        'error_code': event_details.get('error_code') or '',
+        'error_message': _normalize_text(event_details.get('error_message'))
+    }
+    encoded = json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class VerdictCache:
+    """Two-tier verdict cache: an in-process LRU plus an optional shared DynamoDB table."""
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 900, table: Any = None, shared_ttl_seconds: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.table = table
+        self.shared_ttl_seconds = shared_ttl_seconds or ttl_seconds
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached verdict, checking the local tier before the shared one."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, verdict = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats['local_hits'] += 1
+                    return dict(verdict)
+                del self._entries[key]
+        
+        verdict = self._get_shared(key, now)
+        with self._lock:
+            if verdict is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['shared_hits'] += 1
+        self._put_local(key, verdict, now)
+        return dict(verdict)
+    
+    def put(self, key: str, verdict: Dict[str, Any]) -> None:
+        """Store a verdict in both tiers."""
+        now = time.time()
+        self._put_local(key, verdict, now)
+        self._put_shared(key, verdict, now)
+    
+    def _put_local(self, key: str, verdict: Dict[str, Any], now: float) -> None:
+        """Insert into the LRU tier, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (now + self.ttl_seconds, dict(verdict))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+    
+    def _get_shared(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        """Read a verdict from the shared DynamoDB tier, if configured."""
+        if self.table is None:
+            return None
+        try:
+            item = self.table.get_item(Key={'fingerprint': key}).get('Item')
+            # DynamoDB TTL deletion is lazy, so expiry is checked here as well
+            if not item or int(item.get('ttl', 0)) <= now:
+                return None
+            return json.loads(item['verdict'])
+        except Exception as e:
+            logger.warning("verdict_cache_read_failed", error=str(e))
+            return None
+    
+    def _put_shared(self, key: str, verdict: Dict[str, Any], now: float) -> None:
+        """Write a verdict to the shared DynamoDB tier, if configured."""
+        if self.table is None:
+            return
+        try:
+            self.table.put_item(Item={
+                'fingerprint': key,
+                'verdict': json.dumps(verdict),
+                'ttl': int(now) + self.shared_ttl_seconds
+            })
+        except Exception as e:
+            logger.warning("verdict_cache_write_failed", error=str(e))
+    
+    def __len__(self) -> int:
+        return len(self._entries)
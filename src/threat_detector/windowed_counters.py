@@ -0,0 +1,272 @@
+"""
+SecureShield AI - Windowed Burst Counters
+Fixed-memory sliding-window counters per source IP and principal for brute-force and enumeration detection.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import structlog
+
+logger = structlog.get_logger()
+
+def _hash_pair(value: str) -> Tuple[int, int]:
+    """Two independent 32-bit hashes for double hashing."""
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest[:4], 'little'), int.from_bytes(digest[4:], 'little') | 1
+
+def sketch_dimensions(expected_keys: int, error_rate: float) -> Tuple[int, int]:
+    """
+    Count-min (width, depth) for a bucket holding about expected_keys keys.
+    
+    width = e * expected_keys and depth = ln(1 / error_rate), so a key's
+    estimate exceeds its true count by more than the bucket total divided by
+    expected_keys (about one average key's count) with probability at most
+    error_rate.
+    """
+    if expected_keys < 1 or not 0 < error_rate < 1:
+        raise ValueError('expected_keys must be positive and error_rate between 0 and 1')
+    return math.ceil(math.e * expected_keys), max(1, math.ceil(math.log(1 / error_rate)))
+
+class CountMinSketch:
+    """Count-min sketch over 32-bit counters with conservative update."""
+    
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.counters = array('I', bytes(4 * width * depth))
+    
+    def indexes(self, hashes: Tuple[int, int]) -> List[int]:
+        """Counter positions for a pre-hashed key, one per row."""
+        h1, h2 = hashes
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+    
+    def add(self, indexes: Sequence[int], count: int = 1) -> None:
+        # Conservative update: only raise counters to the new estimate, so keys
+        # sharing a counter inflate each other far less than plain increments
+        counters = self.counters
+        target = min(counters[index] for index in indexes) + count
+        for index in indexes:
+            if counters[index] < target:
+                counters[index] = target
+    
+    def estimate(self, indexes: Sequence[int]) -> int:
+        counters = self.counters
+        return min(counters[index] for index in indexes)
+    
+    def clear(self) -> None:
+        self.counters = array('I', bytes(4 * self.width * self.depth))
+
+class _Bucket:
+    """Counters for one time slice of the ring."""
+    
+    __slots__ = ('epoch', 'requests', 'errors', 'distinct', 'seen')
+    
+    def __init__(self, width: int, depth: int, window_count: int, bloom_bits: int):
+        self.epoch = -1
+        self.requests = CountMinSketch(width, depth)
+        self.errors = CountMinSketch(width, depth)
+        # One distinct-API sketch per window: a (key, API) pair is counted in a
+        # window's sketch only if the pair was not seen earlier in that window
+        self.distinct = [CountMinSketch(width, depth) for _ in range(window_count)]
+        self.seen = bytearray(bloom_bits // 8)
+    
+    def reset(self, epoch: int) -> None:
+        self.epoch = epoch
+        self.requests.clear()
+        self.errors.clear()
+        for sketch in self.distinct:
+            sketch.clear()
+        self.seen = bytearray(len(self.seen))
+
+class BurstTracker:
+    """
+    Sliding-window request, error and distinct-API counters with fixed memory.
+    
+    Time is divided into buckets of bucket_seconds held in a ring large enough
+    for the longest window. Each bucket stores count-min sketches keyed by
+    source (e.g. "ip:203.0.113.25") plus a Bloom filter of (source, API) pairs,
+    so memory does not grow with the number of sources. Window totals are sums
+    over the buckets inside the window.
+    
+    Sketches are sized from expected_keys, the number of distinct sources per
+    bucket, and error_rate (see sketch_dimensions) unless width and depth are
+    given. Sources beyond expected_keys make estimates overcount; memory is
+    about 4 * width * depth * (2 + len(windows)) bytes per bucket.
+    """
+    
+    def __init__(self, windows: Sequence[int] = (60, 300, 3600), bucket_seconds: int = 60,
+                 expected_keys: int = 1000, error_rate: float = 0.01, width: Optional[int] = None,
+                 depth: Optional[int] = None, bloom_bits: int = 1 << 16, bloom_hashes: int = 3,
+                 max_pending_keys: int = 5000):
+        default_width, default_depth = sketch_dimensions(expected_keys, error_rate)
+        width = width or default_width
+        depth = depth or default_depth
+        self.windows = tuple(sorted(windows))
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = [max(1, window // bucket_seconds) for window in self.windows]
+        self.bloom_bits = bloom_bits
+        self.bloom_hashes = bloom_hashes
+        self._buckets = [_Bucket(width, depth, len(self.windows), bloom_bits) for _ in range(max(self.window_buckets))]
+        self._lock = threading.Lock()
+        # Per (key, bucket epoch): [local requests, local errors, unsynced requests, unsynced errors]
+        self._local: 'OrderedDict[Tuple[str, int], List[int]]' = OrderedDict()
+        # Per (key, bucket epoch): counts contributed by other containers, learned on sync
+        self._remote: 'OrderedDict[Tuple[str, int], Tuple[int, int]]' = OrderedDict()
+        self.max_pending_keys = max_pending_keys
+    
+    def observe(self, keys: Sequence[str], event_name: Optional[str], is_error: bool,
+                event_time: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """
+        Record one event for each key and return its window features.
+        
+        Returns {key: {'<window>s': {'requests': n, 'errors': n, 'distinct_apis': n}}}.
+        """
+        epoch = int(self._timestamp(event_time) // self.bucket_seconds)
+        features = {}
+        with self._lock:
+            bucket = self._bucket_for(epoch)
+            for key in keys:
+                hashes = _hash_pair(key)
+                if bucket is not None:
+                    indexes = bucket.requests.indexes(hashes)
+                    bucket.requests.add(indexes)
+                    if is_error:
+                        bucket.errors.add(indexes)
+                    if event_name:
+                        self._count_distinct(key, event_name, epoch, indexes)
+                    self._track_local(key, epoch, is_error)
+                features[key] = self._features(hashes, key, epoch)
+        return features
+    
+    def _timestamp(self, event_time: Optional[str]) -> float:
+        """Event time as epoch seconds, falling back to the wall clock."""
+        if event_time:
+            try:
+                return datetime.fromisoformat(event_time.replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                pass
+        return time.time()
+    
+    def _bucket_for(self, epoch: int) -> Optional[_Bucket]:
+        """Return the ring bucket for an epoch, recycling stale slots; None if the epoch fell off the ring."""
+        bucket = self._buckets[epoch % len(self._buckets)]
+        if bucket.epoch == epoch:
+            return bucket
+        if bucket.epoch > epoch:
+            return None
+        bucket.reset(epoch)
+        return bucket
+    
+    def _bloom_positions(self, member: str) -> List[int]:
+        h1, h2 = _hash_pair(member)
+        return [(h1 + i * h2) % self.bloom_bits for i in range(self.bloom_hashes)]
+    
+    def _count_distinct(self, key: str, event_name: str, epoch: int, indexes: List[int]) -> None:
+        """Count a (key, API) pair once per window it is new to."""
+        positions = self._bloom_positions(f'{key}\x00{event_name}')
+        last_seen_age = None
+        for age in range(max(self.window_buckets)):
+            bucket = self._buckets[(epoch - age) % len(self._buckets)]
+            if bucket.epoch != epoch - age:
+                continue
+            if all(bucket.seen[p >> 3] & (1 << (p & 7)) for p in positions):
+                last_seen_age = age
+                break
+        
+        current = self._buckets[epoch % len(self._buckets)]
+        for window_index, bucket_count in enumerate(self.window_buckets):
+            if last_seen_age is None or last_seen_age >= bucket_count:
+                current.distinct[window_index].add(indexes)
+        for p in positions:
+            current.seen[p >> 3] |= 1 << (p & 7)
+    
+    def _features(self, hashes: Tuple[int, int], key: str, epoch: int) -> Dict[str, Dict[str, int]]:
+        """Sum bucket estimates (plus synced remote counts) over every window."""
+        features = {}
+        for window_index, (window, bucket_count) in enumerate(zip(self.windows, self.window_buckets)):
+            requests = errors = distinct = 0
+            for age in range(bucket_count):
+                bucket = self._buckets[(epoch - age) % len(self._buckets)]
+                if bucket.epoch != epoch - age:
+                    continue
+                indexes = bucket.requests.indexes(hashes)
+                requests += bucket.requests.estimate(indexes)
+                errors += bucket.errors.estimate(indexes)
+                distinct += bucket.distinct[window_index].estimate(indexes)
+                remote = self._remote.get((key, epoch - age))
+                if remote:
+                    requests += remote[0]
+                    errors += remote[1]
+            features[f'{window}s'] = {'requests': requests, 'errors': errors, 'distinct_apis': distinct}
+        return features
+    
+    def _track_local(self, key: str, epoch: int, is_error: bool) -> None:
+        """Keep exact per-bucket counts for the keys seen recently, for DynamoDB sync."""
+        counts = self._local.get((key, epoch))
+        if counts is None:
+            counts = self._local[(key, epoch)] = [0, 0, 0, 0]
+            while len(self._local) > self.max_pending_keys:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end((key, epoch))
+        counts[0] += 1
+        counts[2] += 1
+        if is_error:
+            counts[1] += 1
+            counts[3] += 1
+    
+    def sync(self, table: Any, ttl_seconds: Optional[int] = None) -> int:
+        """
+        Push unsynced counts to a shared DynamoDB table and learn other containers' counts.
+        
+        Each (key, bucket) is one item updated with ADD, so concurrent containers
+        never overwrite each other. Returns the number of items written.
+        """
+        with self._lock:
+            pending = [(slot, counts[2], counts[3]) for slot, counts in self._local.items() if counts[2]]
+            for slot, _, _ in pending:
+                self._local[slot][2] = self._local[slot][3] = 0
+        
+        ttl_seconds = ttl_seconds or max(self.windows) + self.bucket_seconds
+        written = 0
+        for (key, epoch), requests, errors in pending:
+            try:
+                response = table.update_item(
+                    Key={'counter_key': f'{key}#{epoch}'},
+                    UpdateExpression='ADD requests :r, errors :e SET #ttl = :ttl',
+                    ExpressionAttributeNames={'#ttl': 'ttl'},
+                    ExpressionAttributeValues={
+                        ':r': requests,
+                        ':e': errors,
+                        ':ttl': (epoch + 1) * self.bucket_seconds + ttl_seconds
+                    },
+                    ReturnValues='UPDATED_NEW'
+                )
+            except Exception as e:
+                logger.warning("burst_counter_sync_failed", key=key, error=str(e))
+                with self._lock:
+                    counts = self._local.get((key, epoch))
+                    if counts is not None:
+                        counts[2] += requests
+                        counts[3] += errors
+                continue
+            
+            written += 1
+            totals = response.get('Attributes', {})
+            with self._lock:
+                counts = self._local.get((key, epoch), [requests, errors, 0, 0])
+                self._remote[(key, epoch)] = (
+                    max(0, int(totals.get('requests', 0)) - counts[0]),
+                    max(0, int(totals.get('errors', 0)) - counts[1])
+                )
+                self._remote.move_to_end((key, epoch))
+                while len(self._remote) > self.max_pending_keys:
+                    self._remote.popitem(last=False)
+        return written
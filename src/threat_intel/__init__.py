@@ -0,0 +1,17 @@
+"""
+SecureShield AI - Threat Intelligence Module
+Read and analytics access to stored threat intelligence.
+"""
+
+from .query import ThreatIntelQuery, parallel_scan
+from .export import export_attacker_profiles, export_threat_intel
+from .analytics import ThreatIntelAnalytics
+
+__all__ = [
+    'ThreatIntelQuery',
+    'ThreatIntelAnalytics',
+    'export_threat_intel',
+    'export_attacker_profiles',
+    'parallel_scan'
+]
+__version__ = '1.0.0'
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+SecureShield AI - Threat Intelligence Export
+Streams the threat-intel and attacker profile tables into Hive-partitioned Parquet datasets.
+
+Rows are converted in fixed-size Arrow record batches as the parallel scan
+produces them, so exports of any size run in bounded memory. Threat-intel
+records are partitioned by event date and threat level; attacker profiles by
+date of last activity and highest observed threat level.
+"""
+
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import structlog
+
+from ..common import aws
+from ..common.codec import json_default
+from .query import THREAT_LEVELS, ThreatIntelQuery, parallel_scan
+
+logger = structlog.get_logger()
+
+# Configuration
+ATTACKER_PROFILES_TABLE = os.getenv('ATTACKER_PROFILES_TABLE', 'secure-shield-attacker-profiles')
+EXPORT_BATCH_ROWS = int(os.getenv('THREAT_INTEL_EXPORT_BATCH_ROWS', '10000'))
+
+PARTITION_COLUMNS = ('date', 'threat_level')
+UNKNOWN_PARTITION = 'unknown'
+
+THREAT_INTEL_SCHEMA = pa.schema([
+    ('event_id', pa.string()),
+    ('intelligence_id', pa.string()),
+    ('timestamp', pa.timestamp('us', tz='UTC')),
+    ('source_ip', pa.string()),
+    ('event_name', pa.string()),
+    ('risk_score', pa.float64()),
+    ('categories', pa.list_(pa.string())),
+    ('analysis_path', pa.string()),
+    ('ai_reasoning', pa.string()),
+    ('patterns_found', pa.string()),
+    ('attack_patterns', pa.string()),
+    ('event_details', pa.string()),
+    ('date', pa.string()),
+    ('threat_level', pa.string())
+])
+
+ATTACKER_PROFILE_SCHEMA = pa.schema([
+    ('source_ip', pa.string()),
+    ('attack_count', pa.int64()),
+    ('attack_vectors', pa.list_(pa.string())),
+    ('tools_used', pa.list_(pa.string())),
+    ('threat_levels', pa.list_(pa.string())),
+    ('first_seen', pa.timestamp('us', tz='UTC')),
+    ('last_activity', pa.timestamp('us', tz='UTC')),
+    ('date', pa.string()),
+    ('threat_level', pa.string())
+])
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """Parse a stored ISO 8601 timestamp as an aware UTC datetime."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def _date(value: Optional[datetime]) -> str:
+    return value.strftime('%Y-%m-%d') if value else UNKNOWN_PARTITION
+
+def _number(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _strings(value: Any) -> List[str]:
+    return sorted(str(member) for member in value) if value else []
+
+def _json(value: Any) -> Optional[str]:
+    """Nested attributes are kept as JSON text; analytics rarely reads them and they vary per record."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, separators=(',', ':'), default=json_default)
+
+def threat_intel_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a decoded threat-intel item into a THREAT_INTEL_SCHEMA row."""
+    timestamp = _timestamp(item.get('timestamp'))
+    return {
+        'event_id': item.get('event_id'),
+        'intelligence_id': item.get('intelligence_id'),
+        'timestamp': timestamp,
+        'source_ip': item.get('source_ip'),
+        'event_name': item.get('event_name'),
+        'risk_score': _number(item.get('risk_score')),
+        # The detector writes 'categories', the collector 'threat_categories'
+        'categories': _strings(item.get('categories') or item.get('threat_categories')),
+        'analysis_path': item.get('analysis_path'),
+        'ai_reasoning': _json(item.get('ai_reasoning')),
+        'patterns_found': _json(item.get('patterns_found')),
+        'attack_patterns': _json(item.get('attack_patterns')),
+        'event_details': _json(item.get('event_details')),
+        'date': _date(timestamp),
+        'threat_level': item.get('threat_level') or UNKNOWN_PARTITION
+    }
+
+def attacker_profile_row(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten an attacker profile item into an ATTACKER_PROFILE_SCHEMA row."""
+    last_activity = _timestamp(item.get('last_activity'))
+    threat_levels = _strings(item.get('threat_levels'))
+    known_levels = [level for level in THREAT_LEVELS if level in threat_levels]
+    attack_count = item.get('attack_count')
+    return {
+        'source_ip': item.get('source_ip'),
+        'attack_count': int(attack_count) if isinstance(attack_count, (int, Decimal)) else None,
+        'attack_vectors': _strings(item.get('attack_vectors')),
+        'tools_used': _strings(item.get('tools_used')),
+        'threat_levels': threat_levels,
+        'first_seen': _timestamp(item.get('first_seen')),
+        'last_activity': last_activity,
+        'date': _date(last_activity),
+        'threat_level': known_levels[-1] if known_levels else UNKNOWN_PARTITION
+    }
+
+def record_batches(rows: Iterable[Dict[str, Any]], schema: pa.Schema,
+                   batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """Group rows into record batches of at most batch_rows rows."""
+    batch: List[Dict[str, Any]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield pa.RecordBatch.from_pylist(batch, schema=schema)
+            batch = []
+    if batch:
+        yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+def write_partitioned(rows: Iterable[Dict[str, Any]], schema: pa.Schema, output_dir: str,
+                      batch_rows: int = EXPORT_BATCH_ROWS,
+                      partition_columns: Sequence[str] = PARTITION_COLUMNS) -> Dict[str, int]:
+    """
+    Write rows as a Hive-partitioned Parquet dataset under output_dir.
+    
+    Each run writes uniquely named files, so repeated exports into the same
+    directory add data instead of overwriting earlier runs.
+    """
+    counts = {'rows': 0, 'batches': 0}
+    
+    def counted() -> Iterator[pa.RecordBatch]:
+        for batch in record_batches(rows, schema, batch_rows):
+            counts['rows'] += batch.num_rows
+            counts['batches'] += 1
+            yield batch
+    
+    partitioning = ds.partitioning(pa.schema([schema.field(name) for name in partition_columns]), flavor='hive')
+    ds.write_dataset(
+        counted(),
+        output_dir,
+        schema=schema,
+        format='parquet',
+        partitioning=partitioning,
+        basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        max_rows_per_group=batch_rows
+    )
+    return counts
+
+def export_threat_intel(output_dir: str, query: Optional[ThreatIntelQuery] = None, segments: int = 4,
+                        batch_rows: int = EXPORT_BATCH_ROWS) -> Dict[str, int]:
+    """Export the whole threat-intel table to Parquet partitioned by date and threat level."""
+    query = query or ThreatIntelQuery()
+    rows = (threat_intel_row(item) for item in query.export(segments=segments))
+    counts = write_partitioned(rows, THREAT_INTEL_SCHEMA, output_dir, batch_rows)
+    logger.info("threat_intel_exported", output_dir=output_dir, **counts)
+    return counts
+
+def export_attacker_profiles(output_dir: str, table: Any = None, segments: int = 4,
+                             batch_rows: int = EXPORT_BATCH_ROWS) -> Dict[str, int]:
+    """Export the attacker profiles table to Parquet partitioned by last activity date and threat level."""
+    table = table if table is not None else aws.table(ATTACKER_PROFILES_TABLE)
+    rows = (attacker_profile_row(item) for item in parallel_scan(table, segments))
+    counts = write_partitioned(rows, ATTACKER_PROFILE_SCHEMA, output_dir, batch_rows)
+    logger.info("attacker_profiles_exported", output_dir=output_dir, **counts)
+    return counts
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Export one or both tables under an output directory."""
+    parser = argparse.ArgumentParser(description='Export SecureShield threat intelligence to Parquet')
+    parser.add_argument('output_dir', help='Dataset root; tables are written to threat_intel/ and attacker_profiles/')
+    parser.add_argument('--table', choices=('threat-intel', 'attacker-profiles', 'all'), default='all')
+    parser.add_argument('--segments', type=int, default=4, help='Parallel scan segments')
+    parser.add_argument('--batch-rows', type=int, default=EXPORT_BATCH_ROWS, help='Rows per record batch')
+    args = parser.parse_args(argv)
+    
+    if args.table in ('threat-intel', 'all'):
+        export_threat_intel(os.path.join(args.output_dir, 'threat_intel'), segments=args.segments,
+                            batch_rows=args.batch_rows)
+    if args.table in ('attacker-profiles', 'all'):
+        export_attacker_profiles(os.path.join(args.output_dir, 'attacker_profiles'), segments=args.segments,
+                                 batch_rows=args.batch_rows)
+
+if __name__ == '__main__':
+    main()
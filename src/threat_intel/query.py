@@ -0,0 +1,213 @@
+"""
+SecureShield AI - Threat Intelligence Query
+Streaming, paginated reads of the threat-intel table by source IP, threat level and time range.
+
+Lookups use Query on the table's global secondary indexes; full exports use a
+parallel segmented Scan. Every method is a generator that holds at most a few
+pages in memory, so callers can stream millions of records.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from boto3.dynamodb.conditions import Attr, Key
+import structlog
+
+from ..common import aws
+from ..common.codec import THREAT_INTEL_ENCODED_ATTRIBUTES, decode_item
+
+logger = structlog.get_logger()
+
+# Configuration
+THREAT_INTEL_TABLE = os.getenv('THREAT_INTEL_TABLE', 'secure-shield-threat-intel')
+SOURCE_IP_INDEX = os.getenv('THREAT_INTEL_SOURCE_IP_INDEX', 'source_ip-timestamp-index')
+THREAT_LEVEL_INDEX = os.getenv('THREAT_INTEL_THREAT_LEVEL_INDEX', 'threat_level-timestamp-index')
+
+THREAT_LEVELS = ('LOW', 'MEDIUM', 'HIGH', 'CRITICAL')
+
+TimeBound = Union[str, datetime, None]
+
+def _iso(value: TimeBound) -> Optional[str]:
+    """Normalize a time bound to the ISO 8601 UTC form the writers store."""
+    if value is None or isinstance(value, str):
+        return value
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+def _projection(attributes: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """ProjectionExpression arguments; names are aliased since 'timestamp' and 'ttl' are reserved words."""
+    if not attributes:
+        return {}
+    names = {f'#p{i}': name for i, name in enumerate(attributes)}
+    return {'ProjectionExpression': ', '.join(names), 'ExpressionAttributeNames': names}
+
+def _pages(operation: Any, arguments: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+    """Follow LastEvaluatedKey, yielding one page of items at a time."""
+    while True:
+        response = operation(**arguments)
+        yield response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        arguments = dict(arguments, ExclusiveStartKey=last_key)
+
+def _offer(pages: 'queue.Queue', entry: Tuple[str, Any], stop: threading.Event) -> bool:
+    """Put an entry on the queue, giving up if the consumer has gone away."""
+    while not stop.is_set():
+        try:
+            pages.put(entry, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def parallel_scan(table: Any, segments: int = 4, attributes: Optional[Sequence[str]] = None,
+                  filter_expression: Any = None, max_buffered_pages: Optional[int] = None,
+                  page_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    Stream every item of a table with a parallel segmented Scan.
+    
+    Segment workers hand pages to a bounded queue, so memory stays at about
+    max_buffered_pages pages regardless of table size. Items arrive in no
+    particular order and are returned as stored.
+    """
+    pages: 'queue.Queue[Tuple[str, Any]]' = queue.Queue(maxsize=max_buffered_pages or segments * 2)
+    stop = threading.Event()
+    
+    def scan_segment(segment: int) -> None:
+        arguments = dict(_projection(attributes), Segment=segment, TotalSegments=segments, Limit=page_size)
+        if filter_expression is not None:
+            arguments['FilterExpression'] = filter_expression
+        try:
+            for page in _pages(table.scan, arguments):
+                if not _offer(pages, ('page', page), stop):
+                    return
+            _offer(pages, ('done', segment), stop)
+        except Exception as e:
+            _offer(pages, ('error', e), stop)
+    
+    workers = [threading.Thread(target=scan_segment, args=(segment,), daemon=True) for segment in range(segments)]
+    for worker in workers:
+        worker.start()
+    
+    finished = 0
+    try:
+        while finished < segments:
+            kind, payload = pages.get()
+            if kind == 'page':
+                yield from payload
+            elif kind == 'done':
+                finished += 1
+            else:
+                raise payload
+    finally:
+        # Unblock workers if the caller stopped reading early
+        stop.set()
+
+class ThreatIntelQuery:
+    """Generator-based read API over the threat-intel table."""
+    
+    def __init__(self, table: Any = None, source_ip_index: str = SOURCE_IP_INDEX,
+                 threat_level_index: str = THREAT_LEVEL_INDEX, page_size: int = 500):
+        self.table = table if table is not None else aws.table(THREAT_INTEL_TABLE)
+        self.source_ip_index = source_ip_index
+        self.threat_level_index = threat_level_index
+        self.page_size = page_size
+    
+    def by_source_ip(self, source_ip: str, start: TimeBound = None, end: TimeBound = None,
+                     threat_levels: Optional[Iterable[str]] = None, attributes: Optional[Sequence[str]] = None,
+                     newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        """Records from one source IP, in time order, optionally limited to some threat levels."""
+        condition = self._time_condition(Key('source_ip').eq(source_ip), start, end)
+        filter_expression = Attr('threat_level').is_in(list(threat_levels)) if threat_levels else None
+        return self._query(self.source_ip_index, condition, filter_expression, attributes, newest_first)
+    
+    def by_threat_level(self, threat_level: str, start: TimeBound = None, end: TimeBound = None,
+                        attributes: Optional[Sequence[str]] = None, newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        """Records of one threat level, in time order."""
+        condition = self._time_condition(Key('threat_level').eq(threat_level), start, end)
+        return self._query(self.threat_level_index, condition, None, attributes, newest_first)
+    
+    def by_time_range(self, start: TimeBound = None, end: TimeBound = None,
+                      threat_levels: Iterable[str] = THREAT_LEVELS, attributes: Optional[Sequence[str]] = None,
+                      newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Records across threat levels in one time range, merged into a single time-ordered stream.
+        
+        Each level is its own partition of the threat level index, so this runs
+        one Query per level and merges them lazily.
+        """
+        if attributes and 'timestamp' not in attributes:
+            attributes = list(attributes) + ['timestamp']
+        streams = [self.by_threat_level(level, start, end, attributes, newest_first) for level in threat_levels]
+        return heapq.merge(*streams, key=lambda item: item.get('timestamp', ''), reverse=newest_first)
+    
+    def export(self, segments: int = 4, attributes: Optional[Sequence[str]] = None,
+               filter_expression: Any = None, max_buffered_pages: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Stream every record with a parallel segmented Scan (see parallel_scan)."""
+        for item in parallel_scan(self.table, segments, attributes, filter_expression, max_buffered_pages, self.page_size):
+            yield self._decode(item)
+    
+    def _time_condition(self, condition: Any, start: TimeBound, end: TimeBound) -> Any:
+        start, end = _iso(start), _iso(end)
+        if start and end:
+            return condition & Key('timestamp').between(start, end)
+        if start:
+            return condition & Key('timestamp').gte(start)
+        if end:
+            return condition & Key('timestamp').lte(end)
+        return condition
+    
+    def _query(self, index_name: str, condition: Any, filter_expression: Any,
+               attributes: Optional[Sequence[str]], newest_first: bool) -> Iterator[Dict[str, Any]]:
+        arguments = dict(
+            _projection(attributes),
+            IndexName=index_name,
+            KeyConditionExpression=condition,
+            ScanIndexForward=not newest_first,
+            Limit=self.page_size
+        )
+        if filter_expression is not None:
+            arguments['FilterExpression'] = filter_expression
+        for page in _pages(self.table.query, arguments):
+            for item in page:
+                yield self._decode(item)
+    
+    @staticmethod
+    def _decode(item: Dict[str, Any]) -> Dict[str, Any]:
+        return decode_item(item, THREAT_INTEL_ENCODED_ATTRIBUTES)
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Stream matching records to stdout as JSON lines."""
+    parser = argparse.ArgumentParser(description='Query SecureShield threat intelligence')
+    parser.add_argument('--source-ip', help='Records from this source IP')
+    parser.add_argument('--threat-level', action='append', choices=THREAT_LEVELS, help='Limit to these threat levels')
+    parser.add_argument('--start', help='Earliest timestamp (ISO 8601)')
+    parser.add_argument('--end', help='Latest timestamp (ISO 8601)')
+    parser.add_argument('--attributes', help='Comma-separated attributes to fetch')
+    parser.add_argument('--export', action='store_true', help='Scan the whole table instead of querying')
+    parser.add_argument('--segments', type=int, default=4, help='Parallel scan segments for --export')
+    args = parser.parse_args(argv)
+    
+    attributes = [a.strip() for a in args.attributes.split(',')] if args.attributes else None
+    intel = ThreatIntelQuery()
+    if args.export:
+        items = intel.export(segments=args.segments, attributes=attributes)
+    elif args.source_ip:
+        items = intel.by_source_ip(args.source_ip, args.start, args.end, args.threat_level, attributes)
+    else:
+        items = intel.by_time_range(args.start, args.end, args.threat_level or THREAT_LEVELS, attributes)
+    
+    for item in items:
+        sys.stdout.write(json.dumps(item, default=str) + '\n')
+
+if __name__ == '__main__':
+    main()
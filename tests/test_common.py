@@ -0,0 +1,543 @@
+"""
+Test file for SecureShield AI shared components
+"""
+
+import base64
+import json
+import pytest
+from unittest.mock import Mock, patch
+from botocore.exceptions import ClientError
+from src.common.aws import ClientRegistry
+from src.common.batch_writer import BatchWriteError, BufferedTableWriter
+from src.common.claim_check import ClaimCheck, ClaimCheckError, LocalBlobStore, S3BlobStore, is_reference
+from src.common.codec import CODEC_RAW, decode_item, decode_value, encode_item, encode_value
+from src.common.events import EventPublisher, slim_event
+from src.common.heavy_hitters import HeavyHitterTracker, SharedHeavyHitters, SpaceSaving, window_buckets
+from src.common.metrics import MetricsSink
+from src.common.records import decode_record, record_identifier
+from src.common.storage import DynamoDBBackend, SQLiteBackend, StorageBackend, create_backend
+
+class TestClientRegistry:
+    """Test cases for the lazy AWS client registry."""
+    
+    def test_lazy_client_created_once_on_first_use(self):
+        """Test that clients are only created when used, then reused."""
+        session = Mock()
+        registry = ClientRegistry(session=session)
+        bedrock = registry.lazy_client('bedrock-runtime', region_name='us-east-1')
+        
+        session.client.assert_not_called()
+        
+        bedrock.invoke_model(modelId='model')
+        bedrock.invoke_model(modelId='model')
+        
+        session.client.assert_called_once_with('bedrock-runtime', region_name='us-east-1', config=registry.config)
+        assert session.client.return_value.invoke_model.call_count == 2
+    
+    def test_tables_share_one_resource(self):
+        """Test that Table objects are cached per name on a single DynamoDB resource."""
+        session = Mock()
+        registry = ClientRegistry(session=session)
+        
+        first = registry.table('threat-intel')
+        again = registry.table('threat-intel')
+        registry.table('attacker-profiles')
+        
+        assert first is again
+        session.resource.assert_called_once()
+        assert session.resource.return_value.Table.call_count == 2
+    
+    def test_config_is_tuned_for_reuse(self):
+        """Test that the default config enables keep-alive and adaptive retries."""
+        config = ClientRegistry().config
+        
+        assert config.tcp_keepalive is True
+        assert config.retries['mode'] == 'adaptive'
+        assert config.max_pool_connections >= 10
+
+class TestBufferedTableWriter:
+    """Test cases for the batched DynamoDB writer."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.table = Mock()
+        self.table.name = 'threat-intel'
+        self.client = self.table.meta.client
+        self.client.batch_write_item.return_value = {'UnprocessedItems': {}}
+    
+    def written_items(self):
+        return [
+            request['PutRequest']['Item']
+            for call in self.client.batch_write_item.call_args_list
+            for request in call[1]['RequestItems']['threat-intel']
+        ]
+    
+    def test_flush_chunks_and_deduplicates(self):
+        """Test that items are written 25 at a time and the last put of a key wins."""
+        writer = BufferedTableWriter(self.table, ('event_id',))
+        for i in range(30):
+            writer.put({'event_id': f'e{i}', 'version': 1})
+        writer.put({'event_id': 'e0', 'version': 2})
+        
+        assert writer.flush() == 30
+        
+        assert [len(c[1]['RequestItems']['threat-intel']) for c in self.client.batch_write_item.call_args_list] == [25, 5]
+        items = {item['event_id']: item for item in self.written_items()}
+        assert len(items) == 30
+        assert items['e0']['version'] == 2
+        assert writer.stats['deduplicated'] == 1
+    
+    @patch('src.common.batch_writer.time.sleep')
+    def test_unprocessed_items_are_retried(self, mock_sleep):
+        """Test that UnprocessedItems are resent until accepted."""
+        leftover = [{'PutRequest': {'Item': {'event_id': 'e1'}}}]
+        self.client.batch_write_item.side_effect = [
+            {'UnprocessedItems': {'threat-intel': leftover}},
+            {'UnprocessedItems': {}}
+        ]
+        writer = BufferedTableWriter(self.table, ('event_id',))
+        writer.put({'event_id': 'e0'})
+        writer.put({'event_id': 'e1'})
+        
+        assert writer.flush() == 2
+        
+        assert self.client.batch_write_item.call_args_list[1][1]['RequestItems'] == {'threat-intel': leftover}
+        assert writer.stats['retries'] == 1
+        mock_sleep.assert_called_once()
+    
+    def test_flushes_near_deadline(self):
+        """Test that a put close to the Lambda deadline is written immediately."""
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 500
+        writer = BufferedTableWriter(self.table, ('event_id',), deadline_margin_ms=1000)
+        writer.watch_deadline(context)
+        
+        writer.put({'event_id': 'e0'})
+        
+        assert writer.pending() == 0
+        assert self.written_items() == [{'event_id': 'e0'}]
+    
+    def test_discard_drops_buffer_and_stops_deadline_watch(self):
+        """Test that discard leaves nothing buffered or scheduled for the next invocation."""
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 60000
+        writer = BufferedTableWriter(self.table, ('event_id',), deadline_margin_ms=1000)
+        writer.watch_deadline(context)
+        writer.put({'event_id': 'e0'})
+        
+        assert writer.discard() == 1
+        
+        assert writer.pending() == 0
+        assert writer._timer is None
+        assert writer.flush() == 0
+        self.client.batch_write_item.assert_not_called()
+    
+    def test_bad_item_only_fails_itself(self):
+        """Test that unserializable and rejected items fail alone and are reported by flush."""
+        def batch_write_item(RequestItems):
+            items = [request['PutRequest']['Item'] for request in RequestItems['threat-intel']]
+            if any(item['event_id'] == 'e3' for item in items):
+                raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Item too large'}}, 'BatchWriteItem')
+            return {'UnprocessedItems': {}}
+        self.client.batch_write_item.side_effect = batch_write_item
+        writer = BufferedTableWriter(self.table, ('event_id',))
+        
+        with pytest.raises(TypeError):
+            writer.put({'event_id': 'e0', 'risk_score': 7.5})
+        for i in range(1, 30):
+            writer.put({'event_id': f'e{i}'})
+        
+        with pytest.raises(BatchWriteError) as error:
+            writer.flush()
+        
+        assert error.value.failed_keys == [('e3',)]
+        assert self.client.batch_write_item.call_count == 1 + 25 + 1
+        assert writer.stats['written'] == 28 and writer.stats['dropped'] == 1
+        assert writer.flush() == 0
+    
+    def test_failures_from_automatic_flushes_reach_the_next_flush(self):
+        """Test that items lost in a size-triggered flush are reported by the handler's flush."""
+        self.client.batch_write_item.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}}, 'BatchWriteItem'
+        )
+        writer = BufferedTableWriter(self.table, ('event_id',), max_buffered_items=2)
+        writer.put({'event_id': 'e0'})
+        writer.put({'event_id': 'e1'})
+        
+        assert writer.pending() == 0
+        with pytest.raises(BatchWriteError) as error:
+            writer.flush()
+        assert sorted(error.value.failed_keys) == [('e0',), ('e1',)]
+    
+    def test_flush_stops_the_deadline_timer(self):
+        """Test that an explicit flush cancels the pending deadline flush."""
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 60000
+        writer = BufferedTableWriter(self.table, ('event_id',))
+        writer.watch_deadline(context)
+        timer = writer._timer
+        
+        writer.close()
+        
+        assert writer._timer is None
+        assert timer.finished.is_set()
+
+class TestStorageBackends:
+    """Test cases for the pluggable storage backends."""
+    
+    def test_backend_selected_by_name(self):
+        """Test that configuration names map to backends and unknown names fail loudly."""
+        assert isinstance(create_backend('dynamodb'), DynamoDBBackend)
+        assert isinstance(create_backend('sqlite'), SQLiteBackend)
+        with pytest.raises(ValueError):
+            create_backend('cassandra')
+        with pytest.raises(TypeError):
+            StorageBackend()
+    
+    def test_sqlite_writer_batches_into_indexed_table(self, tmp_path):
+        """Test that buffered items are written in one transaction and read back by index."""
+        backend = SQLiteBackend(str(tmp_path / 'intel.db'))
+        writer = backend.writer('threat-intel', ('event_id',))
+        items = [
+            {'event_id': 'e1', 'timestamp': '2024-01-01T00:00:02Z', 'source_ip': '203.0.113.9', 'threat_level': 'HIGH',
+             'risk_score': 80, 'patterns_found': encode_value(['root_account_usage'])},
+            {'event_id': 'e2', 'timestamp': '2024-01-01T00:00:01Z', 'source_ip': '203.0.113.9', 'threat_level': 'LOW'},
+            {'event_id': 'e3', 'timestamp': '2024-01-01T00:00:03Z', 'source_ip': '198.51.100.7', 'threat_level': 'HIGH'}
+        ]
+        for item in items:
+            writer.put(item)
+        writer.put(dict(items[0], risk_score=85))
+        
+        assert writer.pending() == 3
+        assert writer.flush() == 3
+        
+        stored = backend.database.get_items('threat-intel', source_ip='203.0.113.9')
+        assert [item['event_id'] for item in stored] == ['e2', 'e1']
+        assert stored[1]['risk_score'] == 85
+        assert decode_item(stored[1], ['patterns_found'])['patterns_found'] == ['root_account_usage']
+        assert len(backend.database.get_items('threat-intel', threat_level='HIGH')) == 2
+        assert backend.database.query('PRAGMA journal_mode')[0][0] == 'wal'
+        backend.close()
+
+class TestAttributeCodec:
+    """Test cases for compressed attribute encoding."""
+    
+    def test_round_trip_compresses_large_values(self):
+        """Test that bulky maps shrink and decode to the same value."""
+        value = {'requestParameters': {'filterSet': {'items': [{'name': 'instance-state', 'value': 'running'}] * 200}}}
+        
+        blob = encode_value(value)
+        
+        assert blob[0] == 1
+        assert len(blob) < len(json.dumps(value)) / 10
+        assert decode_value(blob) == value
+    
+    def test_small_values_stay_uncompressed(self):
+        """Test that short values are stored raw behind the header."""
+        blob = encode_value('scanner')
+        
+        assert blob[1] == CODEC_RAW
+        assert decode_value(blob) == 'scanner'
+    
+    def test_items_keep_key_attributes_plain(self):
+        """Test that only the named attributes are encoded and legacy items decode unchanged."""
+        item = {'event_id': 'e1', 'threat_level': 'HIGH', 'ai_reasoning': 'Brute force from a known scanner'}
+        
+        encoded = encode_item(item, ['ai_reasoning'])
+        
+        assert encoded['event_id'] == 'e1'
+        assert encoded['threat_level'] == 'HIGH'
+        assert isinstance(encoded['ai_reasoning'], bytes)
+        assert decode_item(encoded, ['ai_reasoning']) == item
+        assert decode_item(item, ['ai_reasoning']) == item
+
+class TestMetricsSink:
+    """Test cases for buffered metric emission."""
+    
+    def test_emf_flush_aggregates_per_dimension_set(self, capsys):
+        """Test that counters are summed and distributions keep every value in EMF output."""
+        sink = MetricsSink('Test/Namespace', mode='emf')
+        sink.count('ThreatsDetected', dimensions={'ThreatLevel': 'HIGH'})
+        sink.count('ThreatsDetected', dimensions={'ThreatLevel': 'HIGH'})
+        sink.record('RiskScore', 7, dimensions={'ThreatLevel': 'HIGH'})
+        sink.record('RiskScore', 9, dimensions={'ThreatLevel': 'HIGH'})
+        sink.count('ThreatsDetected', dimensions={'ThreatLevel': 'LOW'})
+        
+        sink.flush()
+        
+        documents = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(documents) == 2
+        high = next(d for d in documents if d['ThreatLevel'] == 'HIGH')
+        assert high['ThreatsDetected'] == 2
+        assert sorted(high['RiskScore']) == [7, 9]
+        directive = high['_aws']['CloudWatchMetrics'][0]
+        assert directive['Namespace'] == 'Test/Namespace'
+        assert directive['Dimensions'] == [['ThreatLevel']]
+        assert sink.pending() == 0
+    
+    def test_emf_splits_large_distributions(self, capsys):
+        """Test that a distribution over 100 values is spread across documents."""
+        sink = MetricsSink('Test/Namespace', mode='emf')
+        for value in range(250):
+            sink.record('Latency', value, unit='Milliseconds')
+        
+        sink.flush()
+        
+        documents = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert [len(d['Latency']) for d in documents] == [100, 100, 50]
+    
+    def test_api_flush_batches_put_metric_data(self):
+        """Test that API mode sends Values/Counts in a single PutMetricData call."""
+        cloudwatch = Mock()
+        sink = MetricsSink('Test/Namespace', mode='api', cloudwatch_client=cloudwatch)
+        for _ in range(50):
+            sink.count('ThreatsDetected', dimensions={'ThreatLevel': 'LOW'})
+            sink.record('RiskScore', 2, dimensions={'ThreatLevel': 'LOW'})
+        sink.record('RiskScore', 3, dimensions={'ThreatLevel': 'LOW'})
+        
+        sink.flush()
+        sink.flush()
+        
+        cloudwatch.put_metric_data.assert_called_once()
+        metric_data = {d['MetricName']: d for d in cloudwatch.put_metric_data.call_args[1]['MetricData']}
+        assert metric_data['ThreatsDetected']['Value'] == 50
+        assert metric_data['RiskScore']['Values'] == [2, 3]
+        assert metric_data['RiskScore']['Counts'] == [50.0, 1.0]
+    
+    def test_flush_errors_are_logged_not_raised(self):
+        """Test that a failing flush does not break the handler."""
+        cloudwatch = Mock()
+        cloudwatch.put_metric_data.side_effect = Exception('throttled')
+        sink = MetricsSink('Test/Namespace', mode='api', cloudwatch_client=cloudwatch)
+        sink.count('ThreatsDetected')
+        
+        sink.flush()
+        
+        assert sink.pending() == 0
+
+class TestEventPublisher:
+    """Test cases for batched EventBridge publishing."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.client = Mock()
+        self.client.put_events.side_effect = lambda Entries: {'FailedEntryCount': 0, 'Entries': [{'EventId': 'x'}] * len(Entries)}
+        self.publisher = EventPublisher(self.client, 'secure-shield.test', max_buffered_entries=100)
+    
+    def test_batches_up_to_ten_entries(self):
+        """Test that entries use the PutEvents field names and go out ten per call."""
+        for i in range(23):
+            self.publisher.publish('Threat Detected', {'n': i})
+        
+        assert self.publisher.flush() == 23
+        
+        sizes = [len(c[1]['Entries']) for c in self.client.put_events.call_args_list]
+        assert sizes == [10, 10, 3]
+        first = self.client.put_events.call_args_list[0][1]['Entries'][0]
+        assert first == {'Source': 'secure-shield.test', 'DetailType': 'Threat Detected', 'Detail': '{"n":0}'}
+    
+    def test_requests_stay_under_size_limit(self):
+        """Test that large entries are split across requests and oversized ones are rejected."""
+        for _ in range(3):
+            assert self.publisher.publish('Threat Detected', {'blob': 'x' * 100 * 1024})
+        assert not self.publisher.publish('Threat Detected', {'blob': 'x' * 300 * 1024})
+        
+        self.publisher.flush()
+        
+        assert [len(c[1]['Entries']) for c in self.client.put_events.call_args_list] == [2, 1]
+        assert self.publisher.stats['oversized'] == 1
+    
+    @patch('src.common.events.time.sleep')
+    def test_only_failed_entries_are_resent(self, mock_sleep):
+        """Test that a partial failure resends just the entries with an ErrorCode."""
+        self.client.put_events.side_effect = [
+            {'FailedEntryCount': 1, 'Entries': [{'EventId': 'a'}, {'ErrorCode': 'ThrottlingException'}, {'EventId': 'c'}]},
+            {'FailedEntryCount': 0, 'Entries': [{'EventId': 'b'}]}
+        ]
+        for name in 'abc':
+            self.publisher.publish('Threat Detected', {'name': name})
+        
+        assert self.publisher.flush() == 3
+        
+        retried = self.client.put_events.call_args_list[1][1]['Entries']
+        assert [json.loads(entry['Detail'])['name'] for entry in retried] == ['b']
+    
+    def test_slim_event_keeps_fields_consumers_read(self):
+        """Test that slimming keeps the envelope and read CloudTrail fields only."""
+        event = {'id': 'evt', 'source': 'aws.ec2', 'detail': {
+            'eventID': 'e1', 'sourceIPAddress': '203.0.113.9', 'eventName': 'RunInstances',
+            'additionalEventData': {'x': 'y' * 1000}, 'tlsDetails': {'tlsVersion': 'TLSv1.2'}
+        }}
+        
+        slim = slim_event(event)
+        
+        assert slim == {'id': 'evt', 'source': 'aws.ec2', 'detail': {
+            'eventID': 'e1', 'sourceIPAddress': '203.0.113.9', 'eventName': 'RunInstances'
+        }}
+
+class TestClaimCheck:
+    """Test cases for claim-check offloading of large payloads."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.large_event = {'id': 'evt', 'detail': {'eventID': 'e1', 'requestParameters': {'policy': 'x' * 8000}}}
+    
+    def test_small_payloads_stay_inline(self, tmp_path):
+        """Test that payloads under the threshold are not offloaded."""
+        checks = ClaimCheck(LocalBlobStore(str(tmp_path)), threshold_bytes=4096)
+        
+        assert checks.offload({'id': 'evt'}) == {'id': 'evt'}
+        assert not list(tmp_path.iterdir())
+    
+    def test_round_trip_is_content_addressed_and_cached(self, tmp_path):
+        """Test that identical payloads share one blob and resolve once per container."""
+        producer = ClaimCheck(LocalBlobStore(str(tmp_path)), threshold_bytes=4096)
+        reference = producer.offload(self.large_event)
+        again = producer.offload(dict(reversed(list(self.large_event.items()))))
+        
+        assert is_reference(reference) and reference == again
+        assert producer.stats['uploads'] == 1
+        assert len(json.dumps(reference)) < 300
+        
+        consumer = ClaimCheck(LocalBlobStore(str(tmp_path)), threshold_bytes=4096)
+        assert consumer.resolve(reference) == self.large_event
+        consumer.resolve(reference)['detail']['requestParameters'] = {}
+        assert consumer.resolve(reference) == self.large_event
+        assert consumer.stats == dict(consumer.stats, fetches=1, hits=2)
+    
+    def test_tampered_blob_is_rejected(self, tmp_path):
+        """Test that a blob whose content does not match the digest is refused."""
+        reference = ClaimCheck(LocalBlobStore(str(tmp_path)), threshold_bytes=4096).offload(self.large_event)
+        reference['claim_check']['sha256'] = '0' * 64
+        
+        with pytest.raises(ClaimCheckError):
+            ClaimCheck(LocalBlobStore(str(tmp_path))).resolve(reference)
+    
+    def test_references_outside_the_configured_store_are_refused(self, tmp_path):
+        """Test that only references into the configured bucket, prefix or directory are resolved."""
+        secret = tmp_path / 'secret.json'
+        secret.write_text('{}')
+        file_reference = {'claim_check': {'uri': f'file://{secret}', 'sha256': '0' * 64, 'bytes': 2}}
+        escaping_reference = {'claim_check': {'uri': f'file://{tmp_path}/blobs/../secret.json', 'sha256': '0' * 64, 'bytes': 2}}
+        client = Mock()
+        s3_checks = ClaimCheck(S3BlobStore('claims-bucket', client=client))
+        
+        with pytest.raises(ClaimCheckError):
+            ClaimCheck().resolve(file_reference)
+        with pytest.raises(ClaimCheckError):
+            s3_checks.resolve(file_reference)
+        with pytest.raises(ClaimCheckError):
+            ClaimCheck(LocalBlobStore(str(tmp_path / 'blobs'))).resolve(escaping_reference)
+        for uri in ('s3://other-bucket/claim-check/ab/abc', 's3://claims-bucket/private/abc'):
+            with pytest.raises(ClaimCheckError):
+                s3_checks.resolve({'claim_check': {'uri': uri, 'sha256': '0' * 64, 'bytes': 2}})
+        client.get_object.assert_not_called()
+    
+    def test_s3_store_uses_prefixed_keys(self):
+        """Test that S3 references point at the uploaded object."""
+        client = Mock()
+        store = S3BlobStore('claims-bucket', client=client)
+        reference = ClaimCheck(store, threshold_bytes=4096).offload(self.large_event)
+        client.get_object.return_value = {'Body': Mock(read=Mock(return_value=client.put_object.call_args[1]['Body']))}
+        
+        assert reference['claim_check']['uri'].startswith('s3://claims-bucket/claim-check/')
+        assert ClaimCheck(store).resolve(reference) == self.large_event
+        assert client.get_object.call_args[1]['Bucket'] == 'claims-bucket'
+
+class TestHeavyHitters:
+    """Test cases for Space-Saving heavy hitters over time buckets."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.now = 1705314000.0  # 2024-01-15T10:20:00Z
+    
+    def test_space_saving_keeps_heavy_hitters_in_bounded_space(self):
+        """Test that the largest keys survive a long tail far larger than the capacity."""
+        summary = SpaceSaving(capacity=20)
+        for i in range(5000):
+            summary.add(f'tail-{i}')
+            if i % 4 == 0:
+                summary.add('scanner')
+            if i % 10 == 0:
+                summary.add('brute-forcer')
+        
+        assert len(summary) == 20
+        top = summary.top(2)
+        assert [key for key, _ in top] == ['scanner', 'brute-forcer']
+        assert top[0][1] - summary.errors['scanner'] <= 1250 <= top[0][1]
+        
+        restored = SpaceSaving.from_dict(json.loads(json.dumps(summary.to_dict())))
+        assert restored.merge(summary).top(1)[0] == ('scanner', 2 * top[0][1])
+    
+    def test_windows_use_a_bounded_number_of_buckets(self):
+        """Test that 5m, 1h and 24h windows map to at most 25 buckets."""
+        assert window_buckets('5m', self.now) == (300, [1705313700, 1705314000])
+        assert window_buckets('1h', self.now)[0] == 300
+        width, starts = window_buckets('24h', self.now)
+        assert width == 3600 and len(starts) == 25
+        with pytest.raises(ValueError):
+            window_buckets(7 * 86400, self.now)
+    
+    def test_local_rolling_windows(self):
+        """Test that older events drop out of short windows but not long ones."""
+        tracker = HeavyHitterTracker(clock=lambda: self.now)
+        for _ in range(5):
+            tracker.record('203.0.113.25', 'arn:aws:iam::123456789012:user/attacker', timestamp=self.now - 2 * 3600)
+        for _ in range(3):
+            tracker.record('198.51.100.7', timestamp=self.now)
+        
+        assert tracker.top_talkers('5m', k=5) == [{'source_ip': '198.51.100.7', 'count': 3}]
+        assert tracker.top_talkers('24h', k=1) == [{'source_ip': '203.0.113.25', 'count': 5}]
+        assert tracker.top_talkers('24h', dimension='principal') == [
+            {'principal': 'arn:aws:iam::123456789012:user/attacker', 'count': 5}
+        ]
+    
+    def test_shared_merge_retries_on_version_conflict_and_queries_in_one_batch(self):
+        """Test that merges are version-conditioned writes and queries read a window's buckets at once."""
+        table = Mock()
+        table.name = 'heavy-hitters'
+        existing = SpaceSaving()
+        existing.add('203.0.113.25', 4)
+        table.get_item.side_effect = [
+            {},
+            {'Item': {'summary': encode_value(existing.to_dict()), 'version': 1}}
+        ]
+        conflict = ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'conflict'}}, 'PutItem')
+        table.put_item.side_effect = [conflict, {}]
+        tracker = HeavyHitterTracker(SharedHeavyHitters(table, resource=Mock()), clock=lambda: self.now)
+        tracker.record('203.0.113.25', timestamp=self.now)
+        
+        with patch('src.common.heavy_hitters.BUCKET_WIDTHS', (300,)):
+            assert tracker.merge_shared(force=True) == 1
+        
+        first, second = [c[1] for c in table.put_item.call_args_list]
+        assert first['ConditionExpression'] == 'attribute_not_exists(bucket_id)'
+        assert second['ConditionExpression'] == 'version = :version'
+        assert second['Item']['version'] == 2
+        stored = decode_value(second['Item']['summary'])
+        assert stored['counts']['203.0.113.25'][0] == 5
+        
+        resource = Mock()
+        resource.batch_get_item.return_value = {'Responses': {'heavy-hitters': [{'summary': second['Item']['summary']}]}}
+        shared = SharedHeavyHitters(table, resource=resource)
+        
+        assert shared.top_talkers('5m', k=10, now=self.now) == [{'source_ip': '203.0.113.25', 'count': 5}]
+        resource.batch_get_item.assert_called_once()
+        assert len(resource.batch_get_item.call_args[1]['RequestItems']['heavy-hitters']['Keys']) == 2
+
+class TestBatchRecords:
+    """Test cases for SQS and Kinesis record decoding."""
+    
+    def test_sqs_and_kinesis_records_decode_alike(self):
+        """Test that both record kinds yield their failure identifier and an EventBridge-shaped event."""
+        cloudtrail = {'eventID': 'evt-1', 'eventName': 'GetObject'}
+        sqs = {'messageId': 'msg-1', 'body': json.dumps({'id': 'e', 'detail': cloudtrail})}
+        kinesis = {'kinesis': {'sequenceNumber': '4959', 'data': base64.b64encode(json.dumps(cloudtrail).encode()).decode()}}
+        
+        assert (record_identifier(sqs), record_identifier(kinesis)) == ('msg-1', '4959')
+        assert decode_record(sqs) == {'id': 'e', 'detail': cloudtrail}
+        # Bare CloudTrail records are wrapped
+        assert decode_record(kinesis) == {'id': 'evt-1', 'detail': cloudtrail}
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,57 @@
+"""
+Test file for SecureShield AI incident response
+"""
+
+import json
+from unittest.mock import Mock, patch
+from src.common.heavy_hitters import SharedHeavyHitters, SpaceSaving
+from src.common.codec import encode_value
+from src.incident_response.lambda_function import IncidentResponseOrchestrator
+
+class TestTopTalkerAlerts:
+    """Test cases for attaching heavy hitters to incident alerts."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        summary = SpaceSaving(capacity=20)
+        summary.add('203.0.113.7', 40)
+        summary.add('198.51.100.2', 5)
+        self.resource = Mock()
+        self.resource.batch_get_item.return_value = {
+            'Responses': {'heavy-hitters': [{'summary': encode_value(summary.to_dict())}]}
+        }
+        table = Mock()
+        table.name = 'heavy-hitters'
+        self.shared = SharedHeavyHitters(table, resource=self.resource)
+        self.original_event = {'detail': {'sourceIPAddress': '203.0.113.7'}}
+    
+    def alert_details(self, mock_alerts):
+        return [json.loads(json.dumps(call[0][1])) for call in mock_alerts.publish.call_args_list]
+    
+    @patch('src.incident_response.lambda_function.alerts')
+    def test_high_alerts_carry_top_talkers(self, mock_alerts):
+        """Test that HIGH and CRITICAL alerts include the current top talkers, read once per merge interval."""
+        orchestrator = IncidentResponseOrchestrator()
+        
+        with patch('src.common.heavy_hitters.get_shared', return_value=self.shared):
+            orchestrator.execute_response({'threat_level': 'HIGH'}, self.original_event)
+            orchestrator.execute_response({'threat_level': 'CRITICAL'}, self.original_event)
+            orchestrator.execute_response({'threat_level': 'LOW'}, self.original_event)
+        
+        high, critical, low = self.alert_details(mock_alerts)
+        assert high['top_talkers'][0] == {'source_ip': '203.0.113.7', 'count': 40}
+        assert critical['top_talkers'] == high['top_talkers']
+        assert 'top_talkers' not in low
+        self.resource.batch_get_item.assert_called_once()
+    
+    @patch('src.incident_response.lambda_function.alerts')
+    def test_alert_is_sent_without_top_talkers_when_unavailable(self, mock_alerts):
+        """Test that an unreadable or unconfigured heavy-hitter table does not hold up the alert."""
+        self.resource.batch_get_item.side_effect = Exception('throttled')
+        
+        with patch('src.common.heavy_hitters.get_shared', return_value=self.shared):
+            IncidentResponseOrchestrator().execute_response({'threat_level': 'HIGH'}, self.original_event)
+        with patch('src.common.heavy_hitters.get_shared', return_value=None):
+            IncidentResponseOrchestrator().execute_response({'threat_level': 'HIGH'}, self.original_event)
+        
+        assert [('top_talkers' in detail) for detail in self.alert_details(mock_alerts)] == [False, False]
@@ -0,0 +1,747 @@
+"""
+Test file for SecureShield AI Intelligence Collector
+"""
+
+import json
+import threading
+import time
+import pytest
+from decimal import Decimal
+from unittest.mock import Mock, patch
+from botocore.exceptions import ClientError
+from src.intel_collector.features import attack_feature_frame, attack_patterns, attack_patterns_batch
+from src.intel_collector.deep_analysis import DeepAnalysisQueue, DeepAnalysisWorker, LocalJobQueue, SQSJobQueue, get_queue
+from src.intel_collector.lambda_function import IntelligenceCollector, batch_handler, deep_analysis_worker_handler, get_collector
+from src.intel_collector.profile_cache import ProfileCache
+from src.intel_collector.sessions import Sessionizer, kill_chain_mask
+from src.intel_collector.sketches import CountMinSketch, HyperLogLog, ProfileSketches
+from src.common.batch_writer import BufferedTableWriter
+from src.common.claim_check import ClaimCheck, LocalBlobStore
+from src.common.storage import SQLiteBackend
+from src.intel_collector.profiles import (
+    SKETCH_MERGE_ATTEMPTS, ProfileDelta, ProfileStore, SQLiteProfileStore, normalize_profile, open_profile_store
+)
+
+class TestAttackerProfiles:
+    """Test cases for atomic attacker profile updates."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.event_details = {
+            'source_ip': '203.0.113.25',
+            'event_time': '2024-01-15T10:30:00Z'
+        }
+        self.attack_patterns = {'attack_vectors': ['reconnaissance'], 'tools_used': ['sqlmap']}
+        self.table = Mock()
+        self.table.update_item.return_value = {'Attributes': {
+            'source_ip': '203.0.113.25',
+            'attack_count': Decimal('4'),
+            'attack_vectors': {'reconnaissance'},
+            'tools_used': {'sqlmap'}
+        }}
+        self.table.get_item.return_value = {}
+    
+    def test_single_update_item_with_add_and_conditional_first_seen(self):
+        """Test that a profile update is one UpdateItem with ADD counters and sets."""
+        profile = ProfileStore(self.table).apply(ProfileDelta.from_event(self.event_details, self.attack_patterns, 'HIGH'))
+        
+        self.table.update_item.assert_called_once()
+        self.table.get_item.assert_not_called()
+        self.table.put_item.assert_not_called()
+        arguments = self.table.update_item.call_args[1]
+        # 10:30 on Monday is hour-of-week bucket 10
+        assert arguments['UpdateExpression'] == (
+            'ADD attack_count :attack_count, attack_vectors :attack_vectors, tools_used :tools_used, '
+            'threat_levels :threat_levels, hw_10 :hw_10 SET first_seen = if_not_exists(first_seen, :first_seen), '
+            'last_activity = :last_activity'
+        )
+        assert 'ConditionExpression' not in arguments
+        assert arguments['ExpressionAttributeValues'][':tools_used'] == {'sqlmap'}
+        assert arguments['ReturnValues'] == 'ALL_NEW'
+        assert profile['attack_count'] == 4
+        assert profile['tools_used'] == ['sqlmap']
+        json.dumps(profile)
+    
+    def test_empty_sets_are_not_added(self):
+        """Test that empty string sets are left out of the expression."""
+        arguments = ProfileDelta.from_event(self.event_details, {}).update_arguments()
+        
+        assert arguments['UpdateExpression'].startswith('ADD attack_count :attack_count, hw_10 :hw_10 SET')
+        assert ':attack_vectors' not in arguments['ExpressionAttributeValues']
+    
+    def test_legacy_list_attributes_are_migrated(self):
+        """Test that profiles written as lists by the old code are converted and the update retried."""
+        validation_error = ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Type mismatch'}}, 'UpdateItem')
+        self.table.update_item.side_effect = [validation_error, {}, {}, {}, self.table.update_item.return_value]
+        self.table.get_item.return_value = {'Item': {
+            'source_ip': '203.0.113.25',
+            'attack_vectors': ['reconnaissance'],
+            'tools_used': [],
+            'threat_levels': []
+        }}
+        
+        profile = ProfileStore(self.table).apply(ProfileDelta.from_event(self.event_details, self.attack_patterns))
+        
+        migrations = [c[1] for c in self.table.update_item.call_args_list[1:4]]
+        assert migrations[0]['UpdateExpression'] == 'SET attack_vectors = :members'
+        assert migrations[0]['ExpressionAttributeValues'][':members'] == {'reconnaissance'}
+        assert migrations[1]['UpdateExpression'] == 'REMOVE tools_used'
+        assert migrations[2]['UpdateExpression'] == 'REMOVE threat_levels'
+        assert self.table.update_item.call_count == 5
+        assert profile['attack_count'] == 4
+    
+    def test_merge_keeps_earliest_first_seen_and_latest_activity(self):
+        """Test that merged deltas sum counts and widen the activity window."""
+        delta = ProfileDelta.from_event(dict(self.event_details, event_time='2024-01-15T10:31:00Z'), self.attack_patterns)
+        delta.merge(ProfileDelta.from_event(self.event_details, {'tools_used': ['nmap']}))
+        
+        assert delta.attack_count == 2
+        assert delta.tools_used == {'sqlmap', 'nmap'}
+        assert delta.first_seen == '2024-01-15T10:30:00Z'
+        assert delta.last_activity == '2024-01-15T10:31:00Z'
+
+class TestBatchFeatures:
+    """Test cases for vectorized attack pattern extraction."""
+    
+    def test_batch_matches_scalar_path(self):
+        """Test that every event gets exactly the patterns the per-event path produces."""
+        events = []
+        for name in ['DescribeInstances', 'GetObject', 'PutBucketPolicy', 'CreateUser', 'ListBuckets', None]:
+            for agent in ['aws-cli/2.0', 'sqlmap/1.7 (nmap)', 'METASPLOIT', None]:
+                for event_time in ['2024-01-15T10:30:00Z', '2024-03-02T23:59:59.5+05:30', '2024-06-09T05:00:00',
+                                   '2024-01-15 03:10:00', None]:
+                    events.append({
+                        'event_name': name, 'user_agent': agent, 'event_time': event_time,
+                        'error_code': 'AccessDenied' if len(events) % 3 == 0 else None,
+                        'resources': [{}] * (len(events) % 8)
+                    })
+        
+        assert attack_patterns_batch(events) == [attack_patterns(event) for event in events]
+    
+    def test_feature_frame_columns(self):
+        """Test the columnar features for one event."""
+        frame = attack_feature_frame([{'event_name': 'GetUser', 'user_agent': 'sqlmap/1.7', 'event_time': '2024-01-14T02:00:00Z'}])
+        row = frame.iloc[0]
+        
+        assert row['vector_data_access'] and not row['vector_reconnaissance']
+        assert row['tool_sqlmap'] and not row['tool_nmap']
+        assert (row['hour'], row['day_of_week'], row['is_off_hours']) == (2, 6, True)
+    
+    def test_invalid_time_fails_like_scalar_path(self):
+        """Test that an impossible date raises instead of producing features."""
+        with pytest.raises(ValueError):
+            attack_patterns_batch([{'event_time': '2024-13-01T00:00:00Z'}])
+
+class TestSessionizer:
+    """Test cases for streaming attacker sessionization."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.sessionizer = Sessionizer(gap_seconds=600, tolerance_seconds=60, max_keys=3)
+    
+    def event(self, event_time, source_ip='203.0.113.25', event_name='DescribeInstances', error_code=None):
+        return {
+            'source_ip': source_ip,
+            'event_time': event_time,
+            'event_name': event_name,
+            'error_code': error_code,
+            'user_identity': {'arn': 'arn:aws:iam::123456789012:user/attacker'}
+        }
+    
+    def test_gap_splits_sessions_and_summarizes(self):
+        """Test that inactivity longer than the gap closes the session with its summary."""
+        assert self.sessionizer.add(self.event('2024-01-15T10:00:00Z')) == []
+        self.sessionizer.add(self.event('2024-01-15T10:02:00Z', event_name='GetSecretValue', error_code='AccessDenied'))
+        self.sessionizer.add(self.event('2024-01-15T10:04:00Z', event_name='StopLogging'))
+        
+        closed = self.sessionizer.add(self.event('2024-01-15T11:00:00Z'))
+        
+        assert len(closed) == 1
+        summary = closed[0]
+        assert summary['principal'] == 'arn:aws:iam::123456789012:user/attacker'
+        assert summary['duration_seconds'] == 240
+        assert summary['event_count'] == 3
+        assert summary['events_per_minute'] == pytest.approx(0.75)
+        assert summary['distinct_apis'] == 3
+        assert summary['error_ratio'] == pytest.approx(1 / 3)
+        assert summary['kill_chain_stages'] == ['reconnaissance', 'credential_access', 'defense_evasion']
+        assert summary['close_reason'] == 'gap'
+        assert len(self.sessionizer) == 1
+    
+    def test_out_of_order_events_within_tolerance(self):
+        """Test that late events inside the tolerance join their session and older ones are dropped."""
+        self.sessionizer.add(self.event('2024-01-15T10:00:00Z', source_ip='198.51.100.7'))
+        self.sessionizer.add(self.event('2024-01-15T10:20:00Z'))
+        self.sessionizer.add(self.event('2024-01-15T10:19:30Z'))
+        # Older than the watermark with no open session for this key
+        self.sessionizer.add(self.event('2024-01-15T09:00:00Z', source_ip='192.0.2.1'))
+        
+        closed = self.sessionizer.flush()
+        
+        by_ip = {summary['source_ip']: summary for summary in closed}
+        assert by_ip['203.0.113.25']['event_count'] == 2
+        assert by_ip['203.0.113.25']['start'] == '2024-01-15T10:19:30+00:00'
+        assert '192.0.2.1' not in by_ip
+        assert self.sessionizer.stats['late'] == 1
+    
+    def test_idle_sessions_expire_and_state_is_bounded(self):
+        """Test that idle sessions close as event time advances and max_keys evicts the stalest."""
+        for index in range(4):
+            self.sessionizer.add(self.event('2024-01-15T10:00:00Z', source_ip=f'192.0.2.{index}'))
+        
+        assert len(self.sessionizer) == 3
+        assert self.sessionizer.stats['evicted'] == 1
+        
+        closed = self.sessionizer.add(self.event('2024-01-15T12:00:00Z', source_ip='198.51.100.7'))
+        
+        assert {summary['source_ip'] for summary in closed} == {'192.0.2.1', '192.0.2.2', '192.0.2.3'}
+        assert len(self.sessionizer) == 1
+    
+    def test_expiry_follows_session_end_not_last_update(self):
+        """Test that a session updated by an out-of-order event still expires by its end time."""
+        self.sessionizer.add(self.event('2024-01-15T10:00:00Z'))
+        self.sessionizer.add(self.event('2024-01-15T10:05:00Z', source_ip='198.51.100.7'))
+        # Most recently updated, but still ends before the other session
+        self.sessionizer.add(self.event('2024-01-15T10:04:30Z'))
+        
+        closed = self.sessionizer.add(self.event('2024-01-15T10:15:45Z', source_ip='192.0.2.1'))
+        
+        assert [summary['source_ip'] for summary in closed] == ['203.0.113.25']
+        assert closed[0]['end'] == '2024-01-15T10:04:30+00:00'
+        assert len(self.sessionizer) == 2
+    
+    def test_kill_chain_mask(self):
+        """Test that API names map to kill-chain stage bits."""
+        assert kill_chain_mask('ListBuckets') == 1
+        assert kill_chain_mask('AssumeRoleWithWebIdentity') == 4
+        assert kill_chain_mask('ConsoleLogin') == 0
+
+class TestProfileSketches:
+    """Test cases for fixed-size mergeable profile sketches."""
+    
+    def event(self, index):
+        return {
+            'source_ip': '203.0.113.25',
+            'event_name': f'Api{index % 40}',
+            'event_time': '2024-01-15T10:30:00+02:00',
+            'resources': [{'ARN': f'arn:aws:s3:::bucket-{index}'}]
+        }
+    
+    def test_estimates_and_merge(self):
+        """Test that HyperLogLog and count-min estimates hold up after merging serialized halves."""
+        first, second = HyperLogLog(), HyperLogLog()
+        first.update(f'key-{i}' for i in range(6000))
+        second.update(f'key-{i}' for i in range(4000, 10000))
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        
+        assert abs(merged.estimate() - 10000) < 500
+        
+        sketch = CountMinSketch()
+        for i in range(3000):
+            sketch.add(f'Api{i % 30}')
+        sketch.add('GetSecretValue', 7)
+        restored = CountMinSketch.from_bytes(sketch.to_bytes())
+        
+        assert restored.estimate('GetSecretValue') >= 7
+        assert restored.estimate('Api3') >= 100
+    
+    def test_profile_size_is_constant(self):
+        """Test that serialized sketches do not grow with the number of events."""
+        small = ProfileDelta.from_event(self.event(0), {})
+        large = ProfileDelta.from_event(self.event(0), {})
+        for index in range(1, 2000):
+            large.merge(ProfileDelta.from_event(self.event(index), {}))
+        
+        sketches = large.sketches()
+        sizes = {name: len(data) for name, data in small.sketches().attribute_values().items()}
+        assert {name: len(data) for name, data in sketches.attribute_values().items()} == sizes
+        assert sum(sizes.values()) < 8 * 1024
+        assert sketches.api_frequency('Api7') >= 50
+        # 10:30 at +02:00 is Monday 08:00 UTC
+        assert sketches.hour_of_week()[8] == 2000
+        summary = sketches.summary()
+        assert abs(summary['distinct_apis'] - 40) <= 2
+        assert abs(summary['distinct_resources'] - 2000) < 120
+    
+    def test_frequencies_and_hours_are_added_in_the_single_update(self):
+        """Test that count-min cells and hour-of-week buckets are ADDed and read back as sketches."""
+        delta = ProfileDelta.from_event(self.event(1), {}).merge(ProfileDelta.from_event(self.event(41), {}))
+        arguments = delta.update_arguments()
+        counters = {name[1:]: value for name, value in arguments['ExpressionAttributeValues'].items()
+                    if name.startswith((':cm_', ':hw_'))}
+        
+        assert 'api_frequency_sketch' not in arguments['UpdateExpression']
+        assert all(f'{name} :{name}' in arguments['UpdateExpression'].split(' SET ')[0] for name in counters)
+        # Four count-min rows for the one API called twice, one hour bucket
+        assert sorted(counters.values()) == [2, 2, 2, 2, 2]
+        
+        sketches = ProfileSketches.from_item({name: Decimal(value) for name, value in counters.items()})
+        assert sketches.api_frequency('Api1') == 2
+        assert sketches.hour_of_week()[8] == 2
+        profile = normalize_profile({'source_ip': '203.0.113.25', **{name: Decimal(value) for name, value in counters.items()}})
+        assert not any(name.startswith(('cm_', 'hw_')) for name in profile)
+        assert ProfileSketches.from_item(profile).api_frequency('Api1') == 2
+    
+    def test_distinct_registers_are_written_only_when_they_change(self):
+        """Test that HyperLogLog registers already covering the delta cost no second request."""
+        delta = ProfileDelta.from_event(self.event(1), {})
+        covered = delta.sketches().distinct().attribute_values()
+        table = Mock()
+        table.update_item.return_value = {'Attributes': {'source_ip': '203.0.113.25', 'attack_count': Decimal('3'), **covered}}
+        
+        profile = ProfileStore(table).apply(delta)
+        
+        table.update_item.assert_called_once()
+        table.get_item.assert_not_called()
+        assert profile['distinct_apis'] == 1
+    
+    def test_distinct_merge_retries_on_conflict(self):
+        """Test that changed registers are written conditionally and re-merged from a fresh read after a conflict."""
+        table = Mock()
+        stored = ProfileSketches().observe({'ListBuckets': 1}).distinct().attribute_values()
+        conflict = ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'conflict'}}, 'UpdateItem')
+        merged = ProfileSketches().observe({'ListBuckets': 1, 'Api1': 1}, ['arn:aws:s3:::bucket-1']).distinct()
+        table.update_item.side_effect = [
+            {'Attributes': {'source_ip': '203.0.113.25', 'attack_count': Decimal('1')}},
+            conflict,
+            {'Attributes': {'source_ip': '203.0.113.25', 'attack_count': Decimal('2'), **merged.attribute_values()}}
+        ]
+        table.get_item.return_value = {'Item': {'source_ip': '203.0.113.25', 'attack_count': Decimal('2'), **stored}}
+        
+        profile = ProfileStore(table).apply(ProfileDelta.from_event(self.event(1), {}))
+        
+        counters, first_try, second_try = [c[1] for c in table.update_item.call_args_list]
+        assert counters['UpdateExpression'].startswith('ADD attack_count :attack_count')
+        assert first_try['ConditionExpression'] == (
+            'attribute_not_exists(api_distinct_sketch) AND attribute_not_exists(resource_distinct_sketch)'
+        )
+        assert 'api_distinct_sketch = :previous_api_distinct_sketch' in second_try['ConditionExpression']
+        assert 'attack_count' not in second_try['UpdateExpression']
+        written = ProfileSketches.from_item({'api_distinct_sketch': second_try['ExpressionAttributeValues'][':api_distinct_sketch']})
+        assert written.summary()['distinct_apis'] == 2
+        assert profile['distinct_apis'] == 2
+        json.dumps(profile)
+    
+    def test_abandoned_distinct_merge_keeps_the_counters(self):
+        """Test that a merge that keeps conflicting gives up without failing the counter update."""
+        table = Mock()
+        conflict = ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'conflict'}}, 'UpdateItem')
+        table.update_item.side_effect = [{'Attributes': {'source_ip': '203.0.113.25', 'attack_count': Decimal('1')}}] + \
+            [conflict] * SKETCH_MERGE_ATTEMPTS
+        table.get_item.return_value = {'Item': {'source_ip': '203.0.113.25', 'attack_count': Decimal('1')}}
+        cache = ProfileCache(ProfileStore(table), max_pending=None, max_age_seconds=None)
+        cache.record(ProfileDelta.from_event(self.event(1), {}))
+        
+        assert cache.flush() == 1
+        
+        assert table.update_item.call_count == 1 + SKETCH_MERGE_ATTEMPTS
+        assert sum('ADD attack_count' in c[1]['UpdateExpression'] for c in table.update_item.call_args_list) == 1
+        assert cache.pending() == 0
+    
+    def test_sqlite_profiles_merge_sketches_in_process(self, tmp_path):
+        """Test that the SQLite store keeps sketches as base64 and merges them on every delta."""
+        backend = SQLiteBackend(str(tmp_path / 'profiles.db'))
+        store = open_profile_store(backend, 'attacker-profiles')
+        for index in range(50):
+            profile = store.apply(ProfileDelta.from_event(self.event(index), {}))
+        
+        assert abs(profile['distinct_apis'] - 40) <= 2
+        assert abs(profile['distinct_resources'] - 50) <= 2
+        assert ProfileSketches.from_item(store.get('203.0.113.25')).api_frequency('Api1') >= 2
+        backend.close()
+
+class TestSQLiteProfileStore:
+    """Test cases for attacker profiles in the embedded SQLite backend."""
+    
+    def test_deltas_accumulate_like_update_item(self, tmp_path):
+        """Test that counts add, sets union and first_seen is kept from the first write."""
+        backend = SQLiteBackend(str(tmp_path / 'profiles.db'))
+        store = open_profile_store(backend, 'attacker-profiles')
+        assert isinstance(store, SQLiteProfileStore)
+        
+        store.apply(ProfileDelta('203.0.113.9', 2, ['brute_force'], [], ['LOW'], '2024-01-01T00:00:00Z', '2024-01-01T00:00:00Z'))
+        profile = store.apply(ProfileDelta('203.0.113.9', 1, ['sql_injection'], ['sqlmap'], ['HIGH'],
+                                           '2024-01-02T00:00:00Z', '2024-01-02T00:00:00Z'))
+        
+        assert profile['attack_count'] == 3
+        assert profile['attack_vectors'] == ['brute_force', 'sql_injection']
+        assert profile['threat_levels'] == ['HIGH', 'LOW']
+        assert profile['first_seen'] == '2024-01-01T00:00:00Z'
+        assert profile['last_activity'] == '2024-01-02T00:00:00Z'
+        assert store.get('203.0.113.9') == profile
+        assert store.get('198.51.100.7') is None
+        backend.close()
+
+class TestProfileCache:
+    """Test cases for the write-behind profile cache."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.store = Mock()
+        self.store.apply.side_effect = lambda delta: delta.as_profile()
+        self.store.get.return_value = {
+            'source_ip': '203.0.113.25',
+            'first_seen': '2024-01-01T00:00:00Z',
+            'attack_count': 10,
+            'attack_vectors': ['reconnaissance'],
+            'tools_used': [],
+            'threat_levels': ['LOW']
+        }
+    
+    def delta(self, source_ip='203.0.113.25', tool='sqlmap'):
+        return ProfileDelta.from_event(
+            {'source_ip': source_ip, 'event_time': '2024-01-15T10:30:00Z'},
+            {'attack_vectors': ['data_access'], 'tools_used': [tool]},
+            'HIGH'
+        )
+    
+    def test_coalesces_deltas_per_ip(self):
+        """Test that many events from one IP become a single write."""
+        cache = ProfileCache(self.store)
+        for _ in range(100):
+            cache.record(self.delta())
+        cache.record(self.delta(source_ip='198.51.100.7'))
+        
+        assert cache.flush() == 2
+        
+        written = {c[0][0].source_ip: c[0][0] for c in self.store.apply.call_args_list}
+        assert written['203.0.113.25'].attack_count == 100
+        assert cache.stats['coalesced'] == 99
+    
+    def test_read_through_overlays_pending_updates(self):
+        """Test that lookups read DynamoDB once and include unwritten deltas."""
+        cache = ProfileCache(self.store)
+        cache.record(self.delta())
+        
+        profile = cache.get('203.0.113.25')
+        again = cache.get('203.0.113.25')
+        
+        self.store.get.assert_called_once_with('203.0.113.25')
+        self.store.apply.assert_not_called()
+        assert profile == again
+        assert profile['attack_count'] == 11
+        assert profile['first_seen'] == '2024-01-01T00:00:00Z'
+        assert profile['attack_vectors'] == ['data_access', 'reconnaissance']
+        assert profile['threat_levels'] == ['HIGH', 'LOW']
+    
+    def test_record_does_not_read_on_a_miss(self):
+        """Test that recording for an uncached IP returns the pending totals without a store read."""
+        cache = ProfileCache(self.store)
+        
+        cache.record(self.delta())
+        pending = cache.record(self.delta())
+        
+        self.store.get.assert_not_called()
+        assert pending['attack_count'] == 2
+        assert cache.get('203.0.113.25')['attack_count'] == 12
+    
+    def test_profile_errors_do_not_fail_collection(self):
+        """Test that a failing profile cache is logged and collection carries on with an empty profile."""
+        collector = Mock(profile_cache=Mock(), _bulk_cache=None)
+        collector.profile_cache.record.side_effect = RuntimeError('boom')
+        
+        profile = IntelligenceCollector._update_attacker_profile(
+            collector, {'source_ip': '203.0.113.25', 'event_time': '2024-01-15T10:30:00Z'}, {}
+        )
+        
+        assert profile == {}
+    
+    def test_flushes_on_size_and_age(self):
+        """Test that pending deltas are written when too many IPs or too much time has accumulated."""
+        cache = ProfileCache(self.store, max_pending=2, max_age_seconds=None)
+        cache.record(self.delta(source_ip='192.0.2.1'))
+        assert self.store.apply.call_count == 0
+        cache.record(self.delta(source_ip='192.0.2.2'))
+        assert self.store.apply.call_count == 2
+        
+        cache = ProfileCache(self.store, max_pending=None, max_age_seconds=30)
+        with patch('src.intel_collector.profile_cache.time.monotonic', return_value=100.0) as monotonic:
+            cache.record(self.delta(source_ip='192.0.2.3'))
+            monotonic.return_value = 131.0
+            cache.record(self.delta(source_ip='192.0.2.4'))
+        assert cache.pending() == 0
+    
+    def test_failed_writes_are_kept_for_the_next_flush(self):
+        """Test that a throttled write does not lose the coalesced counts."""
+        self.store.apply.side_effect = [Exception('throttled'), self.delta().as_profile()]
+        cache = ProfileCache(self.store)
+        cache.record(self.delta())
+        cache.record(self.delta())
+        
+        assert cache.flush() == 0
+        assert cache.pending() == 1
+        assert cache.flush() == 1
+        assert self.store.apply.call_args[0][0].attack_count == 2
+
+class TestDeepAnalysisQueue:
+    """Test cases for the prioritized deep-analysis queue and its worker."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.clock = Mock(return_value=1000.0)
+        self.backend = LocalJobQueue(max_attempts=2)
+        self.queue = DeepAnalysisQueue(self.backend, dedup_seconds=300, clock=self.clock)
+    
+    def submit(self, source_ip, threat_level, risk_score=5, event_time='2024-01-15T10:30:00Z'):
+        return self.queue.submit(
+            {'source_ip': source_ip, 'event_time': event_time, 'event_name': 'GetSecretValue'},
+            {'threat_level': threat_level, 'risk_score': risk_score}
+        )
+    
+    def test_priority_order_and_per_ip_dedup(self):
+        """Test that jobs come out by level, risk and recency, with repeats per IP dropped unless they escalate."""
+        self.submit('203.0.113.1', 'HIGH', risk_score=5)
+        self.submit('203.0.113.2', 'HIGH', risk_score=9, event_time='2024-01-15T10:00:00Z')
+        self.submit('203.0.113.3', 'HIGH', risk_score=9, event_time='2024-01-15T11:00:00Z')
+        self.submit('203.0.113.4', 'CRITICAL', risk_score=1)
+        assert self.submit('203.0.113.1', 'HIGH', risk_score=10) is None
+        assert self.submit('203.0.113.1', 'CRITICAL', risk_score=2) is not None
+        self.clock.return_value = 1400.0
+        assert self.submit('203.0.113.4', 'CRITICAL') is not None
+        
+        order = [(job['source_ip'], job['threat_level']) for job, _ in self.backend.receive(10)]
+        
+        assert order == [
+            ('203.0.113.4', 'CRITICAL'), ('203.0.113.1', 'CRITICAL'), ('203.0.113.4', 'CRITICAL'),
+            ('203.0.113.3', 'HIGH'), ('203.0.113.2', 'HIGH'), ('203.0.113.1', 'HIGH')
+        ]
+        assert self.queue.stats['deduplicated'] == 1
+    
+    def test_local_queue_drops_least_urgent_when_full(self):
+        """Test that a full local queue keeps the most urgent jobs."""
+        backend = LocalJobQueue(max_pending=2)
+        queue = DeepAnalysisQueue(backend)
+        queue.submit({'source_ip': '203.0.113.1'}, {'threat_level': 'CRITICAL'})
+        queue.submit({'source_ip': '203.0.113.2'}, {'threat_level': 'HIGH', 'risk_score': 3})
+        
+        assert queue.submit({'source_ip': '203.0.113.3'}, {'threat_level': 'HIGH', 'risk_score': 1}) is None
+        assert queue.submit({'source_ip': '203.0.113.4'}, {'threat_level': 'CRITICAL'}) is not None
+        assert sorted(job['source_ip'] for job, _ in backend.receive(5)) == ['203.0.113.1', '203.0.113.4']
+    
+    def test_worker_bounds_concurrency_and_handles_failures_and_timeouts(self):
+        """Test that the worker runs jobs most urgent first, retries failures and abandons overruns."""
+        for index in range(6):
+            self.submit(f'198.51.100.{index}', 'HIGH', risk_score=index)
+        self.submit('203.0.113.9', 'CRITICAL')
+        running = []
+        peak = []
+        order = []
+        slow_attempts = []
+        lock = threading.Lock()
+        
+        def analyze(job, deadline):
+            with lock:
+                order.append(job['source_ip'])
+                running.append(job['source_ip'])
+                peak.append(len(running))
+            try:
+                if job['source_ip'] == '198.51.100.0':
+                    raise RuntimeError('analysis failed')
+                if job['source_ip'] == '198.51.100.1' and not slow_attempts:
+                    slow_attempts.append(job['job_id'])
+                    time.sleep(max(0.0, deadline - time.monotonic()) + 0.2)
+            finally:
+                with lock:
+                    running.remove(job['source_ip'])
+        
+        worker = DeepAnalysisWorker(self.backend, analyze, concurrency=2, job_timeout_seconds=0.3)
+        counts = worker.run()
+        
+        assert order[0] == '203.0.113.9'
+        assert max(peak) <= 2
+        # The failing job is retried once before it is abandoned; the overrunning job succeeds on its retry
+        assert counts == {'completed': 6, 'failed': 2, 'timed_out': 1}
+        assert len(self.backend) == 0
+    
+    def test_sqs_queue_batches_sends_and_receives_critical_first(self):
+        """Test that SQS jobs are sent in batches per level queue and received by level."""
+        client = Mock()
+        client.send_message_batch.return_value = {'Failed': []}
+        urls = {'HIGH': 'https://sqs/high', 'CRITICAL': 'https://sqs/critical.fifo'}
+        backend = SQSJobQueue(urls, client=client)
+        queue = DeepAnalysisQueue(backend)
+        for index in range(12):
+            queue.submit({'source_ip': f'198.51.100.{index}'}, {'threat_level': 'HIGH'})
+        queue.submit({'source_ip': '203.0.113.9'}, {'threat_level': 'CRITICAL'})
+        
+        client.send_message_batch.assert_not_called()
+        assert backend.flush() == 13
+        
+        batches = {(c[1]['QueueUrl'], len(c[1]['Entries'])) for c in client.send_message_batch.call_args_list}
+        assert batches == {('https://sqs/high', 10), ('https://sqs/high', 2), ('https://sqs/critical.fifo', 1)}
+        critical_entry = [c[1]['Entries'][0] for c in client.send_message_batch.call_args_list
+                          if c[1]['QueueUrl'].endswith('.fifo')][0]
+        assert critical_entry['MessageGroupId'] == '203.0.113.9'
+        
+        critical_job = json.loads(critical_entry['MessageBody'])
+        client.receive_message.side_effect = [
+            {'Messages': [{'Body': json.dumps(critical_job), 'ReceiptHandle': 'r-1'}]},
+            {'Messages': [{'Body': json.dumps(critical_job), 'ReceiptHandle': 'r-2',
+                           'Attributes': {'ApproximateReceiveCount': '3'}}]}
+        ]
+        received = backend.receive(5)
+        
+        assert [c[1]['QueueUrl'] for c in client.receive_message.call_args_list] == [
+            'https://sqs/critical.fifo', 'https://sqs/high'
+        ]
+        assert client.receive_message.call_args[1]['AttributeNames'] == ['ApproximateReceiveCount']
+        (_, first_receipt), (_, retried_receipt) = received
+        backend.ack(first_receipt)
+        client.delete_message.assert_called_once_with(QueueUrl='https://sqs/critical.fifo', ReceiptHandle='r-1')
+        backend.nack(retried_receipt)
+        assert client.change_message_visibility.call_args[1]['VisibilityTimeout'] == backend.retry_delay(3)
+    
+    def test_sqs_retries_back_off_and_oversized_jobs_are_rejected(self, tmp_path):
+        """Test that failed SQS jobs stay hidden longer on each receive and large events are claim-checked."""
+        client = Mock()
+        backend = SQSJobQueue({'HIGH': 'https://sqs/high'}, client=client, retry_base_seconds=30, retry_max_seconds=600)
+        
+        for receive_count, delay in [(1, 30), (3, 120), (10, 600)]:
+            backend.nack(('https://sqs/high', f'r-{receive_count}', receive_count))
+            assert client.change_message_visibility.call_args[1]['VisibilityTimeout'] == delay
+        
+        event_details = {'source_ip': '203.0.113.9', 'request_parameters': {'policy': 'x' * 300000}}
+        assert DeepAnalysisQueue(backend).submit(event_details, {'threat_level': 'HIGH'}) is None
+        assert backend.stats['oversized'] == 1
+        
+        with patch('src.common.claim_check.get_claim_check', return_value=ClaimCheck(LocalBlobStore(str(tmp_path)))):
+            assert DeepAnalysisQueue(backend).submit(event_details, {'threat_level': 'HIGH'}) is not None
+        assert backend.stats['submitted'] == 1
+    
+    def test_collector_skips_jobs_in_lambda_without_queue_urls(self):
+        """Test that a deployed collector without SQS queue URLs counts skipped jobs instead of queueing them in memory."""
+        get_collector.cache_clear()
+        get_queue.cache_clear()
+        try:
+            with patch('src.intel_collector.deep_analysis.RUNNING_IN_LAMBDA', True), \
+                    patch('src.intel_collector.lambda_function.aws.table', side_effect=lambda name: Mock()):
+                collector = get_collector()
+            
+            assert collector.deep_analysis is None
+            with patch('src.intel_collector.lambda_function.metrics') as metrics:
+                collector._trigger_deep_analysis({'source_ip': '203.0.113.9'}, {'threat_level': 'HIGH'})
+            metrics.count.assert_called_once_with('DeepAnalysisSkipped', dimensions={'ThreatLevel': 'HIGH'})
+        finally:
+            get_collector.cache_clear()
+            get_queue.cache_clear()
+    
+    def test_worker_refuses_to_run_in_lambda_without_queue_urls(self):
+        """Test that a deployed worker without SQS queue URLs fails instead of draining an empty local heap."""
+        get_queue.cache_clear()
+        try:
+            with patch('src.intel_collector.deep_analysis.RUNNING_IN_LAMBDA', True):
+                with pytest.raises(RuntimeError):
+                    deep_analysis_worker_handler({}, Mock())
+        finally:
+            get_queue.cache_clear()
+    
+    def test_collector_queues_high_threats_for_the_worker_handler(self):
+        """Test that HIGH events are queued without blocking and analyzed by the worker handler."""
+        get_collector.cache_clear()
+        get_queue.cache_clear()
+        tables = {}
+        with patch('src.intel_collector.lambda_function.aws.table', side_effect=lambda name: tables.setdefault(name, Mock())):
+            collector = get_collector()
+        collector.intel_writer = Mock()
+        collector.profiles.table.get_item.return_value = {}
+        original_event = {'detail': {
+            'eventID': 'evt-1', 'eventName': 'GetSecretValue', 'eventTime': '2024-01-15T10:30:00Z',
+            'sourceIPAddress': '203.0.113.25'
+        }}
+        try:
+            for _ in range(3):
+                collector.collect_intelligence({'threat_level': 'HIGH', 'risk_score': 8}, original_event)
+            
+            assert len(collector.deep_analysis.backend) == 1
+            
+            context = Mock()
+            context.get_remaining_time_in_millis.return_value = 120000
+            result = deep_analysis_worker_handler({}, context)
+            
+            assert json.loads(result['body']) == {'completed': 1, 'failed': 0, 'timed_out': 0}
+        finally:
+            get_collector.cache_clear()
+            get_queue.cache_clear()
+
+class TestBulkProfileUpdates:
+    """Test cases for batch collection with merged profile writes."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        get_collector.cache_clear()
+        self.tables = {}
+        
+        def table(name):
+            return self.tables.setdefault(name, Mock(name=name))
+        
+        with patch('src.intel_collector.lambda_function.aws.table', side_effect=table):
+            self.collector = get_collector()
+        self.collector.intel_writer = Mock()
+        self.profiles_table = self.collector.profiles.table
+        self.profiles_table.update_item.return_value = {'Attributes': {}}
+        self.profiles_table.get_item.return_value = {}
+    
+    def teardown_method(self):
+        get_collector.cache_clear()
+    
+    def test_claim_checked_event_is_fetched_for_analysis(self, tmp_path):
+        """Test that an original_event sent as a claim-check reference is resolved before extraction."""
+        original_event = json.loads(self.make_record('msg-0', '203.0.113.25')['body'])['detail']['original_event']
+        original_event['detail']['requestParameters'] = {'policy': 'x' * 8000}
+        checks = ClaimCheck(LocalBlobStore(str(tmp_path)))
+        reference = checks.offload(original_event)
+        
+        with patch('src.common.claim_check.get_claim_check', return_value=checks):
+            details = self.collector._extract_event_details(reference)
+        
+        assert details['source_ip'] == '203.0.113.25'
+        assert details['request_parameters'] == {'policy': 'x' * 8000}
+    
+    def make_record(self, message_id, source_ip):
+        event = {'detail': {
+            'threat_assessment': {'threat_level': 'MEDIUM', 'categories': []},
+            'original_event': {'detail': {
+                'eventID': message_id,
+                'eventName': 'DescribeInstances',
+                'eventTime': '2024-01-15T10:30:00Z',
+                'sourceIPAddress': source_ip,
+                'userAgent': 'sqlmap/1.7'
+            }}
+        }}
+        return {'messageId': message_id, 'body': json.dumps(event)}
+    
+    def test_one_write_per_ip_in_a_batch(self):
+        """Test that updates for the same IP are collapsed into one UpdateItem."""
+        records = [self.make_record(f'msg-{i}', '203.0.113.25') for i in range(3)]
+        records.append(self.make_record('msg-3', '198.51.100.7'))
+        records.append({'messageId': 'msg-4', 'body': 'not-json'})
+        
+        result = batch_handler({'Records': records}, Mock())
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'msg-4'}]}
+        updates = [c[1] for c in self.profiles_table.update_item.call_args_list if c[1]['UpdateExpression'].startswith('ADD')]
+        assert len(updates) == 2
+        counts = {update['Key']['source_ip']: update['ExpressionAttributeValues'][':attack_count'] for update in updates}
+        assert counts == {'203.0.113.25': 3, '198.51.100.7': 1}
+        self.collector.intel_writer.flush.assert_called_once()
+
+    def test_failed_intelligence_writes_are_reported_per_record(self):
+        """Test that a record whose intelligence item cannot be written is reported as a batch failure."""
+        intel_table = Mock()
+        intel_table.name = 'threat-intel'
+        
+        def batch_write_item(RequestItems):
+            if any(request['PutRequest']['Item']['event_id'] == 'msg-1' for request in RequestItems['threat-intel']):
+                raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Item too large'}}, 'BatchWriteItem')
+            return {'UnprocessedItems': {}}
+        intel_table.meta.client.batch_write_item.side_effect = batch_write_item
+        self.collector.intel_writer = BufferedTableWriter(intel_table, ('intelligence_id',))
+        records = [self.make_record(f'msg-{i}', f'203.0.113.{i}') for i in range(3)]
+        
+        result = batch_handler({'Records': records}, Mock())
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'msg-1'}]}
+        assert self.collector.intel_writer.stats['written'] == 2
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -2,10 +2,25 @@
 Test file for SecureShield AI Threat Detector
 """
 
+import base64
 import pytest
 import json
+import time
 from unittest.mock import Mock, patch
-from src.threat_detector.lambda_function import ThreatDetector, lambda_handler
+from botocore.exceptions import ClientError
+from src.common.batch_writer import BatchWriteError
+from src.threat_detector.lambda_function import (
+    ThreatDetector, batch_handler, flush_incident_events, get_deduplicator, get_detector, incident_events, lambda_handler,
+    trigger_incident_response
+)
+from src.threat_detector.concurrency import AdaptiveConcurrencyLimiter, fan_out
+from src.threat_detector.dedup import EventDeduplicator, RotatingBloomFilter
+from src.threat_detector.ip_reputation import IPReputationIndex, build_index
+from src.threat_detector.prompt_batching import pack_batches
+from src.threat_detector.signatures import AhoCorasick, SignaturePack
+from src.threat_detector.triage import TriageGate
+from src.threat_detector.verdict_cache import VerdictCache, fingerprint
+from src.threat_detector.windowed_counters import BurstTracker, sketch_dimensions
 
 class TestThreatDetector:
     """Test cases for ThreatDetector class."""
@@ -130,11 +145,503 @@ class TestThreatDetector:
         assert assessment['threat_level'] in ['LOW', 'INFO']
         assert assessment['risk_score'] <= 2
 
+class TestVerdictCache:
+    """Test cases for the Bedrock verdict cache."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.event_details = {
+            'event_name': 'GetUser',
+            'source_ip': '203.0.113.25',
+            'user_agent': 'sqlmap/1.6.12',
+            'event_time': '2024-01-15T10:30:00Z',
+            'error_code': 'AccessDenied'
+        }
+    
+    def test_fingerprint_ignores_tool_version_and_minutes(self):
+        """Test that near-identical scanner events share a fingerprint."""
+        similar = dict(self.event_details, user_agent='sqlmap/1.7.2', event_time='2024-01-15T10:59:12Z')
+        different = dict(self.event_details, event_name='ListUsers')
+        
+        assert fingerprint(self.event_details) == fingerprint(similar)
+        assert fingerprint(self.event_details) != fingerprint(different)
+    
+    @patch('src.threat_detector.lambda_function.bedrock')
+    def test_cache_hit_skips_model_call(self, mock_bedrock):
+        """Test that a cached verdict is reused without calling Bedrock."""
+        verdict = {'threat_categories': ['brute_force'], 'confidence': 80, 'reasoning': 'scanner', 'risk_score': 8}
+        body = Mock()
+        body.read.return_value = json.dumps({'content': [{'text': json.dumps(verdict)}]})
+        mock_bedrock.invoke_model.return_value = {'body': body}
+        cache = VerdictCache(max_entries=10)
+        detector = ThreatDetector(verdict_cache=cache)
+        
+        first = detector._ai_analysis(self.event_details)
+        second = detector._ai_analysis(dict(self.event_details, user_agent='sqlmap/1.7.2'))
+        
+        assert first == second == verdict
+        mock_bedrock.invoke_model.assert_called_once()
+        assert cache.stats['local_hits'] == 1
+        assert cache.stats['misses'] == 1
+    
+    @patch.object(ThreatDetector, '_invoke_model')
+    def test_batch_miss_is_looked_up_once(self, mock_invoke_model):
+        """Test that a batched event missing the cache is counted as a single miss."""
+        verdict = {'threat_categories': ['brute_force'], 'confidence': 80, 'reasoning': 'scanner', 'risk_score': 8}
+        mock_invoke_model.return_value = json.dumps(verdict)
+        cache = VerdictCache(max_entries=10)
+        detector = ThreatDetector(verdict_cache=cache, triage_gate=None)
+        event = {'detail': {'eventID': 'e1', 'eventName': 'GetUser', 'sourceIPAddress': '203.0.113.25',
+                            'userAgent': 'sqlmap/1.6.12', 'eventTime': '2024-01-15T10:30:00Z'}}
+        
+        with patch.object(cache, '_get_shared', wraps=cache._get_shared) as shared_lookup:
+            detector.analyze_events([event])
+            detector.analyze_events([event])
+        
+        mock_invoke_model.assert_called_once()
+        assert shared_lookup.call_count == 1
+        assert cache.stats['misses'] == 1
+        assert cache.stats['local_hits'] == 1
+    
+    def test_lru_eviction(self):
+        """Test that the local tier stays within its size bound."""
+        cache = VerdictCache(max_entries=2)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, {'risk_score': 1})
+        
+        assert len(cache) == 2
+        assert cache.get('a') is None
+        assert cache.stats['evictions'] == 1
+
+class TestTriageGate:
+    """Test cases for the pattern-analysis triage gate."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.detector = ThreatDetector(triage_gate=TriageGate(
+            benign_max_score=1,
+            hostile_min_score=8,
+            allowlisted_principals=['arn:aws:iam::123456789012:role/ci-deployer']
+        ))
+    
+    def _event(self, **detail):
+        base = {
+            'eventID': 'triage-event-id',
+            'eventName': 'DescribeInstances',
+            'eventTime': '2024-01-15T10:30:00Z',
+            'sourceIPAddress': '203.0.113.25',
+            'userAgent': 'aws-cli/2.0.0',
+            'userIdentity': {'type': 'IAMUser', 'arn': 'arn:aws:iam::123456789012:user/test-user'}
+        }
+        base.update(detail)
+        return {'id': 'triage-event-id', 'detail': base}
+    
+    @patch.object(ThreatDetector, '_ai_analysis')
+    def test_hostile_event_skips_ai(self, mock_ai_analysis):
+        """Test that an obviously hostile event is assessed without Bedrock."""
+        event = self._event(eventName='GetUser', userAgent='sqlmap/1.6.12', errorCode='AccessDenied')
+        
+        assessment = self.detector.analyze_event(event)
+        
+        mock_ai_analysis.assert_not_called()
+        assert assessment['analysis_path'] == 'triage_hostile'
+        assert assessment['threat_level'] == 'CRITICAL'
+    
+    @patch.object(ThreatDetector, '_ai_analysis')
+    def test_allowlisted_principal_skips_ai(self, mock_ai_analysis):
+        """Test that allowlisted principals are triaged as benign."""
+        event = self._event(userIdentity={'type': 'AssumedRole', 'arn': 'arn:aws:iam::123456789012:role/ci-deployer'})
+        
+        assessment = self.detector.analyze_event(event)
+        
+        mock_ai_analysis.assert_not_called()
+        assert assessment['analysis_path'] == 'triage_benign'
+        assert assessment['threat_level'] in ['LOW', 'INFO']
+    
+    @patch.object(ThreatDetector, '_ai_analysis')
+    def test_ambiguous_event_uses_ai(self, mock_ai_analysis):
+        """Test that events between the thresholds still go to Bedrock."""
+        mock_ai_analysis.return_value = {'threat_categories': [], 'confidence': 10, 'reasoning': 'routine', 'risk_score': 1}
+        
+        assessment = self.detector.analyze_event(self._event())
+        
+        mock_ai_analysis.assert_called_once()
+        assert assessment['analysis_path'] == 'ai'
+    
+    @patch.object(ThreatDetector, '_ai_analysis')
+    def test_default_gate_sends_single_weak_signals_to_ai(self, mock_ai_analysis):
+        """Test that error-only and off-hours-only events are not triaged as benign by default."""
+        mock_ai_analysis.return_value = {'threat_categories': [], 'confidence': 10, 'reasoning': 'routine', 'risk_score': 1}
+        detector = ThreatDetector(triage_gate=TriageGate(), burst_tracker=None)
+        error_only = self._event(eventName='PutObject', errorCode='AccessDenied')
+        off_hours_only = self._event(eventName='PutObject', eventTime='2024-01-15T03:30:00Z')
+        
+        paths = [detector.analyze_event(event)['analysis_path'] for event in (error_only, off_hours_only)]
+        
+        assert paths == ['ai', 'ai']
+        assert mock_ai_analysis.call_count == 2
+    
+    @patch.object(ThreatDetector, '_ai_analysis')
+    def test_default_gate_triages_events_without_signals(self, mock_ai_analysis):
+        """Test that an event with no pattern signal at all is still triaged as benign."""
+        detector = ThreatDetector(triage_gate=TriageGate(), burst_tracker=None)
+        
+        assessment = detector.analyze_event(self._event(eventName='PutObject'))
+        
+        mock_ai_analysis.assert_not_called()
+        assert assessment['analysis_path'] == 'triage_benign'
+
+class TestMicroBatchedAnalysis:
+    """Test cases for micro-batched Bedrock prompts."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.detector = ThreatDetector(verdict_cache=None)
+        self.events = [
+            {
+                'id': f'event-{i}',
+                'detail': {
+                    'eventID': f'event-{i}',
+                    'eventName': 'DescribeInstances',
+                    'eventTime': '2024-01-15T10:30:00Z',
+                    'sourceIPAddress': f'203.0.113.{i}',
+                    'userAgent': 'aws-cli/2.0.0'
+                }
+            }
+            for i in range(3)
+        ]
+    
+    @patch.object(ThreatDetector, '_invoke_model')
+    def test_batch_answer_mapped_with_single_event_fallback(self, mock_invoke_model):
+        """Test that batch verdicts map back by event id and missing ones fall back."""
+        verdict = {'threat_categories': ['reconnaissance'], 'confidence': 70, 'reasoning': 'enumeration', 'risk_score': 8}
+        mock_invoke_model.side_effect = [
+            json.dumps([dict(verdict, event_id='e1'), dict(verdict, event_id='e0', risk_score=2), {'event_id': 'e2'}]),
+            json.dumps(dict(verdict, risk_score=4))
+        ]
+        
+        assessments = self.detector.analyze_events(self.events)
+        
+        assert mock_invoke_model.call_count == 2
+        assert [a['risk_score'] for a in assessments] == [2.0, 5.0, 3.0]
+        assert 'Event ID: e2' in mock_invoke_model.call_args_list[0][0][0]
+        assert 'Event ID' not in mock_invoke_model.call_args_list[1][0][0]
+    
+    def test_pack_batches_respects_count_and_token_budget(self):
+        """Test that batches close on event count and token budget."""
+        descriptions = [('e0', 'x' * 40), ('e1', 'x' * 40), ('e2', 'x' * 40), ('e3', 'x' * 400)]
+        
+        assert pack_batches(descriptions, max_events=2, max_tokens=1000) == [['e0', 'e1'], ['e2', 'e3']]
+        assert pack_batches(descriptions, max_events=10, max_tokens=50) == [['e0', 'e1', 'e2'], ['e3']]
+
+class TestSignatureEngine:
+    """Test cases for the Aho-Corasick signature engine."""
+    
+    def test_automaton_matches_overlapping_patterns(self):
+        """Test that overlapping and nested patterns are all reported."""
+        automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+        
+        assert [automaton.patterns[i] for i in automaton.search('ushers')] == ['he', 'she', 'hers']
+    
+    def test_pack_matches_same_as_substring_scan(self):
+        """Test that the compiled pack agrees with a naive substring scan."""
+        signatures = ['nmap', 'sqlmap', 'map', 'nikto', 'dirb', 'dirbuster', 'zap', 'w3af']
+        pack = SignaturePack(user_agents=signatures, api_calls=['ListUsers'])
+        
+        for user_agent in ['sqlmap/1.6.12', 'Mozilla/5.0 DirBuster-1.0', 'OWASP ZAP/2.12', 'aws-cli/2.0.0', '']:
+            expected = [sig for sig in signatures if sig in user_agent.lower()]
+            assert pack.match_user_agent(user_agent) == expected
+        assert pack.is_suspicious_api('ListUsers')
+        assert not pack.is_suspicious_api('ListBuckets')
+    
+    def test_external_signature_pack(self, tmp_path):
+        """Test that the detector uses signatures from an external pack file."""
+        pack_path = tmp_path / 'signatures.json'
+        pack_path.write_text(json.dumps({'version': '2024.01', 'user_agents': ['evil-scanner'], 'api_calls': ['GetSecretValue']}))
+        
+        with patch('src.threat_detector.lambda_function.SIGNATURE_PACK_PATH', str(pack_path)):
+            detector = ThreatDetector()
+        analysis = detector._pattern_analysis({'event_name': 'GetSecretValue', 'user_agent': 'Evil-Scanner/3'})
+        
+        assert detector.signatures.version == '2024.01'
+        assert analysis['patterns_found'] == ['suspicious_api_call:GetSecretValue', 'suspicious_user_agent:evil-scanner']
+
+class TestIPReputationIndex:
+    """Test cases for the longest-prefix-match IP reputation index."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.entries = [
+            ('203.0.113.0/24', {'kind': 'deny', 'score': 3, 'label': 'scanner_net'}),
+            ('203.0.113.128/25', {'kind': 'deny', 'score': 6, 'label': 'botnet'}),
+            ('203.0.113.200/32', {'kind': 'allow', 'score': 0, 'label': 'partner'}),
+            ('198.51.100.7', {'kind': 'deny', 'score': 8, 'label': 'tor_exit'}),
+            ('2001:db8::/32', {'kind': 'deny', 'score': 4, 'label': 'hosting'}),
+            ('2001:db8:1::/48', {'kind': 'allow', 'score': 0, 'label': 'office'})
+        ]
+    
+    def test_longest_prefix_match(self, tmp_path):
+        """Test that the most specific prefix wins for IPv4 and IPv6."""
+        index_path = tmp_path / 'reputation.idx'
+        index_path.write_bytes(build_index(self.entries))
+        index = IPReputationIndex.open(str(index_path))
+        
+        assert index.lookup('203.0.113.5')['label'] == 'scanner_net'
+        assert index.lookup('203.0.113.129')['label'] == 'botnet'
+        assert index.lookup('203.0.113.200')['label'] == 'partner'
+        assert index.lookup('203.0.113.201')['label'] == 'botnet'
+        assert index.lookup('198.51.100.7')['label'] == 'tor_exit'
+        assert index.lookup('198.51.100.8') is None
+        assert index.lookup('2001:db8:2::1')['label'] == 'hosting'
+        assert index.lookup('2001:db8:1::1')['label'] == 'office'
+        assert index.lookup('ec2.amazonaws.com') is None
+    
+    def test_reputation_scored_and_allowlist_triaged(self):
+        """Test that pattern analysis scores bad IPs and triage trusts allowlisted ones."""
+        detector = ThreatDetector(triage_gate=TriageGate())
+        detector.ip_reputation = IPReputationIndex(build_index(self.entries))
+        
+        bad = detector._pattern_analysis({'event_name': 'PutObject', 'source_ip': '198.51.100.7'})
+        trusted = detector._pattern_analysis({'event_name': 'ListUsers', 'source_ip': '203.0.113.200', 'user_agent': 'aws-cli/2.0.0', 'error_code': 'AccessDenied'})
+        
+        assert bad['patterns_found'] == ['ip_reputation:tor_exit']
+        assert bad['risk_score'] == 8
+        assert 'allowlisted_ip' in trusted['patterns_found']
+        assert detector.triage_gate.evaluate({}, trusted)['analysis_path'] == 'triage_benign'
+
+class TestAdaptiveConcurrency:
+    """Test cases for the AIMD Bedrock concurrency limiter."""
+    
+    def _throttle(self):
+        return ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}, 'InvokeModel')
+    
+    def test_limit_backs_off_on_throttle_and_ramps_on_success(self):
+        """Test multiplicative decrease on throttling and additive increase on success."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=16, cooldown_seconds=0)
+        fn = Mock(side_effect=[self._throttle(), 'ok'])
+        
+        with patch('src.threat_detector.concurrency.time.sleep'):
+            assert limiter.call(fn) == 'ok'
+        
+        stats = limiter.stats()
+        assert stats['throttles'] == 1
+        assert stats['successes'] == 1
+        assert stats['in_flight'] == 0
+        assert limiter.limit == 4
+        
+        for _ in range(8):
+            limiter.call(lambda: None)
+        assert limiter.limit == 5
+    
+    def test_non_throttling_errors_are_not_retried(self):
+        """Test that ordinary failures propagate immediately."""
+        limiter = AdaptiveConcurrencyLimiter()
+        fn = Mock(side_effect=ValueError('bad request'))
+        
+        with pytest.raises(ValueError):
+            limiter.call(fn)
+        
+        fn.assert_called_once()
+        assert limiter.stats()['failures'] == 1
+    
+    def test_fan_out_respects_limit(self):
+        """Test that fan_out never exceeds the limiter's concurrency."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+        peak = []
+        
+        def work(item):
+            def call():
+                peak.append(limiter.stats()['in_flight'])
+                time.sleep(0.01)
+                return item * 2
+            return limiter.call(call)
+        
+        assert fan_out(work, range(10), limiter) == [i * 2 for i in range(10)]
+        assert max(peak) <= 2
+
+class TestBurstTracker:
+    """Test cases for per-source sliding-window burst counters."""
+    
+    def test_window_counts_and_expiry(self):
+        """Test that counts accumulate per window and age out of shorter windows."""
+        tracker = BurstTracker(windows=(60, 300), bucket_seconds=60)
+        for minute in range(3):
+            for _ in range(10):
+                features = tracker.observe(['ip:203.0.113.25'], 'ConsoleLogin', True, f'2024-01-15T10:0{minute}:30Z')
+        other = tracker.observe(['ip:198.51.100.7'], 'ConsoleLogin', False, '2024-01-15T10:02:40Z')
+        
+        assert features['ip:203.0.113.25']['60s'] == {'requests': 10, 'errors': 10, 'distinct_apis': 1}
+        assert features['ip:203.0.113.25']['300s'] == {'requests': 30, 'errors': 30, 'distinct_apis': 1}
+        assert other['ip:198.51.100.7']['300s'] == {'requests': 1, 'errors': 0, 'distinct_apis': 1}
+    
+    def test_brute_force_and_enumeration_scored(self):
+        """Test that repeated failures and API enumeration raise the pattern score."""
+        detector = ThreatDetector(burst_tracker=BurstTracker())
+        details = {'source_ip': '203.0.113.99', 'event_time': '2024-01-15T10:30:00Z', 'error_code': 'AccessDenied'}
+        
+        for i in range(25):
+            analysis = detector._pattern_analysis(dict(details, event_name=f'List{i}'))
+        
+        assert 'brute_force_burst:ip' in analysis['patterns_found']
+        assert 'reconnaissance_enumeration:ip' in analysis['patterns_found']
+        assert 'brute_force' in detector._assess_threat_level(analysis, {})['categories']
+    
+    def test_quiet_source_not_flagged_in_high_cardinality_storm(self):
+        """Test that thousands of noisy sources do not push a quiet source over the burst thresholds."""
+        tracker = BurstTracker(expected_keys=4000, error_rate=0.01)
+        detector = ThreatDetector(burst_tracker=tracker)
+        for minute in range(5):
+            for i in range(4000):
+                tracker.observe([f'ip:10.{i // 250}.{i % 250}.1'], f'List{minute}', True, f'2024-01-15T10:0{minute}:30Z')
+        
+        analysis = detector._pattern_analysis({
+            'source_ip': '203.0.113.7', 'event_name': 'PutObject', 'event_time': '2024-01-15T10:04:40Z'
+        })
+        
+        assert not [p for p in analysis['patterns_found'] if p.split(':')[0].endswith('burst') or 'enumeration' in p]
+        assert analysis['risk_score'] == 0
+    
+    def test_sketch_dimensions_follow_expected_keys(self):
+        """Test that sketch width and depth grow with the expected key count and confidence."""
+        assert sketch_dimensions(1000, 0.01) == (2719, 5)
+        assert sketch_dimensions(10000, 0.001) == (27183, 7)
+        with pytest.raises(ValueError):
+            sketch_dimensions(0, 0.01)
+    
+    def test_sync_adds_deltas_and_learns_remote_counts(self):
+        """Test that sync pushes only unsynced deltas and merges other containers' counts."""
+        tracker = BurstTracker(windows=(60,), bucket_seconds=60)
+        table = Mock()
+        table.update_item.return_value = {'Attributes': {'requests': 7, 'errors': 0}}
+        for _ in range(3):
+            tracker.observe(['ip:203.0.113.25'], 'GetUser', False, '2024-01-15T10:00:30Z')
+        
+        assert tracker.sync(table) == 1
+        assert tracker.sync(table) == 0
+        assert table.update_item.call_args[1]['ExpressionAttributeValues'][':r'] == 3
+        features = tracker.observe(['ip:203.0.113.25'], 'GetUser', False, '2024-01-15T10:00:40Z')
+        assert features['ip:203.0.113.25']['60s']['requests'] == 8
+
+class TestEventDeduplicator:
+    """Test cases for event ID deduplication."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.table = Mock()
+        self.deduplicator = EventDeduplicator(table=self.table)
+    
+    def test_bloom_filter_rotates_out_old_keys(self):
+        """Test that keys survive one rotation and are forgotten after two."""
+        bloom = RotatingBloomFilter(capacity=2, error_rate=1e-9)
+        bloom.add('a')
+        bloom.add('b')
+        bloom.add('c')
+        
+        assert 'a' in bloom and 'c' in bloom
+        assert 'z' not in bloom
+        
+        bloom.add('d')
+        bloom.add('e')
+        
+        assert 'a' not in bloom
+        assert 'e' in bloom
+    
+    def test_completed_events_are_skipped_without_a_table(self):
+        """Test that a redelivery to the same container is answered from memory when there is no table."""
+        deduplicator = EventDeduplicator()
+        assert deduplicator.claim('evt-1') is True
+        deduplicator.complete('evt-1')
+        
+        assert deduplicator.claim('evt-1') is False
+        assert deduplicator.stats['local_duplicates'] == 1
+    
+    def test_completed_local_hits_skip_the_claim_write(self):
+        """Test that a filter hit is confirmed with a read of the completed claim instead of another PutItem."""
+        assert self.deduplicator.claim('evt-1') is True
+        self.deduplicator.complete('evt-1')
+        completion = self.table.update_item.call_args[1]
+        self.table.get_item.return_value = {'Item': {
+            'event_id': 'evt-1', 'status': 'completed', 'ttl': completion['ExpressionAttributeValues'][':ttl']
+        }}
+        
+        assert self.deduplicator.claim('evt-1') is False
+        self.table.put_item.assert_called_once()
+        assert completion['ExpressionAttributeValues'][':completed'] == 'completed'
+        assert completion['ExpressionAttributeValues'][':ttl'] >= time.time() + 86000
+        assert self.deduplicator.stats['local_duplicates'] == 1
+    
+    def test_bloom_false_positive_is_processed(self):
+        """Test that an unseen event the filter wrongly reports as seen is still claimed and processed."""
+        self.table.get_item.return_value = {}
+        with patch.object(RotatingBloomFilter, '__contains__', return_value=True):
+            assert 'evt-new' in self.deduplicator.seen
+            assert self.deduplicator.claim('evt-new') is True
+        
+        self.table.put_item.assert_called_once()
+        assert self.deduplicator.stats['bloom_false_positives'] == 1
+        assert self.deduplicator.stats['claimed'] == 1
+    
+    def test_in_progress_claim_is_a_short_lease(self):
+        """Test that a claim lasts only the invocation's remaining time plus the margin."""
+        context = Mock()
+        context.get_remaining_time_in_millis.return_value = 60000
+        
+        assert self.deduplicator.claim('evt-1', context) is True
+        
+        item = self.table.put_item.call_args[1]['Item']
+        assert item['status'] == 'in_progress'
+        assert item['ttl'] - item['claimed_at'] == 90
+        # A lease left by a crashed invocation can be taken over once it expires
+        assert self.table.put_item.call_args[1]['ConditionExpression'] == 'attribute_not_exists(event_id) OR #ttl < :now'
+    
+    def test_claim_held_elsewhere_is_a_duplicate(self):
+        """Test that a failed conditional put means another invocation owns the event."""
+        self.table.put_item.side_effect = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem')
+        
+        assert self.deduplicator.claim('evt-1') is False
+        assert self.deduplicator.stats['shared_duplicates'] == 1
+    
+    def test_table_errors_fail_open_and_release_deletes_claim(self):
+        """Test that throttling does not drop events and released claims are deleted."""
+        self.table.put_item.side_effect = ClientError({'Error': {'Code': 'ThrottlingException'}}, 'PutItem')
+        
+        assert self.deduplicator.claim('evt-1') is True
+        self.deduplicator.release('evt-1')
+        
+        self.table.delete_item.assert_called_once_with(Key={'event_id': 'evt-1'})
+        assert self.deduplicator.claim('evt-1') is True
+
+class TestIncidentEvents:
+    """Test cases for batched incident response events."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.client = Mock()
+        self.client.put_events.side_effect = lambda Entries: {'FailedEntryCount': 0, 'Entries': [{'EventId': 'x'}] * len(Entries)}
+    
+    def test_incident_response_events_are_batched(self):
+        """Test that triggered responses are queued and sent in one call at flush."""
+        event = {'id': 'evt', 'detail': {'eventID': 'e1', 'sourceIPAddress': '203.0.113.9', 'tlsDetails': {}}}
+        assessment = {'threat_level': 'HIGH', 'risk_score': 80}
+        
+        with patch.object(incident_events, 'client', self.client):
+            trigger_incident_response(event, assessment)
+            trigger_incident_response(event, dict(assessment, threat_level='CRITICAL'))
+            self.client.put_events.assert_not_called()
+            flush_incident_events()
+        
+        entries = self.client.put_events.call_args[1]['Entries']
+        assert len(entries) == 2
+        assert entries[0]['Source'] == 'secure-shield.threat-detector'
+        assert 'tlsDetails' not in json.loads(entries[0]['Detail'])['original_event']['detail']
+
 class TestLambdaHandler:
     """Test cases for Lambda handler."""
     
     def setup_method(self):
         """Setup test fixtures."""
+        get_detector.cache_clear()
+        get_deduplicator.cache_clear()
         self.sample_event = {
             "version": "0",
             "id": "test-event-id",
@@ -200,6 +707,121 @@ class TestLambdaHandler:
         assert result['statusCode'] == 200
         # Verify incident response was triggered
         mock_trigger_response.assert_called_once()
+    
+    @patch('src.threat_detector.lambda_function.process_event')
+    def test_lambda_handler_skips_redelivered_event(self, mock_process_event):
+        """Test that the same CloudTrail event is only analyzed once."""
+        mock_process_event.return_value = {'threat_level': 'LOW'}
+        
+        lambda_handler(self.sample_event, Mock())
+        result = lambda_handler(self.sample_event, Mock())
+        
+        mock_process_event.assert_called_once()
+        assert json.loads(result['body'])['message'] == 'Duplicate event skipped'
+    
+    @patch('src.threat_detector.lambda_function.process_event')
+    def test_failed_event_can_be_retried(self, mock_process_event):
+        """Test that an event whose processing failed is not remembered as done."""
+        mock_process_event.side_effect = [Exception('bedrock unavailable'), {'threat_level': 'LOW'}]
+        
+        with pytest.raises(Exception):
+            lambda_handler(self.sample_event, Mock())
+        result = lambda_handler(self.sample_event, Mock())
+        
+        assert mock_process_event.call_count == 2
+        assert result['statusCode'] == 200
+
+    @patch('src.threat_detector.lambda_function.intel_writer')
+    @patch('src.threat_detector.lambda_function.process_event')
+    def test_failed_event_discards_buffered_writes(self, mock_process_event, mock_intel_writer):
+        """Test that a failed invocation does not leave buffered records for the next one."""
+        mock_process_event.side_effect = Exception('bedrock unavailable')
+        
+        with pytest.raises(Exception):
+            lambda_handler(self.sample_event, Mock())
+        
+        mock_intel_writer.flush.assert_not_called()
+        mock_intel_writer.discard.assert_called_once()
+
+class TestBatchHandler:
+    """Test cases for the SQS/Kinesis batch handler."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        get_detector.cache_clear()
+        self.cloudtrail_event = {
+            "id": "batch-event-id",
+            "detail": {
+                "eventName": "DescribeInstances",
+                "eventTime": "2024-01-15T10:30:00Z",
+                "sourceIPAddress": "203.0.113.25",
+                "userAgent": "aws-cli/2.0.0",
+                "eventID": "batch-event-id"
+            }
+        }
+    
+    @patch('src.threat_detector.lambda_function.dispatch_assessment')
+    @patch('src.threat_detector.lambda_function.ThreatDetector')
+    def test_detector_reused_across_warm_invocations(self, mock_detector, mock_dispatch):
+        """Test that the detector is built once per container, not per invocation."""
+        mock_detector.return_value.analyze_events.return_value = [{'threat_level': 'LOW'}]
+        event = {'Records': [{'messageId': 'msg-1', 'body': json.dumps(self.cloudtrail_event)}]}
+        
+        batch_handler(event, Mock())
+        batch_handler(event, Mock())
+        
+        mock_detector.assert_called_once()
+        assert mock_detector.return_value.analyze_events.call_count == 2
+    
+    @patch('src.threat_detector.lambda_function.dispatch_assessment')
+    @patch('src.threat_detector.lambda_function.ThreatDetector')
+    def test_sqs_partial_batch_failure(self, mock_detector, mock_dispatch):
+        """Test that only malformed or unanalyzable SQS records are reported as failures."""
+        mock_detector.return_value.analyze_events.return_value = [{'threat_level': 'LOW'}, None]
+        event = {
+            'Records': [
+                {'messageId': 'msg-1', 'eventSource': 'aws:sqs', 'body': json.dumps(self.cloudtrail_event)},
+                {'messageId': 'msg-2', 'eventSource': 'aws:sqs', 'body': 'not-json'},
+                {'messageId': 'msg-3', 'eventSource': 'aws:sqs', 'body': json.dumps(self.cloudtrail_event)}
+            ]
+        }
+        
+        result = batch_handler(event, Mock())
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'msg-2'}, {'itemIdentifier': 'msg-3'}]}
+        mock_dispatch.assert_called_once()
+        mock_detector.assert_called_once()
+    
+    @patch('src.threat_detector.lambda_function.intel_writer')
+    @patch('src.threat_detector.lambda_function.dispatch_assessment')
+    @patch('src.threat_detector.lambda_function.ThreatDetector')
+    def test_unwritten_intelligence_fails_its_record(self, mock_detector, mock_dispatch, mock_intel_writer):
+        """Test that records whose threat intel item could not be written are reported as failures."""
+        mock_detector.return_value.analyze_events.return_value = [{'threat_level': 'HIGH'}, {'threat_level': 'HIGH'}]
+        mock_dispatch.side_effect = lambda payload, assessment: (payload['id'],)
+        mock_intel_writer.flush.side_effect = BatchWriteError('threat-intel', [('event-2',)])
+        event = {'Records': [
+            {'messageId': f'msg-{i}', 'body': json.dumps(dict(self.cloudtrail_event, id=f'event-{i}'))} for i in (1, 2)
+        ]}
+        
+        result = batch_handler(event, Mock())
+        
+        assert result == {'batchItemFailures': [{'itemIdentifier': 'msg-2'}]}
+    
+    @patch('src.threat_detector.lambda_function.dispatch_assessment')
+    @patch('src.threat_detector.lambda_function.ThreatDetector')
+    def test_kinesis_bare_cloudtrail_record(self, mock_detector, mock_dispatch):
+        """Test that bare CloudTrail records from Kinesis are wrapped as events."""
+        mock_detector.return_value.analyze_events.return_value = [{'threat_level': 'LOW'}]
+        data = base64.b64encode(json.dumps(self.cloudtrail_event['detail']).encode()).decode()
+        event = {'Records': [{'kinesis': {'sequenceNumber': '49590338271490256608559692538361571095921575989136588898', 'data': data}}]}
+        
+        result = batch_handler(event, Mock())
+        
+        assert result == {'batchItemFailures': []}
+        processed_event = mock_detector.return_value.analyze_events.call_args[0][0][0]
+        assert processed_event['id'] == 'batch-event-id'
+        assert processed_event['detail']['eventName'] == 'DescribeInstances'
 
 if __name__ == "__main__":
-    pytest.main([__file__]) 
\ No newline at end of file
+    pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Test file for SecureShield AI Threat Intelligence queries
+"""
+
+import json
+import pytest
+from decimal import Decimal
+from itertools import islice
+from unittest.mock import Mock
+from src.common.codec import encode_value
+from src.threat_intel.query import ThreatIntelQuery
+from src.threat_intel.export import export_attacker_profiles, export_threat_intel
+from src.threat_intel.analytics import ThreatIntelAnalytics
+
+class TestThreatIntelQuery:
+    """Test cases for streaming threat-intel reads."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.table = Mock()
+        self.intel = ThreatIntelQuery(table=self.table, page_size=2)
+    
+    def test_query_by_source_ip_follows_pages(self):
+        """Test that a source IP lookup uses the index and streams every page."""
+        self.table.query.side_effect = [
+            {'Items': [{'event_id': 'e1'}, {'event_id': 'e2'}], 'LastEvaluatedKey': {'event_id': 'e2'}},
+            {'Items': [{'event_id': 'e3', 'ai_reasoning': encode_value('scanner')}]}
+        ]
+        
+        items = list(self.intel.by_source_ip('203.0.113.25', start='2024-01-01', attributes=['event_id', 'timestamp']))
+        
+        assert [item['event_id'] for item in items] == ['e1', 'e2', 'e3']
+        assert items[2]['ai_reasoning'] == 'scanner'
+        self.table.scan.assert_not_called()
+        first, second = [c[1] for c in self.table.query.call_args_list]
+        assert first['IndexName'] == 'source_ip-timestamp-index'
+        assert first['ProjectionExpression'] == '#p0, #p1'
+        assert first['ExpressionAttributeNames'] == {'#p0': 'event_id', '#p1': 'timestamp'}
+        assert 'ExclusiveStartKey' not in first
+        assert second['ExclusiveStartKey'] == {'event_id': 'e2'}
+    
+    def test_time_range_merges_threat_levels_in_order(self):
+        """Test that per-level queries are merged into one time-ordered stream."""
+        pages = {
+            'HIGH': [{'timestamp': '2024-01-01T01:00:00', 'threat_level': 'HIGH'}, {'timestamp': '2024-01-01T03:00:00', 'threat_level': 'HIGH'}],
+            'LOW': [{'timestamp': '2024-01-01T02:00:00', 'threat_level': 'LOW'}]
+        }
+        
+        def query(**arguments):
+            level = arguments['KeyConditionExpression'].get_expression()['values'][0].get_expression()['values'][1]
+            return {'Items': pages[level]}
+        
+        self.table.query.side_effect = query
+        
+        items = list(self.intel.by_time_range('2024-01-01', '2024-01-02', threat_levels=['HIGH', 'LOW']))
+        
+        assert [item['threat_level'] for item in items] == ['HIGH', 'LOW', 'HIGH']
+    
+    def test_parallel_export_streams_all_segments(self):
+        """Test that a segmented scan yields every item from every segment."""
+        def scan(**arguments):
+            segment = arguments['Segment']
+            start = arguments.get('ExclusiveStartKey', {}).get('n', 0)
+            items = [{'event_id': f's{segment}-{n}'} for n in range(start, min(start + 2, 5))]
+            response = {'Items': items}
+            if start + 2 < 5:
+                response['LastEvaluatedKey'] = {'n': start + 2}
+            return response
+        
+        self.table.scan.side_effect = scan
+        
+        items = list(self.intel.export(segments=3))
+        
+        assert len(items) == 15
+        assert {c[1]['TotalSegments'] for c in self.table.scan.call_args_list} == {3}
+    
+    def test_export_can_stop_early(self):
+        """Test that closing the stream early does not hang the scan workers."""
+        self.table.scan.side_effect = lambda **arguments: {'Items': [{'event_id': 'x'}] * 2, 'LastEvaluatedKey': {'n': 1}}
+        
+        stream = self.intel.export(segments=2, max_buffered_pages=1)
+        items = list(islice(stream, 5))
+        stream.close()
+        
+        assert len(items) == 5
+
+class TestParquetExport:
+    """Test cases for the Parquet export and the analytics over it."""
+    
+    def setup_method(self):
+        """Setup test fixtures."""
+        self.items = [
+            {'event_id': 'e1', 'timestamp': '2024-01-01T03:15:00+00:00', 'threat_level': 'HIGH',
+             'risk_score': Decimal('80'), 'categories': ['credential_access'], 'source_ip': '198.51.100.7',
+             'patterns_found': encode_value(['root_account_usage'])},
+            {'event_id': 'e2', 'timestamp': '2024-01-01T03:45:00+00:00', 'threat_level': 'HIGH',
+             'risk_score': Decimal('90'), 'categories': ['credential_access', 'persistence'], 'source_ip': '198.51.100.7'},
+            {'intelligence_id': 'i3', 'timestamp': '2024-01-02T17:00:00+00:00', 'threat_level': 'LOW',
+             'risk_score': Decimal('10'), 'threat_categories': ['reconnaissance'], 'source_ip': '203.0.113.9',
+             'event_details': {'source_ip': '203.0.113.9'}}
+        ]
+        self.table = Mock()
+        self.table.scan.side_effect = lambda **arguments: {'Items': self.items if arguments['Segment'] == 0 else []}
+    
+    def test_export_writes_partitioned_parquet(self, tmp_path):
+        """Test that records land in date and threat level partitions in fixed-size batches."""
+        counts = export_threat_intel(str(tmp_path), ThreatIntelQuery(table=self.table), segments=2, batch_rows=2)
+        
+        assert counts == {'rows': 3, 'batches': 2}
+        assert (tmp_path / 'date=2024-01-01' / 'threat_level=HIGH').is_dir()
+        assert (tmp_path / 'date=2024-01-02' / 'threat_level=LOW').is_dir()
+    
+    def test_analytics_prunes_partitions_and_columns(self, tmp_path):
+        """Test top IPs, category counts and hourly histogram over an export."""
+        export_threat_intel(str(tmp_path), ThreatIntelQuery(table=self.table), segments=2)
+        analytics = ThreatIntelAnalytics(str(tmp_path))
+        
+        top = analytics.top_source_ips(n=1)
+        assert top.iloc[0]['source_ip'] == '198.51.100.7'
+        assert top.iloc[0]['records'] == 2
+        
+        assert analytics.category_counts()['credential_access'] == 2
+        assert analytics.category_counts(threat_levels=['LOW']).to_dict() == {'reconnaissance': 1}
+        
+        histogram = analytics.hourly_histogram(start_date='2024-01-01', end_date='2024-01-01')
+        assert len(histogram) == 24
+        assert histogram[3] == 2 and histogram.sum() == 2
+        
+        frame = analytics.load(['patterns_found'], threat_levels=['HIGH'])
+        assert list(frame.columns) == ['patterns_found']
+        assert json.loads(frame['patterns_found'].dropna().iloc[0]) == ['root_account_usage']
+    
+    def test_export_attacker_profiles(self, tmp_path):
+        """Test that profiles are partitioned by last activity and highest threat level."""
+        table = Mock()
+        table.scan.return_value = {'Items': [{
+            'source_ip': '198.51.100.7', 'attack_count': Decimal('4'), 'threat_levels': {'LOW', 'HIGH'},
+            'attack_vectors': {'brute_force'}, 'last_activity': '2024-01-03T08:00:00+00:00'
+        }]}
+        
+        counts = export_attacker_profiles(str(tmp_path), table, segments=1)
+        
+        assert counts['rows'] == 1
+        assert (tmp_path / 'date=2024-01-03' / 'threat_level=HIGH').is_dir()
+
+if __name__ == "__main__":
+    pytest.main([__file__])